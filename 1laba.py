@@ -2,11 +2,44 @@
 # система доставки еды для лабораторной работы
 # сделал: студент группы ИВТ-202
 
+import os
+import io
+import re
+import mmap
+import struct
+import sys
+import bz2
+import gzip
 import json
+import lzma
+import time
+import sqlite3
+import weakref
+import asyncio
+import bisect
+import random
+import heapq
+import hashlib
+import math
+import itertools
+import threading
+import multiprocessing
+import functools
+import inspect
+import contextlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, OrderedDict
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 
+# numpy не обязателен: если есть, аналитика по колонкам считается через него
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # перечисление для статусов заказа
 class OrderStatus:
     created = "created"
@@ -15,6 +48,23 @@ class OrderStatus:
     completed = "completed"
     cancelled = "cancelled"
 
+# заглушка вместо блокировки для объектов вне системы
+NO_LOCK = contextlib.nullcontext()
+
+# версии пользователей, ресторанов и блюд (см. FragmentCache). счетчик общий:
+# версия не повторяется ни у какого объекта, поэтому новый объект с тем же id
+# (после загрузки снапшота) не совпадет со старым куском из кэша
+VERSIONS = itertools.count(1)
+
+# объект с версией: методы, которые меняют поля (add_money, add_dish,
+# set_rating...), сами берут новую версию. кто пишет поля напрямую
+# (dish.price = ...), зовет после этого touch()
+class Versioned:
+    __slots__ = ()
+    
+    def touch(self):
+        self.version = next(VERSIONS)
+
 # свои ошибки для системы
 class DeliveryError(Exception):
     pass
@@ -25,6 +75,9 @@ class UserNotFoundError(DeliveryError):
 class RestaurantNotFoundError(DeliveryError):
     pass
 
+class OrderNotFoundError(DeliveryError):
+    pass
+
 class DishNotFoundError(DeliveryError):
     pass
 
@@ -35,14 +88,18 @@ class RestaurantClosedError(DeliveryError):
     pass
 
 # класс блюда
-class Dish:
+class Dish(Versioned):
     """блюдо в меню ресторана"""
     
+    # без __dict__ у каждого объекта: блюд и заказов миллионы
+    __slots__ = ('name', 'price', 'desc', 'category', 'version')
+    
     def __init__(self, name: str, price: float, desc: str = "", category: str = "основное"):
         self.name = name
         self.price = price
         self.desc = desc
         self.category = category
+        self.version = next(VERSIONS)
     
     # в словарь для json
     def to_dict(self):
@@ -53,6 +110,16 @@ class Dish:
             'category': self.category
         }
     
+    # из словаря (обратно к to_dict)
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            data['name'],
+            data['price'],
+            data.get('desc', ''),
+            data.get('category', 'основное')
+        )
+    
     # в xml элемент
     def to_xml(self):
         dish_elem = ET.Element('dish')
@@ -62,31 +129,56 @@ class Dish:
         ET.SubElement(dish_elem, 'category').text = self.category
         return dish_elem
     
+    @classmethod
+    def from_xml(cls, elem):
+        return cls(
+            elem.find('name').text,
+            float(elem.find('price').text),
+            elem.find('desc').text,
+            elem.find('category').text
+        )
+    
     def __str__(self):
         return f"{self.name} - {self.price} руб."
 
 # класс пользователя
-class User:
+class User(Versioned):
     """пользователь системы"""
     
+    __slots__ = ('id', 'name', 'email', 'phone', 'money', 'my_orders', 'system', 'version', '__weakref__')
+    
     def __init__(self, uid: int, name: str, email: str, phone: str, money: float = 0.0):
         self.id = uid
         self.name = name
         self.email = email
         self.phone = phone
         self.money = money
-        self.my_orders = []  # история заказов
+        self.my_orders = []  # заказы, оплаченные в этом сеансе (вся история - FoodDelivery.orders_of_user)
+        self.system = None  # система, в которой лежит пользователь (для журнала)
+        self.version = next(VERSIONS)  # меняется с каждым изменением полей
     
     # пополнить баланс
     def add_money(self, amount: float):
         if amount > 0:
-            self.money += amount
+            with self.lock():
+                self.money += amount
+                self.version = next(VERSIONS)
+                if self.system is not None:
+                    self.system.log('m', self.id, amount)
     
     # списать деньги
     def take_money(self, amount: float):
-        if amount > self.money:
-            raise NotEnoughMoneyError(f"мало денег: надо {amount}, есть {self.money}")
-        self.money -= amount
+        with self.lock():
+            if amount > self.money:
+                raise NotEnoughMoneyError(f"мало денег: надо {amount}, есть {self.money}")
+            self.money -= amount
+            self.version = next(VERSIONS)
+    
+    # блокировка баланса (пока пользователь не в системе - пустая)
+    def lock(self):
+        if self.system is None:
+            return NO_LOCK
+        return self.system.user_lock(self.id)
     
     # для сохранения в файл
     def to_dict(self):
@@ -98,6 +190,10 @@ class User:
             'money': self.money
         }
     
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['id'], data['name'], data['email'], data['phone'], data['money'])
+    
     def to_xml(self):
         user_elem = ET.Element('user')
         ET.SubElement(user_elem, 'id').text = str(self.id)
@@ -106,11 +202,24 @@ class User:
         ET.SubElement(user_elem, 'phone').text = self.phone
         ET.SubElement(user_elem, 'money').text = str(self.money)
         return user_elem
+    
+    @classmethod
+    def from_xml(cls, elem):
+        return cls(
+            int(elem.find('id').text),
+            elem.find('name').text,
+            elem.find('email').text,
+            elem.find('phone').text,
+            float(elem.find('money').text)
+        )
 
 # класс ресторана
-class Restaurant:
+class Restaurant(Versioned):
     """ресторан с меню"""
     
+    __slots__ = ('id', 'name', 'address', 'phone', 'menu', 'open', 'rating', 'system', 'version',
+                 '__weakref__')
+    
     def __init__(self, rid: int, name: str, address: str, phone: str = ""):
         self.id = rid
         self.name = name
@@ -119,18 +228,46 @@ class Restaurant:
         self.menu = {}  # название -> объект Dish
         self.open = True
         self.rating = 0.0
+        self.system = None  # система, в которой лежит ресторан (для журнала)
+        # меняется с каждым изменением полей или состава меню; у блюд своя
+        # версия (см. FragmentCache.rest_version)
+        self.version = next(VERSIONS)
     
     # добавить блюдо
     def add_dish(self, dish: Dish):
         self.menu[dish.name] = dish
+        self.version = next(VERSIONS)
+        if self.system is not None:
+            self.system.dish_indexed(self, dish)
+            self.system.log('d', self.id, dish.name, dish.price, dish.desc, dish.category)
+    
+    # добавить сразу много блюд (меню целиком)
+    def add_dishes(self, dishes):
+        for dish in dishes:
+            self.add_dish(dish)
     
     # найти блюдо
     def find_dish(self, dish_name: str):
         return self.menu.get(dish_name)
     
+    # та же строка названия, что лежит в меню (чтобы заказы не держали свои копии)
+    def intern_name(self, dish_name: str) -> str:
+        dish = self.menu.get(dish_name)
+        return dish.name if dish is not None else dish_name
+    
     # открыть/закрыть
     def switch_open(self):
         self.open = not self.open
+        self.version = next(VERSIONS)
+        if self.system is not None:
+            self.system.log('s', self.id)
+    
+    # поставить рейтинг
+    def set_rating(self, rating: float):
+        self.rating = rating
+        self.version = next(VERSIONS)
+        if self.system is not None:
+            self.system.log('g', self.id, rating)
     
     # для файлов
     def to_dict(self):
@@ -145,6 +282,16 @@ class Restaurant:
             'menu': menu_dict
         }
     
+    @classmethod
+    def from_dict(cls, data: dict):
+        rest = cls(data['id'], data['name'], data['address'], data.get('phone', ''))
+        rest.open = data['open']
+        rest.rating = data.get('rating', 0.0)
+        for dish_data in data.get('menu', {}).values():
+            dish = Dish.from_dict(dish_data)
+            rest.menu[dish.name] = dish
+        return rest
+    
     def to_xml(self):
         rest_elem = ET.Element('restaurant')
         ET.SubElement(rest_elem, 'id').text = str(self.id)
@@ -159,11 +306,32 @@ class Restaurant:
             menu_elem.append(dish.to_xml())
         
         return rest_elem
+    
+    @classmethod
+    def from_xml(cls, elem):
+        rest = cls(
+            int(elem.find('id').text),
+            elem.find('name').text,
+            elem.find('address').text,
+            elem.find('phone').text if elem.find('phone') is not None else ""
+        )
+        rest.open = elem.find('open').text.lower() == 'true'
+        rest.rating = float(elem.find('rating').text)
+        
+        # меню
+        menu_elem = elem.find('menu')
+        if menu_elem:
+            for dish_elem in menu_elem.findall('dish'):
+                dish = Dish.from_xml(dish_elem)
+                rest.menu[dish.name] = dish
+        return rest
 
 # класс заказа
 class Order:
     """заказ пользователя"""
     
+    __slots__ = ('id', 'user', 'rest', 'items', 'sum', 'status', 'time', 'end_time', 'system', '__weakref__')
+    
     def __init__(self, oid: int, user: User, rest: Restaurant):
         self.id = oid
         self.user = user
@@ -173,25 +341,40 @@ class Order:
         self.status = OrderStatus.created
         self.time = datetime.now()
         self.end_time = None
+        self.system = None  # система, в которой лежит заказ (для индексов)
     
     # добавить блюдо в заказ
     def add_dish(self, dish_name: str, count: int = 1):
         dish = self.rest.find_dish(dish_name)
         if not dish:
             raise DishNotFoundError(f"нет блюда '{dish_name}'")
+        dish_name = dish.name  # строка из меню вместо переданной копии
         
-        if dish_name in self.items:
-            self.items[dish_name] += count
-        else:
-            self.items[dish_name] = count
-        
-        self.sum += dish.price * count
+        with self.lock():
+            if dish_name in self.items:
+                self.items[dish_name] += count
+            else:
+                self.items[dish_name] = count
+            
+            self.sum += dish.price * count
+            if self.system is not None:
+                self.system.dish_added(self, dish_name, count, dish.price * count)
+    
+    # блокировка заказа (пока заказ не в системе - пустая)
+    def lock(self):
+        if self.system is None:
+            return NO_LOCK
+        return self.system.order_lock(self.id)
     
     # поменять статус
     def change_status(self, new_status: str):
+        old_status = self.status
         self.status = new_status
         if new_status == OrderStatus.completed:
             self.end_time = datetime.now()
+        # сообщаем системе чтобы она поправила индексы
+        if self.system is not None:
+            self.system.status_changed(self, old_status)
     
     # для сохранения
     def to_dict(self):
@@ -206,6 +389,18 @@ class Order:
             'end_time': self.end_time.isoformat() if self.end_time else None
         }
     
+    # пользователя и ресторан передаем уже найденными
+    @classmethod
+    def from_dict(cls, data: dict, user: User, rest: Restaurant):
+        order = cls(data['id'], user, rest)
+        order.items = {rest.intern_name(name): count for name, count in data['items'].items()}
+        order.sum = data['sum']
+        order.status = sys.intern(data['status'])
+        order.time = datetime.fromisoformat(data['time'])
+        if data.get('end_time'):
+            order.end_time = datetime.fromisoformat(data['end_time'])
+        return order
+    
     def to_xml(self):
         order_elem = ET.Element('order')
         ET.SubElement(order_elem, 'id').text = str(self.id)
@@ -225,362 +420,4375 @@ class Order:
             ET.SubElement(item_elem, 'count').text = str(count)
         
         return order_elem
+    
+    @classmethod
+    def from_xml(cls, elem, user: User, rest: Restaurant):
+        order = cls(int(elem.find('id').text), user, rest)
+        order.sum = float(elem.find('sum').text)
+        order.status = sys.intern(elem.find('status').text)
+        order.time = datetime.fromisoformat(elem.find('time').text)
+        
+        end_elem = elem.find('end_time')
+        if end_elem is not None and end_elem.text:
+            order.end_time = datetime.fromisoformat(end_elem.text)
+        
+        # блюда в заказе
+        items_elem = elem.find('items')
+        if items_elem:
+            for item_elem in items_elem.findall('item'):
+                order.items[rest.intern_name(item_elem.find('dish').text)] = int(item_elem.find('count').text)
+        return order
 
-# главный класс системы
-class FoodDelivery:
-    """основная система доставки"""
+# журнал изменений
+class Journal:
+    """журнал изменений: одна запись - одна строка json, дописывается в конец"""
     
-    def __init__(self):
-        self.users = []
-        self.restaurants = []
-        self.orders = []
-        self.next_uid = 1
-        self.next_rid = 1
-        self.next_oid = 1
+    def __init__(self, path: str, group_commit: int = 1, sync_interval: float = None):
+        self.path = path
+        self.group_commit = max(1, group_commit)
+        self.sync_interval = sync_interval
+        self.f = open(path, 'ab')
+        self.pending = 0  # записано, но еще не fsync
+        self.last_sync = time.monotonic()
     
-    # добавить пользователя
-    def add_user(self, name: str, email: str, phone: str) -> User:
-        user = User(self.next_uid, name, email, phone)
-        self.users.append(user)
-        self.next_uid += 1
-        return user
+    # дописать запись; fsync пачкой раз в group_commit записей
+    def append(self, record: list):
+        self.f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        self.pending += 1
+        if self.pending >= self.group_commit or (
+                self.sync_interval is not None and time.monotonic() - self.last_sync >= self.sync_interval):
+            self.sync()
     
-    # найти пользователя
-    def find_user(self, uid: int):
-        for u in self.users:
-            if u.id == uid:
-                return u
-        return None
+    def sync(self):
+        self.f.flush()
+        if self.pending:
+            os.fsync(self.f.fileno())
+            self.pending = 0
+        self.last_sync = time.monotonic()
     
-    # добавить ресторан
-    def add_restaurant(self, name: str, address: str, phone: str = "") -> Restaurant:
-        rest = Restaurant(self.next_rid, name, address, phone)
-        self.restaurants.append(rest)
-        self.next_rid += 1
-        return rest
+    # начать журнал с нуля (после снапшота)
+    def truncate(self):
+        self.f.truncate(0)
+        self.f.seek(0)
+        os.fsync(self.f.fileno())
+        self.pending = 0
     
-    # найти ресторан
-    def find_rest(self, rid: int):
-        for r in self.restaurants:
-            if r.id == rid:
-                return r
-        return None
+    def close(self):
+        self.sync()
+        self.f.close()
     
-    # создать заказ
-    def make_order(self, uid: int, rid: int) -> Order:
-        user = self.find_user(uid)
-        rest = self.find_rest(rid)
-        
-        if not user:
-            raise UserNotFoundError(f"нет пользователя {uid}")
-        if not rest:
-            raise RestaurantNotFoundError(f"нет ресторана {rid}")
-        if not rest.open:
-            raise RestaurantClosedError(f"ресторан {rest.name} закрыт")
-        
-        order = Order(self.next_oid, user, rest)
-        self.orders.append(order)
-        self.next_oid += 1
-        
-        return order
+    # прочитать записи; недописанный хвост (упали посреди записи) отрезаем
+    @staticmethod
+    def read(path: str):
+        if not os.path.exists(path):
+            return
+        good = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                yield record
+        if good != os.path.getsize(path):
+            print(f"в журнале {path} оборванный хвост, отрезаем")
+            with open(path, 'r+b') as f:
+                f.truncate(good)
+
+# колоночное хранилище заказов
+class OrderColumns:
+    """заказы в виде колонок (array): по колонке на поле, строка на заказ
     
-    # обработать заказ (списать деньги)
-    def process_order(self, oid: int) -> bool:
-        order = self.find_order(oid)
-        if not order:
-            return False
-        
-        try:
-            # проверяем что в заказе что-то есть
-            if not order.items:
-                raise DeliveryError("пустой заказ")
-            
-            # хватает ли денег
-            if order.user.money < order.sum:
-                raise NotEnoughMoneyError(
-                    f"мало денег у {order.user.name}: надо {order.sum}, есть {order.user.money}"
-                )
-            
-            # списываем
-            order.user.take_money(order.sum)
-            
-            # меняем статус
-            order.change_status(OrderStatus.processing)
-            
-            # добавляем в историю
-            order.user.my_orders.append(order)
-            
-            return True
-            
-        except DeliveryError as e:
-            print(f"ошибка: {e}")
-            order.change_status(OrderStatus.cancelled)
-            return False
+    нужно для аналитики: агрегаты считаются по плоским массивам
+    без обхода объектов Order. время хранится в микросекундах от 1970 года.
+    """
     
-    # найти заказ
-    def find_order(self, oid: int):
-        for o in self.orders:
-            if o.id == oid:
-                return o
-        return None
+    STATUSES = [OrderStatus.created, OrderStatus.processing, OrderStatus.delivering,
+                OrderStatus.completed, OrderStatus.cancelled]
+    NO_TIME = -(1 << 63)
+    DAY_US = 86400 * 10**6
+    EPOCH = datetime(1970, 1, 1)
     
-    # завершить заказ
-    def finish_order(self, oid: int) -> bool:
-        order = self.find_order(oid)
-        if order and order.status in [OrderStatus.processing, OrderStatus.delivering]:
-            order.change_status(OrderStatus.completed)
-            return True
-        return False
+    def __init__(self):
+        self.statuses = list(self.STATUSES)  # код статуса -> название
+        self.status_codes = {st: i for i, st in enumerate(self.statuses)}
+        self.rows = {}  # id заказа -> номер строки
+        self.clear()
     
-    # отменить заказ
-    def cancel_order(self, oid: int) -> bool:
-        order = self.find_order(oid)
-        if order and order.status != OrderStatus.completed:
-            order.change_status(OrderStatus.cancelled)
-            # возвращаем деньги если уже списали
-            if order.status == OrderStatus.processing:
-                order.user.add_money(order.sum)
-            return True
-        return False
+    def clear(self):
+        self.rows.clear()
+        self.ids = array('q')
+        self.user_ids = array('q')
+        self.rest_ids = array('q')
+        self.sums = array('d')
+        self.status = bytearray()
+        self.times = array('q')
+        self.end_times = array('q')
+        self.days = array('l')  # номер дня создания, для группировки
     
-    # --- работа с файлами ---
+    def __len__(self):
+        return len(self.ids)
     
-    # сохранить в json
-    def save_json(self, filename: str):
-        data = {
-            'users': [u.to_dict() for u in self.users],
-            'restaurants': [r.to_dict() for r in self.restaurants],
-            'orders': [o.to_dict() for o in self.orders],
-            'next_ids': {
-                'user': self.next_uid,
-                'rest': self.next_rid,
-                'order': self.next_oid
-            }
-        }
-        
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False, default=str)
-            print(f"сохранено в {filename}")
-        except Exception as e:
-            print(f"ошибка сохранения json: {e}")
+    def code(self, status: str) -> int:
+        code = self.status_codes.get(status)
+        if code is None:
+            # незнакомый статус - заводим новый код
+            code = self.status_codes[status] = len(self.statuses)
+            self.statuses.append(status)
+        return code
     
-    # загрузить из json
-    def load_json(self, filename: str):
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"ошибка загрузки json: {e}")
-            return
-        
-        # очищаем
-        self.users.clear()
-        self.restaurants.clear()
-        self.orders.clear()
-        
-        # пользователи
-        for u_data in data.get('users', []):
-            user = User(
-                u_data['id'],
-                u_data['name'],
-                u_data['email'],
-                u_data['phone'],
-                u_data['money']
-            )
-            self.users.append(user)
-        
-        # рестораны
-        for r_data in data.get('restaurants', []):
-            rest = Restaurant(
-                r_data['id'],
-                r_data['name'],
-                r_data['address'],
-                r_data.get('phone', '')
-            )
-            rest.open = r_data['open']
-            rest.rating = r_data.get('rating', 0.0)
-            
-            # меню
-            for dish_name, dish_data in r_data.get('menu', {}).items():
-                dish = Dish(
-                    dish_data['name'],
-                    dish_data['price'],
-                    dish_data.get('desc', ''),
-                    dish_data.get('category', 'основное')
-                )
-                rest.menu[dish_name] = dish
-            
-            self.restaurants.append(rest)
-        
-        # заказы
-        for o_data in data.get('orders', []):
-            user = self.find_user(o_data['user_id'])
-            rest = self.find_rest(o_data['rest_id'])
-            
-            if user and rest:
-                order = Order(o_data['id'], user, rest)
-                order.items = o_data['items']
-                order.sum = o_data['sum']
-                order.status = o_data['status']
-                order.time = datetime.fromisoformat(o_data['time'])
-                
-                if o_data.get('end_time'):
-                    order.end_time = datetime.fromisoformat(o_data['end_time'])
-                
-                self.orders.append(order)
-        
-        # id для следующих
-        next_ids = data.get('next_ids', {})
-        self.next_uid = next_ids.get('user', 1)
-        self.next_rid = next_ids.get('rest', 1)
-        self.next_oid = next_ids.get('order', 1)
-        
-        print(f"загружено из {filename}")
+    @classmethod
+    def micros(cls, dt) -> int:
+        if dt is None:
+            return cls.NO_TIME
+        return (dt - cls.EPOCH) // timedelta(microseconds=1)
     
-    # сохранить в xml
-    def save_xml(self, filename: str):
-        root = ET.Element('delivery_system')
-        
-        # пользователи
-        users_elem = ET.SubElement(root, 'users')
-        for user in self.users:
-            users_elem.append(user.to_xml())
-        
-        # рестораны
-        rests_elem = ET.SubElement(root, 'restaurants')
-        for rest in self.restaurants:
-            rests_elem.append(rest.to_xml())
-        
-        # заказы
-        orders_elem = ET.SubElement(root, 'orders')
-        for order in self.orders:
-            orders_elem.append(order.to_xml())
-        
-        # id
-        ids_elem = ET.SubElement(root, 'ids')
-        ET.SubElement(ids_elem, 'user').text = str(self.next_uid)
-        ET.SubElement(ids_elem, 'rest').text = str(self.next_rid)
-        ET.SubElement(ids_elem, 'order').text = str(self.next_oid)
-        
-        # сохраняем
-        tree = ET.ElementTree(root)
-        try:
-            tree.write(filename, encoding='utf-8', xml_declaration=True)
-            print(f"сохранено в {filename}")
-        except Exception as e:
-            print(f"ошибка сохранения xml: {e}")
+    def append_row(self, oid: int, uid: int, rid: int, total: float, status_code: int,
+                   time_us: int, end_us: int = NO_TIME):
+        self.rows[oid] = len(self.ids)
+        self.ids.append(oid)
+        self.user_ids.append(uid)
+        self.rest_ids.append(rid)
+        self.sums.append(total)
+        self.status.append(status_code)
+        self.times.append(time_us)
+        self.end_times.append(end_us)
+        self.days.append(time_us // self.DAY_US)
     
-    # загрузить из xml
-    def load_xml(self, filename: str):
-        try:
-            tree = ET.parse(filename)
-            root = tree.getroot()
-        except Exception as e:
-            print(f"ошибка загрузки xml: {e}")
+    def append(self, order: Order):
+        self.append_row(order.id, order.user.id, order.rest.id, order.sum, self.code(order.status),
+                        self.micros(order.time), self.micros(order.end_time))
+    
+    # переписать изменяемые поля строки из объекта
+    def update(self, order: Order):
+        row = self.rows.get(order.id)
+        if row is None:
             return
+        self.sums[row] = order.sum
+        self.status[row] = self.code(order.status)
+        t = self.micros(order.time)
+        self.times[row] = t
+        self.days[row] = t // self.DAY_US
+        self.end_times[row] = self.micros(order.end_time)
+    
+    # маска строк с нужными статусами: bytes из 0 и 1, делается одним translate
+    def mask(self, statuses) -> bytes:
+        table = bytearray(256)
+        for st in statuses:
+            if st in self.status_codes:
+                table[self.status_codes[st]] = 1
+        return bytes(self.status).translate(table)
+    
+    def np_mask(self, statuses):
+        codes = [self.status_codes[st] for st in statuses if st in self.status_codes]
+        return np.isin(np.frombuffer(self.status, dtype=np.uint8), codes)
+    
+    # выручка по заказам в статусах
+    def revenue(self, statuses=(OrderStatus.completed,)) -> float:
+        if np is not None:
+            return float(np.frombuffer(self.sums, dtype=np.float64)[self.np_mask(statuses)].sum())
+        return sum(itertools.compress(self.sums, self.mask(statuses)))
+    
+    def count(self, statuses=(OrderStatus.completed,)) -> int:
+        return sum(self.status.count(self.status_codes[st]) for st in statuses if st in self.status_codes)
+    
+    # средний чек
+    def average_check(self, statuses=(OrderStatus.completed,)) -> float:
+        n = self.count(statuses)
+        return self.revenue(statuses) / n if n else 0.0
+    
+    # статус -> количество заказов
+    def count_by_status(self) -> Dict[str, int]:
+        if np is not None:
+            counts = np.bincount(np.frombuffer(self.status, dtype=np.uint8), minlength=len(self.statuses))
+            return {st: int(n) for st, n in zip(self.statuses, counts) if n}
+        return {st: n for st in self.statuses if (n := self.status.count(self.status_codes[st]))}
+    
+    # группировка значений колонки по ключу; statuses=None - все заказы
+    def count_by(self, column: array, statuses=None) -> Dict[int, int]:
+        if np is not None:
+            values = np.frombuffer(column, dtype=np.int64 if column.itemsize == 8 else np.int32)
+            if statuses is not None:
+                values = values[self.np_mask(statuses)]
+            keys, counts = np.unique(values, return_counts=True)
+            return dict(zip(keys.tolist(), counts.tolist()))
+        values = column if statuses is None else itertools.compress(column, self.mask(statuses))
+        return dict(Counter(values))
+    
+    # id ресторана -> количество заказов
+    def count_by_rest(self, statuses=None) -> Dict[int, int]:
+        return self.count_by(self.rest_ids, statuses)
+    
+    # день создания (date) -> количество заказов
+    def count_by_day(self, statuses=None) -> Dict:
+        return {(self.EPOCH + timedelta(days=day)).date(): n
+                for day, n in sorted(self.count_by(self.days, statuses).items())}
+
+# поисковый индекс по блюдам всех ресторанов
+class MenuIndex:
+    """индекс блюд: слова и их начала из названия и описания, категории, цены
+    
+    каждое блюдо получает номер записи. слова -> множества номеров,
+    начала слов ищутся бисекцией по отсортированному словарю слов,
+    цены лежат отсортированным списком (цена, номер) для диапазонов.
+    замененное блюдо оставляет мертвую запись, поиск ее пропускает; когда
+    мертвых больше чем живых, индекс собирается заново (compact). цену блюда
+    меняют заменой через Restaurant.add_dish: если записать dish.price
+    напрямую, поиск по ценам не отдаст блюдо вне диапазона, но найдет его
+    по новой цене только после compact
+    """
+    
+    WORD = re.compile(r'\w+')
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.entries = []  # номер -> (ресторан, блюдо) или None если блюдо заменили
+        self.by_key = {}  # (id ресторана, название) -> номер
+        self.words = {}  # слово -> множество номеров
+        self.vocab = []  # все слова по алфавиту (для поиска по началу)
+        self.categories = {}  # категория -> множество номеров
+        self.prices = []  # (цена, номер) по возрастанию, вместе с мертвыми
+        self.prices_sorted = True
+        self.dead = 0  # сколько записей заменено
+    
+    def __len__(self):
+        return len(self.by_key)
+    
+    @classmethod
+    def tokens(cls, *texts) -> set:
+        return {w for text in texts if text for w in cls.WORD.findall(text.lower())}
+    
+    def add(self, rest: Restaurant, dish: Dish):
+        key = (rest.id, dish.name)
+        if key in self.by_key:
+            self.remove(self.by_key[key])
+            if self.dead > len(self.by_key):
+                self.compact()
+        eid = len(self.entries)
+        self.entries.append((rest, dish))
+        self.by_key[key] = eid
         
-        # очищаем
-        self.users.clear()
-        self.restaurants.clear()
-        self.orders.clear()
+        for word in self.tokens(dish.name, dish.desc):
+            ids = self.words.get(word)
+            if ids is None:
+                ids = self.words[word] = set()
+                bisect.insort(self.vocab, word)
+            ids.add(eid)
+        self.categories.setdefault(dish.category, set()).add(eid)
         
-        # пользователи
-        users_elem = root.find('users')
-        if users_elem:
-            for user_elem in users_elem.findall('user'):
-                user = User(
-                    int(user_elem.find('id').text),
-                    user_elem.find('name').text,
-                    user_elem.find('email').text,
-                    user_elem.find('phone').text,
-                    float(user_elem.find('money').text)
-                )
-                self.users.append(user)
+        # при загрузке цены идут вразнобой - досортируем один раз перед поиском
+        if self.prices_sorted and self.prices and self.prices[-1] > (dish.price, eid):
+            self.prices_sorted = False
+        self.prices.append((dish.price, eid))
+    
+    # убрать старую запись (блюдо с тем же названием заменили). пара в prices
+    # остается: искать ее там - сортировка и сдвиг списка на каждую замену
+    def remove(self, eid: int):
+        rest, dish = self.entries[eid]
+        self.entries[eid] = None
+        del self.by_key[(rest.id, dish.name)]
+        for word in self.tokens(dish.name, dish.desc):
+            ids = self.words.get(word)
+            if ids is not None:
+                ids.discard(eid)
+        self.categories[dish.category].discard(eid)
+        self.dead += 1
+    
+    # собрать индекс заново по живым записям (и по текущим ценам блюд)
+    def compact(self):
+        live = [entry for entry in self.entries if entry is not None]
+        self.clear()
+        for rest, dish in live:
+            self.add(rest, dish)
+    
+    def sort_prices(self):
+        if not self.prices_sorted:
+            self.prices.sort()
+            self.prices_sorted = True
+    
+    # номера записей, у которых есть слово, начинающееся с prefix
+    # (множество только для чтения: если слово одно, отдаем его без копии)
+    def prefix_ids(self, prefix: str) -> set:
+        i = bisect.bisect_left(self.vocab, prefix)
+        j = i
+        while j < len(self.vocab) and self.vocab[j].startswith(prefix):
+            j += 1
+        if j - i == 1:
+            return self.words[self.vocab[i]]
+        return set().union(*(self.words[w] for w in self.vocab[i:j]))
+    
+    # поиск: каждое слово запроса - начало слова в названии или описании,
+    # все условия вместе; результат (ресторан, блюдо) от дешевых к дорогим
+    def search(self, text: str = None, category: str = None, min_price: float = None,
+               max_price: float = None, open_only: bool = False, limit: int = None):
+        self.sort_prices()
+        lo = 0 if min_price is None else bisect.bisect_left(self.prices, (min_price, -1))
+        hi = len(self.prices) if max_price is None else bisect.bisect_right(self.prices, (max_price, len(self.entries)))
         
-        # рестораны
-        rests_elem = root.find('restaurants')
-        if rests_elem:
-            for rest_elem in rests_elem.findall('restaurant'):
-                rest = Restaurant(
-                    int(rest_elem.find('id').text),
-                    rest_elem.find('name').text,
-                    rest_elem.find('address').text,
-                    rest_elem.find('phone').text if rest_elem.find('phone') is not None else ""
-                )
-                rest.open = rest_elem.find('open').text.lower() == 'true'
-                rest.rating = float(rest_elem.find('rating').text)
-                
-                # меню
-                menu_elem = rest_elem.find('menu')
-                if menu_elem:
-                    for dish_elem in menu_elem.findall('dish'):
-                        dish = Dish(
-                            dish_elem.find('name').text,
-                            float(dish_elem.find('price').text),
-                            dish_elem.find('desc').text,
-                            dish_elem.find('category').text
-                        )
-                        rest.menu[dish.name] = dish
-                
-                self.restaurants.append(rest)
+        # самые узкие множества пересекаем первыми
+        sets = [self.prefix_ids(w) for w in self.tokens(text)] if text else []
+        if category is not None:
+            sets.append(self.categories.get(category, set()))
         
-        # заказы
-        orders_elem = root.find('orders')
-        if orders_elem:
-            for order_elem in orders_elem.findall('order'):
-                user_id = int(order_elem.find('user_id').text)
-                rest_id = int(order_elem.find('rest_id').text)
-                
-                user = self.find_user(user_id)
-                rest = self.find_rest(rest_id)
-                
-                if user and rest:
-                    order = Order(int(order_elem.find('id').text), user, rest)
-                    order.sum = float(order_elem.find('sum').text)
-                    order.status = order_elem.find('status').text
-                    order.time = datetime.fromisoformat(order_elem.find('time').text)
-                    
-                    end_elem = order_elem.find('end_time')
-                    if end_elem is not None and end_elem.text:
-                        order.end_time = datetime.fromisoformat(end_elem.text)
-                    
-                    # блюда в заказе
-                    items_elem = order_elem.find('items')
-                    if items_elem:
-                        for item_elem in items_elem.findall('item'):
-                            dish_name = item_elem.find('dish').text
-                            count = int(item_elem.find('count').text)
-                            order.items[dish_name] = count
-                    
-                    self.orders.append(order)
+        if sets:
+            sets.sort(key=len)
+            ids = set.intersection(*sets) if len(sets) > 1 else sets[0]
+        else:
+            ids = None
         
-        # id
-        ids_elem = root.find('ids')
-        if ids_elem:
-            self.next_uid = int(ids_elem.find('user').text)
-            self.next_rid = int(ids_elem.find('rest').text)
-            self.next_oid = int(ids_elem.find('order').text)
+        # что дешевле: отсортировать кандидатов или идти по ценам и проверять кандидатов.
+        # с limit проход по ценам обычно кончается рано: примерно через
+        # limit * (цен в диапазоне / кандидатов) шагов
+        walk = hi - lo
+        if ids is not None and limit is not None:
+            walk = min(walk, limit * walk / max(len(ids), 1))
+        if ids is not None and len(ids) * max(1, len(ids).bit_length()) < walk:
+            # кандидатов меньше чем цен в диапазоне - сортируем кандидатов
+            candidates = sorted((self.entries[eid][1].price, eid) for eid in ids
+                                if self.entries[eid] is not None)
+            candidates = (eid for price, eid in candidates
+                          if (min_price is None or price >= min_price)
+                          and (max_price is None or price <= max_price))
+        else:
+            # иначе идем по диапазону цен, он уже отсортирован. мертвые записи
+            # и пары со старой ценой (dish.price записали напрямую) пропускаем
+            candidates = (eid for price, eid in itertools.islice(self.prices, lo, hi)
+                          if (ids is None or eid in ids) and self.entries[eid] is not None
+                          and self.entries[eid][1].price == price)
         
-        print(f"загружено из {filename}")
+        result = []
+        for eid in candidates:
+            rest, dish = self.entries[eid]
+            if open_only and not rest.open:
+                continue
+            result.append((rest, dish))
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+# результат обработки заказа в пачке
+class ProcessResult:
+    """что стало с заказом в process_orders"""
     
-    # показать статистику
-    def show_stats(self):
-        print("\n" + "="*40)
-        print("статистика системы:")
-        print(f"пользователей: {len(self.users)}")
-        print(f"ресторанов: {len(self.restaurants)}")
-        print(f"заказов: {len(self.orders)}")
-        
-        if self.orders:
-            completed = [o for o in self.orders if o.status == OrderStatus.completed]
-            if completed:
-                total = sum(o.sum for o in completed)
-                avg = total / len(completed)
-                print(f"выручка: {total:.2f} руб.")
-                print(f"средний заказ: {avg:.2f} руб.")
-        
-        print("="*40)
+    __slots__ = ('oid', 'ok', 'error')
+    
+    def __init__(self, oid: int, ok: bool, error: str = None):
+        self.oid = oid
+        self.ok = ok
+        self.error = error
+    
+    def __repr__(self):
+        return f"ProcessResult({self.oid}, {self.ok}, {self.error!r})"
+
+# индекс заказов по времени
+class TimeIndex:
+    """заказы по возрастанию времени создания + сводки по часам и дням
+    
+    id и время растут вместе, поэтому новый заказ почти всегда просто
+    дописывается в конец. сводка на час/день: [заказов, выручка по
+    выполненным, сумма длительностей доставки, сколько доставок] -
+    все по времени создания заказа.
+    """
+    
+    HOUR_US = 3600 * 10**6
+    DAY_US = 24 * HOUR_US
+    EPOCH = datetime(1970, 1, 1)
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.times = array('q')  # время создания в микросекундах, по возрастанию
+        self.orders = []  # заказы в том же порядке
+        self.hours = {}  # номер часа -> сводка
+        self.days = {}  # номер дня -> сводка
+    
+    def __len__(self):
+        return len(self.orders)
+    
+    @classmethod
+    def micros(cls, dt) -> int:
+        return (dt - cls.EPOCH) // timedelta(microseconds=1)
+    
+    def insert(self, t: int, order: Order):
+        if not self.times or self.times[-1] <= t:
+            self.times.append(t)
+            self.orders.append(order)
+        else:
+            i = bisect.bisect_right(self.times, t)
+            self.times.insert(i, t)
+            self.orders.insert(i, order)
+    
+    # учесть заказ в сводках со знаком sign (+1 добавить, -1 убрать)
+    def apply(self, time, end_time, status: str, total: float, sign: int):
+        t = self.micros(time)
+        done = status == OrderStatus.completed
+        duration = (end_time - time).total_seconds() if done and end_time is not None else None
+        for buckets, key in ((self.hours, t // self.HOUR_US), (self.days, t // self.DAY_US)):
+            b = buckets.get(key)
+            if b is None:
+                b = buckets[key] = [0, 0.0, 0.0, 0]
+            b[0] += sign
+            if done:
+                b[1] += sign * total
+            if duration is not None:
+                b[2] += sign * duration
+                b[3] += sign
+            if b[0] == 0:
+                del buckets[key]
+    
+    def add(self, order: Order):
+        self.insert(self.micros(order.time), order)
+        self.apply(order.time, order.end_time, order.status, order.sum, 1)
+    
+    def status_changed(self, order: Order, old_status: str):
+        if OrderStatus.completed in (old_status, order.status):
+            self.apply(order.time, order.end_time, old_status, order.sum, -1)
+            self.apply(order.time, order.end_time, order.status, order.sum, 1)
+    
+    def sum_changed(self, order: Order, delta: float):
+        if order.status == OrderStatus.completed:
+            self.apply(order.time, order.end_time, order.status, order.sum - delta, -1)
+            self.apply(order.time, order.end_time, order.status, order.sum, 1)
+    
+    # время заказа поменялось: переставляем и пересчитываем сводки
+    def retime(self, order: Order, old_time, old_end_time):
+        old = self.micros(old_time)
+        i = bisect.bisect_left(self.times, old)
+        while self.orders[i] is not order:
+            i += 1
+        del self.times[i]
+        del self.orders[i]
+        self.insert(self.micros(order.time), order)
+        self.apply(old_time, old_end_time, order.status, order.sum, -1)
+        self.apply(order.time, order.end_time, order.status, order.sum, 1)
+    
+    # заказы, созданные в [start, end)
+    def between(self, start: datetime, end: datetime) -> List[Order]:
+        lo = bisect.bisect_left(self.times, self.micros(start))
+        hi = bisect.bisect_left(self.times, self.micros(end))
+        return self.orders[lo:hi]
+    
+    # сводка в виде строк: (начало периода, заказов, выручка, средняя доставка в секундах)
+    def report(self, buckets: dict, step_us: int, start: datetime = None, end: datetime = None):
+        lo = None if start is None else self.micros(start) // step_us
+        hi = None if end is None else self.micros(end) // step_us
+        rows = []
+        for key in sorted(buckets):
+            if (lo is not None and key < lo) or (hi is not None and key >= hi):
+                continue
+            count, revenue, dur_sum, dur_n = buckets[key]
+            rows.append((self.EPOCH + timedelta(microseconds=key * step_us), count, revenue,
+                         dur_sum / dur_n if dur_n else None))
+        return rows
+    
+    def hourly(self, start: datetime = None, end: datetime = None):
+        return self.report(self.hours, self.HOUR_US, start, end)
+    
+    def daily(self, start: datetime = None, end: datetime = None):
+        return self.report(self.days, self.DAY_US, start, end)
+
+# частые элементы потока
+class HeavyHitters:
+    """top-k по весу в потоке событий с ограниченной памятью
+    
+    пока разных ключей мало (<= exact_limit) - считаем точно словарем.
+    дальше переходим на count-min sketch (depth строк по width счетчиков)
+    и держим только k кандидатов с лучшими оценками. состояние можно
+    слить с другим таким же (например, с другого шарда) через merge.
+    """
+    
+    def __init__(self, k: int = 10, exact_limit: int = 10000, width: int = 4096, depth: int = 4):
+        self.k = k
+        self.exact_limit = exact_limit
+        self.width = width
+        self.depth = depth
+        self.exact = {}  # ключ -> вес (пока точный режим)
+        self.table = None  # count-min sketch: depth массивов по width
+        self.candidates = {}  # ключ -> оценка, не больше k штук
+        # (оценка, номер, ключ) для кандидатов. номер - порядок добавления: при равных
+        # оценках сравнивать сами ключи нельзя (1 и "1" не сравниваются)
+        self.heap = []
+        self.seq = itertools.count()
+        self.total = 0.0
+    
+    # позиции ключа в строках sketch. хэш не зависит от процесса (в отличие от hash()),
+    # иначе нельзя было бы сливать состояния разных шардов
+    def slots(self, key):
+        digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+    
+    def estimate(self, key) -> float:
+        if self.table is None:
+            return self.exact.get(key, 0.0)
+        return min(row[i] for row, i in zip(self.table, self.slots(key)))
+    
+    def add(self, key, weight: float = 1):
+        self.total += weight
+        if self.table is None:
+            self.exact[key] = self.exact.get(key, 0) + weight
+            if len(self.exact) > self.exact_limit:
+                self.to_sketch()
+            return
+        est = None
+        for row, i in zip(self.table, self.slots(key)):
+            row[i] += weight
+            est = row[i] if est is None else min(est, row[i])
+        self.offer(key, est)
+    
+    # кандидат в top-k с новой оценкой
+    def offer(self, key, est: float):
+        if key in self.candidates or len(self.candidates) < self.k:
+            self.candidates[key] = est
+            self.push(key, est)
+            return
+        low_est, low_key = self.lowest()
+        if est > low_est:
+            del self.candidates[low_key]
+            self.candidates[key] = est
+            self.push(key, est)
+    
+    # каждое обновление кандидата оставляет в куче старую запись; когда их
+    # набирается много, куча собирается заново из candidates
+    def push(self, key, est: float):
+        if len(self.heap) >= 4 * self.k:
+            self.heap = [(e, next(self.seq), c) for c, e in self.candidates.items()]
+            heapq.heapify(self.heap)
+        else:
+            heapq.heappush(self.heap, (est, next(self.seq), key))
+    
+    # худший из кандидатов (устаревшие записи кучи выкидываем)
+    def lowest(self):
+        while True:
+            est, _, key = self.heap[0]
+            if self.candidates.get(key) == est:
+                return est, key
+            heapq.heappop(self.heap)
+    
+    # точный словарь -> sketch
+    def to_sketch(self):
+        self.table = [array('d', bytes(8 * self.width)) for _ in range(self.depth)]
+        exact, self.exact = self.exact, {}
+        for key, weight in exact.items():
+            for row, i in zip(self.table, self.slots(key)):
+                row[i] += weight
+        for key, weight in heapq.nlargest(self.k, exact.items(), key=lambda kv: kv[1]):
+            self.offer(key, self.estimate(key))
+    
+    # top-n: список (ключ, вес); в режиме sketch вес - оценка сверху
+    def top(self, n: int = None) -> list:
+        n = self.k if n is None else n
+        items = self.exact.items() if self.table is None else self.candidates.items()
+        return heapq.nlargest(n, items, key=lambda kv: kv[1])
+    
+    # добавить к себе состояние other (параметры должны совпадать)
+    def merge(self, other: 'HeavyHitters'):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("разные размеры sketch, слить нельзя")
+        self.total += other.total
+        if self.table is None and other.table is None:
+            for key, weight in other.exact.items():
+                self.exact[key] = self.exact.get(key, 0) + weight
+            if len(self.exact) > self.exact_limit:
+                self.to_sketch()
+            return
+        if self.table is None:
+            self.to_sketch()
+        keys = set(self.candidates) | set(other.candidates) | set(other.exact)
+        if other.table is not None:
+            for row, other_row in zip(self.table, other.table):
+                for i, v in enumerate(other_row):
+                    if v:
+                        row[i] += v
+        else:
+            for key, weight in other.exact.items():
+                for row, i in zip(self.table, self.slots(key)):
+                    row[i] += weight
+        # кандидатов пересобираем по новым оценкам (в одном порядке на любом процессе)
+        self.candidates, self.heap = {}, []
+        for key in sorted(keys, key=str):
+            self.offer(key, self.estimate(key))
+    
+    # состояние в json-совместимом виде (для передачи между процессами)
+    def to_state(self) -> dict:
+        return {
+            'k': self.k, 'exact_limit': self.exact_limit, 'width': self.width, 'depth': self.depth,
+            'total': self.total,
+            'exact': list(self.exact.items()),
+            'table': None if self.table is None else [row.tolist() for row in self.table],
+            'candidates': list(self.candidates.items()),
+        }
+    
+    @classmethod
+    def from_state(cls, state: dict) -> 'HeavyHitters':
+        hh = cls(state['k'], state['exact_limit'], state['width'], state['depth'])
+        hh.total = state['total']
+        hh.exact = {key: w for key, w in state['exact']}
+        if state['table'] is not None:
+            hh.table = [array('d', row) for row in state['table']]
+            for key, est in state['candidates']:
+                hh.offer(key, est)
+        return hh
+
+# аналитика по выполненным заказам
+class OrderAnalytics:
+    """топ блюд, ресторанов по выручке и самых активных пользователей
+    
+    получает заказы по одному (observe) когда они выполнены; память
+    ограничена размерами HeavyHitters, а не числом заказов
+    """
+    
+    def __init__(self, k: int = 10, exact_limit: int = 10000, width: int = 4096, depth: int = 4):
+        self.params = (k, exact_limit, width, depth)
+        self.reset()
+    
+    # начать с нуля (система очищена или загружена заново)
+    def reset(self):
+        self.dishes = HeavyHitters(*self.params)  # "id ресторана:блюдо" -> штук
+        self.rest_revenue = HeavyHitters(*self.params)  # id ресторана -> выручка
+        self.user_orders = HeavyHitters(*self.params)  # id пользователя -> заказов
+    
+    def observe(self, order: Order):
+        for dish_name, count in order.items.items():
+            self.dishes.add(f"{order.rest.id}:{dish_name}", count)
+        self.rest_revenue.add(order.rest.id, order.sum)
+        self.user_orders.add(order.user.id, 1)
+    
+    # прогнать уже накопленную историю
+    def observe_history(self, orders):
+        for order in orders:
+            if order.status == OrderStatus.completed:
+                self.observe(order)
+    
+    def top_dishes(self, n: int = None):
+        return self.dishes.top(n)
+    
+    def top_restaurants(self, n: int = None):
+        return self.rest_revenue.top(n)
+    
+    def top_users(self, n: int = None):
+        return self.user_orders.top(n)
+    
+    def merge(self, other: 'OrderAnalytics'):
+        self.dishes.merge(other.dishes)
+        self.rest_revenue.merge(other.rest_revenue)
+        self.user_orders.merge(other.user_orders)
+    
+    def to_state(self) -> dict:
+        return {name: getattr(self, name).to_state() for name in ('dishes', 'rest_revenue', 'user_orders')}
+    
+    @classmethod
+    def from_state(cls, state: dict) -> 'OrderAnalytics':
+        analytics = cls()
+        for name, part in state.items():
+            setattr(analytics, name, HeavyHitters.from_state(part))
+        hh = analytics.dishes
+        analytics.params = (hh.k, hh.exact_limit, hh.width, hh.depth)
+        return analytics
+
+# заказы снапшота, которые еще не стали объектами
+class LazyOrders:
+    """заказы, загруженные load_json(lazy=True)
+    
+    заказ лежит словарем из снапшота, пока к нему не обратились. тогда
+    делается Order и кладется в кэш последних cache_size обращений;
+    вытесненный объект остается в слабой карте alive, пока его кто-то
+    держит, поэтому один id - всегда один объект. как только
+    такой заказ меняется, система забирает его в обычные индексы
+    (FoodDelivery.promote) и отсюда он уходит
+    """
+    
+    def __init__(self, system: 'FoodDelivery', cache_size: int = 100000):
+        self.system = system
+        self.cache_size = cache_size
+        self.records = {}  # id -> словарь заказа из снапшота
+        self.by_user = {}  # id пользователя -> id заказов (могут быть уже забранные)
+        self.by_rest = {}  # id ресторана -> id заказов (так же)
+        self.by_status = {}  # статус -> множество id
+        self.cache = OrderedDict()  # id -> Order, порядок ключей - порядок обращений
+        self.alive = weakref.WeakValueDictionary()  # id -> Order, пока объект кому-то нужен
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def __contains__(self, oid: int):
+        return oid in self.records
+    
+    def add(self, o_data: dict):
+        oid = o_data['id']
+        self.records[oid] = o_data
+        self.by_user.setdefault(o_data['user_id'], array('q')).append(oid)
+        self.by_rest.setdefault(o_data['rest_id'], array('q')).append(oid)
+        self.by_status.setdefault(sys.intern(o_data['status']), set()).add(oid)
+    
+    # Order по id (из кэша или из словаря); None если такого ленивого заказа нет
+    def get(self, oid: int):
+        order = self.cache.get(oid)
+        if order is not None:
+            self.cache.move_to_end(oid)
+            return order
+        # вытесненный из кэша, но еще живой объект - отдаем его же, а не новый
+        order = self.alive.get(oid)
+        if order is None:
+            o_data = self.records.get(oid)
+            if o_data is None:
+                return None
+            order = Order.from_dict(o_data, self.system.find_user(o_data['user_id']),
+                                    self.system.find_rest(o_data['rest_id']))
+            order.system = self.system
+            self.alive[oid] = order
+        if len(self.cache) >= self.cache_size:
+            self.cache.popitem(last=False)
+        self.cache[oid] = order
+        return order
+    
+    # ленивые заказы из списка id, по возрастанию id
+    def get_many(self, oids) -> List[Order]:
+        return [self.get(oid) for oid in sorted(oids) if oid in self.records]
+    
+    # заказ забирают в обычные индексы; status - статус, с которым он тут числился
+    def release(self, oid: int, status: str):
+        del self.records[oid]
+        self.by_status[status].discard(oid)
+        self.cache.pop(oid, None)
+        self.alive.pop(oid, None)
+
+# архив холодных заказов
+class OrderArchive:
+    """выполненные и отмененные заказы на диске, а не в памяти
+    
+    каждый перенос пишет новый сегмент: файл json lines (to_dict заказа в
+    строке), заказы в нем по возрастанию id, файлы только дописываются и
+    потом не меняются. в памяти на сегмент - разреженный индекс (id и
+    смещение каждой SPARSE_EVERY-й строки) и счетчики по статусам; смещения
+    заказов по пользователям лежат рядом в .users и читаются по запросу
+    """
+    
+    SPARSE_EVERY = 64
+    SEGMENT_ORDERS = 1000000  # заказов в одном сегменте, больше - следующий файл
+    USER_MAPS_CACHED = 8  # сколько .users держать в памяти
+    LINE_ID = re.compile(r'\{"id":\s*(\d+)')
+    
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segments = []  # словари: name, min_id, max_id, count, ids, offsets
+        self.counters = OrderCounters()  # архивные заказы по статусам
+        self.user_maps = {}  # имя сегмента -> {id пользователя: [смещения]}, последние прочитанные
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.jsonl'):
+                self.open_segment(name[:-len('.jsonl')])
+    
+    def __len__(self):
+        return sum(seg['count'] for seg in self.segments)
+    
+    def file(self, name: str, ext: str) -> str:
+        return os.path.join(self.path, name + ext)
+    
+    # подключить сегмент: индекс из .idx, а если его нет (упали между
+    # записью сегмента и индекса) - строим заново по самому сегменту
+    def open_segment(self, name: str):
+        try:
+            with open(self.file(name, '.idx'), 'r', encoding='utf-8') as f:
+                idx = json.load(f)
+        except (OSError, ValueError):
+            with open(self.file(name, '.jsonl'), 'rb') as f:
+                idx = self.build_index(name, [(offset, json.loads(line)) for offset, line in self.lines(f)])
+        seg = {'name': name, 'min_id': idx['min_id'], 'max_id': idx['max_id'], 'count': idx['count'],
+               'ids': array('q', idx['ids']), 'offsets': array('q', idx['offsets'])}
+        self.segments.append(seg)
+        part = OrderCounters()
+        part.counts, part.sums = idx['counts'], idx['sums']
+        self.counters.merge(part)
+    
+    @staticmethod
+    def lines(f):
+        offset = f.tell()
+        for line in f:
+            yield offset, line
+            offset += len(line)
+    
+    # .idx и .users сегмента по его записям [(смещение, словарь заказа)]
+    def build_index(self, name: str, records) -> dict:
+        counters = OrderCounters()
+        counters.rebuild_pairs((d['status'], d['sum']) for _, d in records)
+        by_user = {}
+        for offset, d in records:
+            by_user.setdefault(d['user_id'], []).append(offset)
+        sparse = records[::self.SPARSE_EVERY]
+        idx = {'min_id': records[0][1]['id'], 'max_id': records[-1][1]['id'], 'count': len(records),
+               'ids': [d['id'] for _, d in sparse], 'offsets': [offset for offset, _ in sparse],
+               'counts': counters.counts, 'sums': counters.sums}
+        for ext, data in (('.users', by_user), ('.idx', idx)):
+            with open(self.file(name, ext) + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.file(name, ext) + '.tmp', self.file(name, ext))
+        return idx
+    
+    # записать заказы (по возрастанию id) новыми сегментами. когда метод
+    # вернулся, заказы уже на диске и их можно убирать из памяти
+    def append(self, orders: List[Order]):
+        for start in range(0, len(orders), self.SEGMENT_ORDERS):
+            chunk = orders[start:start + self.SEGMENT_ORDERS]
+            number = int(self.segments[-1]['name'].split('-')[1]) + 1 if self.segments else 1
+            name = f"seg-{number:06d}"
+            records = []
+            offset = 0
+            with open(self.file(name, '.jsonl') + '.tmp', 'wb') as f:
+                for order in chunk:
+                    d = order.to_dict()
+                    line = (json.dumps(d, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+                    f.write(line)
+                    records.append((offset, d))
+                    offset += len(line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.file(name, '.jsonl') + '.tmp', self.file(name, '.jsonl'))
+            self.build_index(name, records)
+            self.open_segment(name)
+    
+    def contains(self, oid: int) -> bool:
+        return self.get(oid) is not None
+    
+    # заказ по id (словарь to_dict) или None
+    def get(self, oid: int):
+        for seg in self.segments:
+            if not seg['min_id'] <= oid <= seg['max_id']:
+                continue
+            i = bisect.bisect_right(seg['ids'], oid) - 1
+            with open(self.file(seg['name'], '.jsonl'), 'r', encoding='utf-8') as f:
+                f.seek(seg['offsets'][i])
+                for _ in range(self.SPARSE_EVERY):
+                    line = f.readline()
+                    if not line:
+                        break
+                    line_id = int(self.LINE_ID.match(line).group(1))
+                    if line_id == oid:
+                        return json.loads(line)
+                    if line_id > oid:
+                        break
+        return None
+    
+    # смещения заказов пользователей в сегменте (несколько последних - в памяти)
+    def user_map(self, seg: dict) -> dict:
+        user_map = self.user_maps.pop(seg['name'], None)
+        if user_map is None:
+            with open(self.file(seg['name'], '.users'), 'r', encoding='utf-8') as f:
+                user_map = json.load(f)
+            if len(self.user_maps) >= self.USER_MAPS_CACHED:
+                del self.user_maps[next(iter(self.user_maps))]
+        self.user_maps[seg['name']] = user_map
+        return user_map
+    
+    # все архивные заказы пользователя (словари to_dict) по возрастанию id
+    def user_records(self, uid: int) -> List[dict]:
+        found = []
+        for seg in self.segments:
+            offsets = self.user_map(seg).get(str(uid))
+            if not offsets:
+                continue
+            with open(self.file(seg['name'], '.jsonl'), 'r', encoding='utf-8') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    found.append(json.loads(f.readline()))
+        found.sort(key=lambda d: d['id'])
+        return found
+
+# кэш готовых кусков снапшота
+class FragmentCache:
+    """закодированные в json/xml пользователи, рестораны и блюда
+    
+    кусок годен, пока у объекта та же версия (см. Versioned: ее меняют
+    add_money, add_dish, switch_open, set_rating и touch), у ресторана -
+    пока те же версии его и всех блюд меню. поэтому меню, которые почти не меняются, при каждом сохранении не
+    кодируются заново. размер ограничен max_bytes: сверх него выкидываются
+    давно не нужные куски
+    """
+    
+    INDENT = '  '  # отступ save_json без compact (как у json.dump с indent=2)
+    # один кодировщик на все вызовы: json.dumps с параметрами каждый раз создает новый.
+    # default=str - как было у save_json: что json не умеет, пишется строкой
+    ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+    
+    def __init__(self, max_bytes: int = 128 * 2**20):
+        self.max_bytes = max_bytes
+        # (формат, вид, id) -> (версия, текст); порядок - от давних к свежим.
+        # OrderedDict, а не dict: выкидывание с начала у dict со временем
+        # замедляется (next(iter) перебирает удаленные ячейки)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+    
+    # кусок для объекта версии version; encode() - если в кэше нет или устарел
+    def get(self, key: tuple, version, encode) -> str:
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            self.entries.move_to_end(key)  # теперь самый свежий
+            text = entry[1]
+        else:
+            if entry is not None:
+                del self.entries[key]
+                self.size -= sys.getsizeof(entry[1])
+            self.misses += 1
+            text = encode()
+            self.entries[key] = (version, text)
+            self.size += sys.getsizeof(text)
+        # лишнее выкидываем с самых давних (max_bytes можно и уменьшить на ходу)
+        while self.size > self.max_bytes:
+            _, (_, old) = self.entries.popitem(last=False)
+            self.size -= sys.getsizeof(old)
+        return text
+    
+    # --- json ---
+    # куски ровно такие, какими их записал бы json.dump всего снапшота:
+    # с отступами - для глубины depth в документе
+    
+    @classmethod
+    def dumps(cls, data, compact: bool, depth: int) -> str:
+        if compact:
+            return cls.ENCODER.encode(data)
+        # с indent json кодирует на python и медленно; словари и списки
+        # раскладываем по строкам сами, а значения отдаем кодировщику на c
+        if isinstance(data, dict):
+            brackets = '{}'
+            items = [cls.ENCODER.encode(str(key)) + ': ' + cls.dumps(value, False, depth + 1)
+                     for key, value in data.items()]
+        elif isinstance(data, list):
+            brackets = '[]'
+            items = [cls.dumps(value, False, depth + 1) for value in data]
+        else:
+            return cls.ENCODER.encode(data)
+        if not items:
+            return brackets
+        pad = '\n' + cls.INDENT * (depth + 1)
+        return brackets[0] + pad + (',' + pad).join(items) + '\n' + cls.INDENT * depth + brackets[1]
+    
+    def user_json(self, user: User, compact: bool, depth: int = 2) -> str:
+        return self.get(('json', compact, 'user', user.id), user.version,
+                        lambda: self.dumps(user.to_dict(), compact, depth))
+    
+    def dish_json(self, rest: Restaurant, dish: Dish, compact: bool, depth: int) -> str:
+        return self.get(('json', compact, 'dish', rest.id, dish.name), dish.version,
+                        lambda: self.dumps(dish.to_dict(), compact, depth))
+    
+    # версия ресторана вместе с меню: блюдо можно поменять, не трогая ресторан
+    @staticmethod
+    def rest_version(rest: Restaurant) -> tuple:
+        return rest.version, tuple(rest.menu), tuple(dish.version for dish in rest.menu.values())
+    
+    def rest_json(self, rest: Restaurant, compact: bool, depth: int = 2) -> str:
+        return self.get(('json', compact, 'rest', rest.id), self.rest_version(rest),
+                        lambda: self.encode_rest_json(rest, compact, depth))
+    
+    # ресторан без меню кодируем целиком, меню собираем из кусков блюд
+    def encode_rest_json(self, rest: Restaurant, compact: bool, depth: int) -> str:
+        head = rest.to_dict()
+        del head['menu']  # menu у to_dict последний ключ
+        text = self.dumps(head, compact, depth)
+        if compact:
+            items = [self.ENCODER.encode(name) + ':' + self.dish_json(rest, dish, True, 0)
+                     for name, dish in rest.menu.items()]
+            return text[:-1] + ',"menu":{' + ','.join(items) + '}}'
+        inner = '\n' + self.INDENT * (depth + 2)
+        items = [self.ENCODER.encode(name) + ': ' + self.dish_json(rest, dish, False, depth + 2)
+                 for name, dish in rest.menu.items()]
+        menu = '{' + inner + (',' + inner).join(items) + '\n' + self.INDENT * (depth + 1) + '}' if items else '{}'
+        return (text[:text.rindex('\n')] + ',\n' + self.INDENT * (depth + 1) + '"menu": ' + menu
+                + '\n' + self.INDENT * depth + '}')
+    
+    # --- xml ---
+    # куски в том виде, в каком их пишет save_xml_stream (ET.tostring)
+    
+    def user_xml(self, user: User) -> str:
+        return self.get(('xml', 'user', user.id), user.version,
+                        lambda: ET.tostring(user.to_xml(), encoding='unicode'))
+    
+    def dish_xml(self, rest: Restaurant, dish: Dish) -> str:
+        return self.get(('xml', 'dish', rest.id, dish.name), dish.version,
+                        lambda: ET.tostring(dish.to_xml(), encoding='unicode'))
+    
+    def rest_xml(self, rest: Restaurant) -> str:
+        return self.get(('xml', 'rest', rest.id), self.rest_version(rest), lambda: self.encode_rest_xml(rest))
+    
+    def encode_rest_xml(self, rest: Restaurant) -> str:
+        elem = rest.to_xml()
+        elem.find('menu').clear()
+        text = ET.tostring(elem, encoding='unicode')
+        if not rest.menu:
+            return text
+        dishes = ''.join(self.dish_xml(rest, dish) for dish in rest.menu.values())
+        return text[:-len('<menu /></restaurant>')] + '<menu>' + dishes + '</menu></restaurant>'
+
+# счетчики заказов
+class OrderCounters:
+    """количество и сумма заказов по статусам, обновляются на каждом изменении"""
+    
+    def __init__(self):
+        self.counts = {}  # статус -> сколько заказов
+        self.sums = {}  # статус -> сумма заказов
+    
+    def clear(self):
+        self.counts.clear()
+        self.sums.clear()
+    
+    def add(self, order: Order):
+        self.counts[order.status] = self.counts.get(order.status, 0) + 1
+        self.sums[order.status] = self.sums.get(order.status, 0.0) + order.sum
+    
+    # убрать заказ, который был учтен со статусом status и суммой total
+    def remove(self, status: str, total: float):
+        self.counts[status] -= 1
+        self.sums[status] -= total
+    
+    # заказ перешел из old_status в текущий
+    def moved(self, order: Order, old_status: str):
+        self.remove(old_status, order.sum)
+        self.add(order)
+    
+    def sum_changed(self, order: Order, delta: float):
+        self.sums[order.status] += delta
+    
+    # прибавить чужие счетчики (архива, другой части данных)
+    def merge(self, other: 'OrderCounters'):
+        for status, n in other.counts.items():
+            self.counts[status] = self.counts.get(status, 0) + n
+        for status, total in other.sums.items():
+            self.sums[status] = self.sums.get(status, 0.0) + total
+    
+    # пересчитать с нуля по списку заказов
+    def rebuild(self, orders):
+        self.rebuild_pairs((o.status, o.sum) for o in orders)
+    
+    # то же по парам (статус, сумма)
+    def rebuild_pairs(self, pairs):
+        by_status = {}
+        for status, total in pairs:
+            by_status.setdefault(status, []).append(total)
+        self.counts = {st: len(v) for st, v in by_status.items()}
+        self.sums = {st: math.fsum(v) for st, v in by_status.items()}
+    
+    def completed(self) -> int:
+        return self.counts.get(OrderStatus.completed, 0)
+    
+    def revenue(self) -> float:
+        return self.sums.get(OrderStatus.completed, 0.0)
+    
+    def average(self) -> float:
+        n = self.completed()
+        return self.revenue() / n if n else 0.0
+
+# двоичный снапшот
+class BinSnapshot:
+    """компактный двоичный формат снапшота
+    
+    заголовок, таблица строк (названия блюд, категории, описания, адреса, статусы),
+    потом разделы пользователей, ресторанов и заказов. каждая запись идет с длиной впереди,
+    числа фиксированной ширины (little-endian), время - микросекунды от 1970 года.
+    """
+    
+    MAGIC = b'FDBS'
+    VERSION = 1
+    NONE = 0xFFFFFFFF  # индекс/длина для None
+    NO_TIME = -(1 << 63)
+    EPOCH = datetime(1970, 1, 1)
+    
+    HEADER = struct.Struct('<4sHqqqq')  # magic, версия, next uid/rid/oid, journal_seq
+    U32 = struct.Struct('<I')
+    USER = struct.Struct('<qd')  # id, деньги (+ 3 строки)
+    REST = struct.Struct('<q?dII')  # id, открыт, рейтинг, адрес, кол-во блюд (+ 2 строки)
+    DISH = struct.Struct('<IdII')  # название, цена, описание, категория
+    ORDER = struct.Struct('<qqqdIqqI')  # id, пользователь, ресторан, сумма, статус, время, конец, позиций
+    ITEM = struct.Struct('<Iq')  # название блюда, количество
+    
+    @classmethod
+    def micros(cls, dt) -> int:
+        if dt is None:
+            return cls.NO_TIME
+        return (dt - cls.EPOCH) // timedelta(microseconds=1)
+    
+    @classmethod
+    def from_micros(cls, us: int):
+        if us == cls.NO_TIME:
+            return None
+        return cls.EPOCH + timedelta(microseconds=us)
+    
+    @classmethod
+    def pack_str(cls, text) -> bytes:
+        if text is None:
+            return cls.U32.pack(cls.NONE)
+        data = text.encode('utf-8')
+        return cls.U32.pack(len(data)) + data
+    
+    @classmethod
+    def write(cls, system, f):
+        # таблица строк: каждая повторяющаяся строка хранится один раз
+        table = {}
+        
+        def sid(text):
+            if text is None:
+                return cls.NONE
+            idx = table.get(text)
+            if idx is None:
+                idx = table[text] = len(table)
+            return idx
+        
+        for rest in system.restaurants:
+            sid(rest.address)
+            for dish in rest.menu.values():
+                sid(dish.name), sid(dish.desc), sid(dish.category)
+        for order in system.orders:
+            sid(order.status)
+            for dish_name in order.items:
+                sid(dish_name)
+        
+        f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, system.next_uid, system.next_rid,
+                                system.next_oid, system.journal_seq))
+        f.write(cls.U32.pack(len(table)))
+        for text in table:
+            f.write(cls.pack_str(text))
+        
+        def record(payload: bytes):
+            f.write(cls.U32.pack(len(payload)))
+            f.write(payload)
+        
+        f.write(cls.U32.pack(len(system.users)))
+        for u in system.users:
+            record(cls.USER.pack(u.id, u.money) + cls.pack_str(u.name)
+                   + cls.pack_str(u.email) + cls.pack_str(u.phone))
+        
+        f.write(cls.U32.pack(len(system.restaurants)))
+        for rest in system.restaurants:
+            parts = [cls.REST.pack(rest.id, rest.open, rest.rating, sid(rest.address), len(rest.menu)),
+                     cls.pack_str(rest.name), cls.pack_str(rest.phone)]
+            for dish in rest.menu.values():
+                parts.append(cls.DISH.pack(sid(dish.name), dish.price, sid(dish.desc), sid(dish.category)))
+            record(b''.join(parts))
+        
+        f.write(cls.U32.pack(len(system.orders)))
+        pack_order, pack_item = cls.ORDER.pack, cls.ITEM.pack
+        for o in system.orders:
+            parts = [pack_order(o.id, o.user.id, o.rest.id, o.sum, sid(o.status),
+                                cls.micros(o.time), cls.micros(o.end_time), len(o.items))]
+            for dish_name, count in o.items.items():
+                parts.append(pack_item(sid(dish_name), count))
+            record(b''.join(parts))
+    
+    # buf - bytes, mmap или memoryview
+    # проверить заголовок; (next_uid, next_rid, next_oid, journal_seq)
+    @classmethod
+    def check(cls, buf) -> tuple:
+        magic, version, *rest = cls.HEADER.unpack_from(buf, 0)
+        if magic != cls.MAGIC:
+            raise ValueError("это не двоичный снапшот")
+        if version != cls.VERSION:
+            raise ValueError(f"неизвестная версия формата: {version}")
+        return tuple(rest)
+    
+    @classmethod
+    def read(cls, system, buf):
+        next_uid, next_rid, next_oid, journal_seq = cls.check(buf)
+        pos = cls.HEADER.size
+        u32 = cls.U32.unpack_from
+        
+        def read_str(pos):
+            n, = u32(buf, pos)
+            pos += 4
+            if n == cls.NONE:
+                return None, pos
+            return str(buf[pos:pos + n], 'utf-8'), pos + n
+        
+        count, = u32(buf, pos)
+        pos += 4
+        table = []
+        for _ in range(count):
+            text, pos = read_str(pos)
+            table.append(text)
+        
+        def text_at(idx):
+            return None if idx == cls.NONE else table[idx]
+        
+        count, = u32(buf, pos)
+        pos += 4
+        for _ in range(count):
+            end = pos + 4 + u32(buf, pos)[0]
+            uid, money = cls.USER.unpack_from(buf, pos + 4)
+            name, p = read_str(pos + 4 + cls.USER.size)
+            email, p = read_str(p)
+            phone, p = read_str(p)
+            system.put_user(User(uid, name, email, phone, money))
+            pos = end
+        
+        count, = u32(buf, pos)
+        pos += 4
+        for _ in range(count):
+            end = pos + 4 + u32(buf, pos)[0]
+            rid, is_open, rating, address, n_dishes = cls.REST.unpack_from(buf, pos + 4)
+            name, p = read_str(pos + 4 + cls.REST.size)
+            phone, p = read_str(p)
+            rest = Restaurant(rid, name, text_at(address), phone)
+            rest.open = is_open
+            rest.rating = rating
+            for name_id, price, desc, category in cls.DISH.iter_unpack(buf[p:p + n_dishes * cls.DISH.size]):
+                dish = Dish(table[name_id], price, text_at(desc), text_at(category))
+                rest.menu[dish.name] = dish
+            system.put_rest(rest)
+            pos = end
+        
+        count, = u32(buf, pos)
+        pos += 4
+        unpack_order, order_size = cls.ORDER.unpack_from, cls.ORDER.size
+        item_size = cls.ITEM.size
+        for _ in range(count):
+            end = pos + 4 + u32(buf, pos)[0]
+            oid, uid, rid, total, status, t, end_t, n_items = unpack_order(buf, pos + 4)
+            user = system.find_user(uid)
+            rest = system.find_rest(rid)
+            if user and rest:
+                order = Order(oid, user, rest)
+                order.sum = total
+                order.status = table[status]
+                order.time = cls.from_micros(t)
+                order.end_time = cls.from_micros(end_t)
+                p = pos + 4 + order_size
+                for name_id, n in cls.ITEM.iter_unpack(buf[p:p + n_items * item_size]):
+                    order.items[rest.intern_name(table[name_id])] = n
+                system.put_order(order)
+            pos = end
+        
+        system.next_uid, system.next_rid, system.next_oid = next_uid, next_rid, next_oid
+        system.journal_seq = journal_seq
+
+# потоковый разбор json снапшота
+class JsonStreamReader:
+    """читает json объект верхнего уровня кусками, большие массивы отдает по элементу"""
+    
+    WS = re.compile(r'\s*')
+    
+    def __init__(self, f, chunk_size: int = 1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.chars_read = 0
+        self.decoder = json.JSONDecoder()
+    
+    # дочитать кусок, уже разобранное начало буфера выбрасываем
+    def fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.chars_read += len(chunk)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    # следующий значимый символ ('' если файл кончился)
+    def peek(self) -> str:
+        while True:
+            self.pos = self.WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+    
+    def expect(self, ch: str):
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"ожидали '{ch}', а там '{got}' (символ {self.chars_read - len(self.buf) + self.pos})")
+        self.pos += 1
+    
+    # разобрать одно значение целиком
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # число на краю буфера могло обрезаться - дочитываем
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+    
+    # пары (ключ, значение) верхнего объекта;
+    # для ключей из stream_keys массив отдается по одному элементу
+    def sections(self, stream_keys):
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            if key in stream_keys and self.peek() == '[':
+                self.pos += 1
+                if self.peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.value()
+                        ch = self.peek()
+                        self.pos += 1
+                        if ch == ']':
+                            break
+                        if ch != ',':
+                            raise ValueError(f"ожидали ',' или ']' в '{key}', а там '{ch}'")
+            else:
+                yield key, self.value()
+            
+            ch = self.peek()
+            self.pos += 1
+            if ch == '}':
+                return
+            if ch != ',':
+                raise ValueError(f"ожидали ',' или '}}', а там '{ch}'")
+
+# сжатие снапшотов выбирается по расширению файла; остальные файлы не сжимаются
+SNAPSHOT_CODECS = {
+    '.gz': (gzip.open, {'compresslevel': 6}),
+    '.bz2': (bz2.open, {'compresslevel': 9}),
+    '.xz': (lzma.open, {}),
+}
+
+def snapshot_codec(filename: str):
+    return SNAPSHOT_CODECS.get(os.path.splitext(filename)[1].lower())
+
+# открыть файл снапшота как обычный open. сжатые файлы пишутся и читаются
+# потоком через gzip/bz2/lzma: данные проходят кусками, целиком в память не попадают
+def open_snapshot(filename: str, mode: str = 'r', encoding: str = None, errors: str = None):
+    codec = snapshot_codec(filename)
+    if codec is None:
+        return open(filename, mode, encoding=encoding, errors=errors)
+    opener, params = codec
+    if 'b' in mode:
+        return opener(filename, mode, **params)
+    if 'w' not in mode:
+        params = {}  # уровень сжатия нужен только при записи
+    return opener(filename, mode + 't', encoding=encoding, errors=errors, **params)
+
+# разметка снапшота на куски для параллельного разбора
+class SnapshotChunks:
+    """делит разделы users/restaurants/orders файла save_json или save_xml
+    на диапазоны байт по границам записей. сами записи не разбираются:
+    границы ищутся регулярками по байтам (текст внутри строк json и xml
+    экранирован, поэтому ложных совпадений там нет)
+    """
+    
+    SECTIONS = ('users', 'restaurants', 'orders')
+    JSON_SECTION = re.compile(rb'"(users|restaurants|orders)"\s*:\s*\[')
+    # конец массива раздела: дальше следующий ключ верхнего уровня или конец объекта
+    JSON_SECTION_END = re.compile(rb'\]\s*(?:,\s*"[A-Za-z_]+"\s*:|\}\s*$)')
+    # граница между записями: каждый to_dict начинается с ключа id
+    JSON_RECORD = re.compile(rb'\}\s*,\s*(?=\{\s*"id"\s*:)')
+    NOT_SPACE = re.compile(rb'\S')
+    XML_TAGS = {'users': b'user', 'restaurants': b'restaurant', 'orders': b'order'}
+    XML_IDS = re.compile(rb'<ids>.*?</ids>', re.S)
+    
+    # разделы json: имя -> (начало, конец) содержимого массива, плюс остальной
+    # объект верхнего уровня (next_ids, journal_seq) с пустыми массивами
+    @classmethod
+    def json_sections(cls, data):
+        sections = {}
+        outside, pos = [], 0
+        for m in cls.JSON_SECTION.finditer(data):
+            name = m.group(1).decode()
+            if name in sections or m.start() < pos:
+                continue
+            end = cls.JSON_SECTION_END.search(data, m.end())
+            if end is None:
+                raise ValueError(f"не найден конец раздела '{name}'")
+            sections[name] = (m.end(), end.start())
+            outside.append(data[pos:m.end()])
+            pos = end.start()
+        outside.append(data[pos:])
+        return sections, json.loads(b''.join(outside))
+    
+    # разделы xml: имя -> (начало, конец) содержимого, плюс элемент <ids>
+    @classmethod
+    def xml_sections(cls, data):
+        sections, pos = {}, 0
+        for name in cls.SECTIONS:
+            start = data.find(b'<%s>' % name.encode(), pos)
+            if start < 0:
+                continue  # пустой раздел пишется как <name />
+            start += len(name) + 2
+            end = data.find(b'</%s>' % name.encode(), start)
+            if end < 0:
+                raise ValueError(f"не найден конец раздела '{name}'")
+            sections[name] = (start, end)
+            pos = end
+        ids = cls.XML_IDS.search(data, pos)
+        return sections, ET.fromstring(ids.group()) if ids else None
+    
+    # поделить [start, end) раздела примерно на pieces равных по байтам кусков
+    @classmethod
+    def split(cls, data, fmt: str, section: str, start: int, end: int, pieces: int):
+        ranges = []
+        step = (end - start) / pieces
+        cur = start
+        tag = b'<%s>' % cls.XML_TAGS[section]
+        for i in range(1, pieces):
+            target = int(start + i * step)
+            if target <= cur:
+                continue
+            if fmt == 'json':
+                m = cls.JSON_RECORD.search(data, target, end)
+                if m is None:
+                    break
+                ranges.append((cur, m.start() + 1))
+                cur = m.end()
+            else:
+                pos = data.find(tag, target, end)
+                if pos < 0:
+                    break
+                ranges.append((cur, pos))
+                cur = pos
+        if cls.NOT_SPACE.search(data, cur, end):
+            ranges.append((cur, end))
+        return ranges
+    
+    # задания для пула: (файл, формат, раздел, начало, конец) + верхний уровень без разделов
+    @classmethod
+    def plan(cls, filename: str, fmt: str, pieces: int):
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            sections, top = (cls.json_sections if fmt == 'json' else cls.xml_sections)(data)
+            tasks = []
+            for name in cls.SECTIONS:
+                if name in sections:
+                    start, end = sections[name]
+                    tasks += [(filename, fmt, name, a, b)
+                              for a, b in cls.split(data, fmt, name, start, end, pieces)]
+            return tasks, top
+
+# разобрать один кусок снапшота (выполняется в процессе пула).
+# пользователи и рестораны возвращаются объектами, заказы - строками
+# (id, id пользователя, id ресторана, блюда, сумма, статус, время, время окончания):
+# ссылки на пользователя и ресторан расставляет уже главный процесс
+def parse_snapshot_chunk(task):
+    filename, fmt, section, start, end = task
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        chunk = f.read(end - start)
+    
+    if fmt == 'json':
+        records = json.loads(b'[' + chunk + b']')
+        if section == 'users':
+            return [User.from_dict(d) for d in records]
+        if section == 'restaurants':
+            return [Restaurant.from_dict(d) for d in records]
+        return [(d['id'], d['user_id'], d['rest_id'], d['items'], d['sum'], d['status'],
+                 datetime.fromisoformat(d['time']),
+                 datetime.fromisoformat(d['end_time']) if d.get('end_time') else None)
+                for d in records]
+    
+    root = ET.fromstring(b'<chunk>' + chunk + b'</chunk>')
+    if section == 'users':
+        return [User.from_xml(e) for e in root]
+    if section == 'restaurants':
+        return [Restaurant.from_xml(e) for e in root]
+    rows = []
+    for e in root:
+        end_elem = e.find('end_time')
+        items_elem = e.find('items')
+        items = {} if items_elem is None else {
+            item.find('dish').text: int(item.find('count').text) for item in items_elem.findall('item')}
+        rows.append((int(e.find('id').text), int(e.find('user_id').text), int(e.find('rest_id').text),
+                     items, float(e.find('sum').text), e.find('status').text,
+                     datetime.fromisoformat(e.find('time').text),
+                     datetime.fromisoformat(end_elem.text) if end_elem is not None and end_elem.text else None))
+    return rows
+
+# старый формат снапшота (food_data.json)
+class LegacySchema:
+    """перевод записей старого формата в словари текущего (как у to_dict)
+    
+    в старом формате: user_id/balance у пользователей, rest_id/is_open и
+    меню "название -> цена" у ресторанов, order_id/total у заказов. почты,
+    описаний блюд и времени заказов там нет: почта остается пустой, блюда
+    получают категорию по умолчанию, время заказа - время изменения файла
+    """
+    
+    SECTIONS = ('users', 'restaurants', 'orders')
+    # по какому ключу первой записи раздела узнается старый формат
+    MARKERS = {'users': 'user_id', 'restaurants': 'rest_id', 'orders': 'order_id'}
+    
+    @staticmethod
+    def user(d: dict) -> dict:
+        return {'id': d['user_id'], 'name': d['name'], 'email': d.get('email', ''),
+                'phone': d.get('phone', ''), 'money': float(d.get('balance', 0.0))}
+    
+    @staticmethod
+    def restaurant(d: dict) -> dict:
+        menu = {name: {'name': name, 'price': float(price), 'desc': '', 'category': 'основное'}
+                for name, price in d.get('menu', {}).items()}
+        return {'id': d['rest_id'], 'name': d['name'], 'address': d.get('address', ''),
+                'phone': d.get('phone', ''), 'open': d.get('is_open', True),
+                'rating': float(d.get('rating', 0.0)), 'menu': menu}
+    
+    @staticmethod
+    def order(d: dict, default_time: str) -> dict:
+        return {'id': d['order_id'], 'user_id': d['user_id'], 'rest_id': d['rest_id'],
+                'items': d.get('items', {}), 'sum': float(d.get('total', 0.0)),
+                'status': d.get('status', OrderStatus.created),
+                'time': d.get('time', default_time), 'end_time': d.get('end_time')}
+    
+    # запись раздела section в текущем формате (если она в старом)
+    @classmethod
+    def convert_record(cls, section: str, d: dict, default_time: str) -> dict:
+        if cls.MARKERS[section] not in d:
+            return d
+        if section == 'users':
+            return cls.user(d)
+        if section == 'restaurants':
+            return cls.restaurant(d)
+        return cls.order(d, default_time)
+    
+    # время для заказов без времени: когда файл последний раз менялся
+    @staticmethod
+    def file_time(filename: str) -> str:
+        return datetime.fromtimestamp(os.path.getmtime(filename)).isoformat()
+    
+    # 'legacy' или 'current' по первой записи любого раздела
+    # (файл без записей считается текущим)
+    @classmethod
+    def detect(cls, filename: str) -> str:
+        with open_snapshot(filename, 'r', encoding='utf-8') as f:
+            for key, value in JsonStreamReader(f).sections(cls.SECTIONS):
+                if key in cls.SECTIONS:
+                    return 'legacy' if cls.MARKERS[key] in value else 'current'
+        return 'current'
+    
+    # записи файла по одной в текущем формате: (раздел, словарь);
+    # остальные ключи верхнего уровня (next_ids, ...) отдаются как есть
+    @classmethod
+    def records(cls, filename: str):
+        default_time = cls.file_time(filename)
+        with open_snapshot(filename, 'r', encoding='utf-8') as f:
+            for key, value in JsonStreamReader(f).sections(cls.SECTIONS):
+                if key in cls.SECTIONS:
+                    value = cls.convert_record(key, value, default_time)
+                yield key, value
+    
+    # переписать файл в текущий формат, читая и записывая по одной записи:
+    # память не зависит от размера файла. возвращает число записей по разделам
+    @classmethod
+    def convert(cls, src: str, dst: str, compact: bool = True) -> dict:
+        layout = {'separators': (',', ':')} if compact else {'separators': (', ', ': ')}
+        counts = dict.fromkeys(cls.SECTIONS, 0)
+        with open_snapshot(dst, 'w', encoding='utf-8') as out:
+            out.write('{')
+            current = None  # раздел, массив которого сейчас открыт
+            first_key = True
+            for key, value in cls.records(src):
+                if key != current:
+                    if current is not None:
+                        out.write('\n]')
+                    out.write('\n' if first_key else ',\n')
+                    first_key = False
+                    out.write(json.dumps(key) + ':')
+                    if key in cls.SECTIONS:
+                        out.write('[')
+                        current = key
+                    else:
+                        current = None
+                        out.write(json.dumps(value, ensure_ascii=False, **layout))
+                        continue
+                if counts[key]:
+                    out.write(',')
+                # dumps, а не dump: dump в файл идет через медленный кодировщик на python
+                out.write('\n' + json.dumps(value, ensure_ascii=False, **layout))
+                counts[key] += 1
+            if current is not None:
+                out.write('\n]')
+            # пустой массив читатель не отдает ни одной записью - такие разделы
+            # дописываем пустыми, чтобы у снапшота был тот же набор разделов
+            for key in cls.SECTIONS:
+                if not counts[key]:
+                    out.write(('\n' if first_key else ',\n') + json.dumps(key) + ':[]')
+                    first_key = False
+            out.write('\n}\n')
+        return counts
+
+# главный класс системы
+class FoodDelivery:
+    """основная система доставки"""
+    
+    def __init__(self):
+        self.users = []
+        self.restaurants = []
+        self.orders = []
+        # индексы по id, чтобы искать за O(1) а не перебором списка
+        self.users_by_id = {}
+        self.rests_by_id = {}
+        self.orders_by_id = {}
+        # вторичные индексы
+        self.users_by_email = {}
+        self.users_by_phone = {}
+        self.orders_by_user = {}  # id пользователя -> заказы по возрастанию id
+        self.orders_by_rest = {}  # id ресторана -> заказы по возрастанию id
+        self.orders_by_status = {}  # статус -> {id заказа: заказ}
+        # те же заказы по колонкам и по времени создания, для аналитики.
+        # снаружи берутся через columns и time_index (см. ниже)
+        self.order_columns = OrderColumns()
+        self.order_times = TimeIndex()  # + сводки по часам и дням
+        self.analytics = None  # OrderAnalytics, включается enable_analytics
+        self.lazy = None  # LazyOrders после load_json(lazy=True)
+        self.archive = None  # OrderArchive, подключается open_archive
+        self.counters = OrderCounters()  # счетчики для show_stats
+        self.menu_index = MenuIndex()  # поиск блюд по всем ресторанам
+        self.fragments = FragmentCache()  # готовые куски json/xml для save_json и save_xml_stream
+        self.next_uid = 1
+        self.next_rid = 1
+        self.next_oid = 1
+        # журнал изменений (см. open_journal), по умолчанию выключен
+        self.journal = None
+        self.journal_seq = 0  # номер последней записи, которая уже в системе
+        self.journal_local = threading.local()  # глушение журнала - свое у каждого потока
+        self.journal_lock = threading.Lock()
+        self.journal_snapshot = None
+        # блокировки (см. user_lock/order_lock)
+        self.id_lock = threading.Lock()
+        self.index_lock = threading.RLock()
+        self.user_locks = [threading.RLock() for _ in range(self.LOCK_STRIPES)]
+        self.order_locks = [threading.RLock() for _ in range(self.LOCK_STRIPES)]
+    
+    # добавить пользователя
+    def add_user(self, name: str, email: str, phone: str) -> User:
+        user = User(self.alloc_id('next_uid'), name, email, phone)
+        # запись в журнал до того, как пользователь виден другим потокам:
+        # иначе чужая запись о нем может попасть в журнал раньше этой
+        self.log('u', user.id, name, email, phone)
+        self.put_user(user)
+        return user
+    
+    # положить готового пользователя в список и индекс
+    def put_user(self, user: User):
+        with self.index_lock:
+            self.users.append(user)
+            self.users_by_id[user.id] = user
+            self.users_by_email[user.email] = user
+            self.users_by_phone[user.phone] = user
+            user.system = self
+    
+    # --- блокировки ---
+    # баланс пользователя и сам заказ защищены блокировками "по полосам":
+    # LOCK_STRIPES блокировок на всех, id -> блокировка по остатку от деления.
+    # порядок захвата: заказ, потом пользователь. общие индексы, счетчики и
+    # колонки правятся под короткой index_lock
+    
+    LOCK_STRIPES = 256
+    
+    def user_lock(self, uid: int):
+        return self.user_locks[uid % self.LOCK_STRIPES]
+    
+    def order_lock(self, oid: int):
+        return self.order_locks[oid % self.LOCK_STRIPES]
+    
+    # выдать следующий id из счетчика next_uid/next_rid/next_oid
+    def alloc_id(self, counter: str) -> int:
+        return self.alloc_ids(counter, 1)[0]
+    
+    # выдать сразу n подряд идущих id
+    def alloc_ids(self, counter: str, n: int) -> range:
+        with self.id_lock:
+            first = getattr(self, counter)
+            setattr(self, counter, first + n)
+            return range(first, first + n)
+    
+    # --- пачки ---
+    
+    # добавить много пользователей: строки (имя, почта, телефон[, деньги])
+    def add_users(self, rows) -> List[User]:
+        rows = list(rows)
+        users = []
+        with self.index_lock:
+            for uid, row in zip(self.alloc_ids('next_uid', len(rows)), rows):
+                user = User(uid, *row[:3])
+                self.log('u', uid, *row[:3])
+                self.put_user(user)
+                users.append(user)
+        for user, row in zip(users, rows):
+            if len(row) > 3:
+                user.add_money(row[3])
+        return users
+    
+    # добавить много ресторанов: строки (название, адрес[, телефон[, блюда]])
+    def add_restaurants(self, rows) -> List[Restaurant]:
+        rows = list(rows)
+        rests = []
+        with self.index_lock:
+            for rid, row in zip(self.alloc_ids('next_rid', len(rows)), rows):
+                name, address, phone = row[0], row[1], row[2] if len(row) > 2 else ""
+                rest = Restaurant(rid, name, address, phone)
+                self.log('r', rid, name, address, phone)
+                self.put_rest(rest)
+                rests.append(rest)
+        for rest, row in zip(rests, rows):
+            if len(row) > 3:
+                rest.add_dishes(row[3])
+        return rests
+    
+    # заполнить меню нескольких ресторанов: {id ресторана: [Dish, ...]}
+    def add_menus(self, menus: dict):
+        for rid, dishes in menus.items():
+            rest = self.find_rest(rid)
+            if not rest:
+                raise RestaurantNotFoundError(f"нет ресторана {rid}")
+            rest.add_dishes(dishes)
+    
+    # найти пользователя
+    def find_user(self, uid: int):
+        return self.users_by_id.get(uid)
+    
+    # найти пользователя по почте
+    def find_user_by_email(self, email: str):
+        return self.users_by_email.get(email)
+    
+    # найти пользователя по телефону
+    def find_user_by_phone(self, phone: str):
+        return self.users_by_phone.get(phone)
+    
+    # добавить ресторан
+    def add_restaurant(self, name: str, address: str, phone: str = "") -> Restaurant:
+        rest = Restaurant(self.alloc_id('next_rid'), name, address, phone)
+        self.log('r', rest.id, name, address, phone)
+        self.put_rest(rest)
+        return rest
+    
+    # положить готовый ресторан в список и индекс
+    def put_rest(self, rest: Restaurant):
+        with self.index_lock:
+            self.restaurants.append(rest)
+            self.rests_by_id[rest.id] = rest
+            rest.system = self
+            for dish in rest.menu.values():
+                self.menu_index.add(rest, dish)
+    
+    # в меню ресторана добавили блюдо
+    def dish_indexed(self, rest: Restaurant, dish: Dish):
+        with self.index_lock:
+            self.menu_index.add(rest, dish)
+    
+    # поиск блюд по всем ресторанам (см. MenuIndex.search)
+    def search_dishes(self, text: str = None, category: str = None, min_price: float = None,
+                      max_price: float = None, open_only: bool = False, limit: int = None):
+        with self.index_lock:
+            return self.menu_index.search(text, category, min_price, max_price, open_only, limit)
+    
+    # найти ресторан
+    def find_rest(self, rid: int):
+        return self.rests_by_id.get(rid)
+    
+    # создать заказ
+    def make_order(self, uid: int, rid: int) -> Order:
+        user = self.find_user(uid)
+        rest = self.find_rest(rid)
+        
+        if not user:
+            raise UserNotFoundError(f"нет пользователя {uid}")
+        if not rest:
+            raise RestaurantNotFoundError(f"нет ресторана {rid}")
+        if not rest.open:
+            raise RestaurantClosedError(f"ресторан {rest.name} закрыт")
+        
+        order = Order(self.alloc_id('next_oid'), user, rest)
+        self.log('o', order.id, uid, rid, order.time.isoformat())
+        self.put_order(order)
+        
+        return order
+    
+    # обработать заказ (списать деньги)
+    def process_order(self, oid: int) -> bool:
+        order = self.find_order(oid)
+        if not order:
+            return False
+        self.check_not_archived(order)
+        
+        # проверка баланса и списание под одной блокировкой, иначе два потока
+        # могут оба увидеть что денег хватает
+        with self.order_lock(oid), self.user_lock(order.user.id):
+            # заказ уже оплачен (или отменен) - второй раз не списываем.
+            # проверка под той же блокировкой, что и списание
+            if order.status != OrderStatus.created:
+                print(f"ошибка: заказ {oid} уже {order.status}")
+                return False
+            
+            # в журнал пишем сам запрос: при повторе он даст тот же результат
+            self.log('p', oid)
+            
+            try:
+                # проверяем что в заказе что-то есть
+                if not order.items:
+                    raise DeliveryError("пустой заказ")
+                
+                # хватает ли денег
+                if order.user.money < order.sum:
+                    raise NotEnoughMoneyError(
+                        f"мало денег у {order.user.name}: надо {order.sum}, есть {order.user.money}"
+                    )
+                
+                # списываем
+                order.user.take_money(order.sum)
+                
+                # меняем статус
+                order.change_status(OrderStatus.processing)
+                
+                # добавляем в историю
+                order.user.my_orders.append(order)
+                
+                return True
+                
+            except DeliveryError as e:
+                print(f"ошибка: {e}")
+                if METRICS is not None:
+                    METRICS.error('FoodDelivery.process_order', e)
+                order.change_status(OrderStatus.cancelled)
+                return False
+    
+    # обработать пачку заказов. заказы группируются по пользователю, у каждого
+    # пользователя баланс проверяется и списывается один раз на всю пачку.
+    # внутри группы заказы идут по возрастанию id, поэтому результат тот же,
+    # что у process_order по очереди. ничего не печатает, возвращает
+    # ProcessResult на каждый id в порядке oids (повторы id обрабатываются один раз)
+    def process_orders(self, oids) -> List['ProcessResult']:
+        oids = list(oids)  # идем по oids дважды, генератор бы кончился на первом проходе
+        results = {}
+        by_user = {}
+        for oid in oids:
+            if oid in results:
+                continue
+            order = self.find_order(oid)
+            if not order:
+                results[oid] = self.batch_failed(oid, OrderNotFoundError(f"нет заказа {oid}"))
+                continue
+            results[oid] = None
+            by_user.setdefault(order.user.id, []).append(order)
+        
+        for uid in sorted(by_user):
+            group = sorted(by_user[uid], key=lambda o: o.id)
+            user = group[0].user
+            with contextlib.ExitStack() as stack:
+                # блокировки заказов всегда берем в одном порядке, потом пользователя
+                for stripe in sorted({o.id % self.LOCK_STRIPES for o in group}):
+                    stack.enter_context(self.order_locks[stripe])
+                stack.enter_context(self.user_lock(uid))
+                
+                balance = user.money
+                accepted = []
+                for order in group:
+                    # статус смотрим под блокировкой заказа, как в process_order
+                    if order.status != OrderStatus.created:
+                        results[order.id] = self.batch_failed(order.id, DeliveryError(f"заказ уже {order.status}"))
+                        continue
+                    self.log('p', order.id)
+                    if not order.items:
+                        error = DeliveryError("пустой заказ")
+                    elif balance < order.sum:
+                        error = NotEnoughMoneyError(f"мало денег у {user.name}: надо {order.sum}, есть {balance}")
+                    else:
+                        balance -= order.sum
+                        accepted.append(order)
+                        results[order.id] = ProcessResult(order.id, True)
+                        continue
+                    order.change_status(OrderStatus.cancelled)
+                    results[order.id] = self.batch_failed(order.id, error)
+                
+                # одно списание на всю группу: баланс уже посчитан теми же
+                # вычитаниями, что сделал бы process_order по очереди
+                user.money = balance
+                user.touch()
+                for order in accepted:
+                    order.change_status(OrderStatus.processing)
+                    user.my_orders.append(order)
+        
+        return [results[oid] for oid in oids]
+    
+    # неудача в process_orders: в результат - текст, в метрики - класс ошибки
+    @staticmethod
+    def batch_failed(oid: int, error: DeliveryError) -> 'ProcessResult':
+        if METRICS is not None:
+            METRICS.error('FoodDelivery.process_orders', error)
+        return ProcessResult(oid, False, str(error))
+    
+    # обработать заказы пулом потоков, результат - список True/False в том же порядке
+    def process_orders_parallel(self, oids, workers: int = None) -> List[bool]:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.process_order, oids))
+    
+    # положить готовый заказ в список и индекс
+    def put_order(self, order: Order):
+        with self.index_lock:
+            self.index_add(self.orders, order)
+            self.orders_by_id[order.id] = order
+            order.system = self
+            self.index_add(self.orders_by_user.setdefault(order.user.id, []), order)
+            self.index_add(self.orders_by_rest.setdefault(order.rest.id, []), order)
+            self.orders_by_status.setdefault(order.status, {})[order.id] = order
+            self.order_columns.append(order)
+            self.counters.add(order)
+            self.order_times.add(order)
+    
+    # вставить заказ в список отсортированный по id
+    # обычно id растут, поэтому почти всегда это просто append
+    @staticmethod
+    def index_add(lst: list, order: Order):
+        if not lst or lst[-1].id < order.id:
+            lst.append(order)
+        else:
+            bisect.insort(lst, order, key=lambda o: o.id)
+    
+    # заказ поменял статус - переносим его в индексе
+    def status_changed(self, order: Order, old_status: str):
+        with self.index_lock:
+            if self.lazy is not None and order.id in self.lazy:
+                self.promote(order, old_status, order.sum)
+                if self.analytics is not None and order.status == OrderStatus.completed:
+                    self.analytics.observe(order)
+                return
+            bucket = self.orders_by_status.get(old_status)
+            if bucket is not None:
+                bucket.pop(order.id, None)
+            self.orders_by_status.setdefault(order.status, {})[order.id] = order
+            self.order_columns.update(order)
+            self.counters.moved(order, old_status)
+            self.order_times.status_changed(order, old_status)
+            if self.analytics is not None and order.status == OrderStatus.completed:
+                self.analytics.observe(order)
+    
+    # в заказ добавили блюдо - сумма выросла на amount
+    def dish_added(self, order: Order, dish_name: str, count: int, amount: float):
+        with self.index_lock:
+            if self.lazy is not None and order.id in self.lazy:
+                self.promote(order, order.status, order.sum - amount)
+                self.log('i', order.id, dish_name, count)
+                return
+            self.order_columns.update(order)
+            self.counters.sum_changed(order, amount)
+            self.order_times.sum_changed(order, amount)
+        self.log('i', order.id, dish_name, count)
+    
+    # у заказа поправили время создания или окончания (повтор журнала)
+    def times_changed(self, order: Order, old_time: datetime, old_end_time: datetime):
+        with self.index_lock:
+            if self.lazy is not None and order.id in self.lazy:
+                self.promote(order, order.status, order.sum)
+                return
+            self.order_columns.update(order)
+            self.order_times.retime(order, old_time, old_end_time)
+    
+    # --- архив ---
+    # выполненные и отмененные заказы старше заданного возраста уходят из
+    # памяти в OrderArchive. find_order и orders_of_user находят их и там
+    # (отдают копию только для чтения, в индексах ее нет); остальные запросы,
+    # сохранение и загрузка снапшотов работают только с горячими заказами.
+    # счетчики статистики архивные заказы учитывают
+    
+    ARCHIVE_STATUSES = (OrderStatus.completed, OrderStatus.cancelled)
+    
+    # подключить архив в папке path (создается если нет)
+    def open_archive(self, path: str) -> OrderArchive:
+        with self.index_lock:
+            self.archive = OrderArchive(path)
+            self.counters.merge(self.archive.counters)
+            return self.archive
+    
+    # перенести в архив заказы, завершенные раньше чем max_age назад
+    # (у отмененных считается от создания). возвращает сколько перенесено
+    # при включенном журнале перенос пишется в него записью 'a', а после
+    # переноса журнал сворачивается: в снапшоте архивных заказов уже нет
+    def archive_orders(self, max_age: timedelta, now: datetime = None) -> int:
+        if self.archive is None:
+            raise DeliveryError("архив не подключен (open_archive)")
+        border = (now or datetime.now()) - max_age
+        self.log('a', border.isoformat())
+        moved = self.archive_before(border)
+        self.compact()
+        return moved
+    
+    # перенести заказы, завершенные не позже border. replay=True - повтор из
+    # журнала: если упали между записью архива и свертыванием журнала, часть
+    # заказов уже в архиве - их только убираем из памяти и из счетчиков
+    # (счетчики архива их уже учли)
+    def archive_before(self, border: datetime, replay: bool = False) -> int:
+        self.materialize_all()
+        with self.index_lock:
+            old = sorted((o for st in self.ARCHIVE_STATUSES
+                          for o in self.orders_by_status.get(st, {}).values()
+                          if (o.end_time or o.time) <= border), key=lambda o: o.id)
+            if not old:
+                return 0
+            fresh = old
+            if replay:
+                fresh = [o for o in old if not self.archive.contains(o.id)]
+                fresh_ids = {o.id for o in fresh}
+                for order in old:
+                    if order.id not in fresh_ids:
+                        self.counters.remove(order.status, order.sum)
+            if fresh:
+                self.archive.append(fresh)
+            
+            # дальше заказы уже на диске - убираем их отовсюду в памяти
+            gone = {o.id for o in old}
+            keep = lambda lst: [o for o in lst if o.id not in gone]
+            self.orders = keep(self.orders)
+            for order in old:
+                del self.orders_by_id[order.id]
+                self.orders_by_status[order.status].pop(order.id, None)
+                order.system = None
+            # user.my_orders не трогаем: там только заказы, оплаченные в этом
+            # сеансе, и они остаются видны как были. вся история с архивом - orders_of_user
+            for uid in {o.user.id for o in old}:
+                self.orders_by_user[uid] = keep(self.orders_by_user[uid])
+            for rid in {o.rest.id for o in old}:
+                self.orders_by_rest[rid] = keep(self.orders_by_rest[rid])
+            # колонки и индекс по времени проще собрать заново по оставшимся
+            self.order_columns.clear()
+            self.order_times.clear()
+            for order in self.orders:
+                self.order_columns.append(order)
+                self.order_times.add(order)
+            # счетчики не трогаем: архивные заказы остаются в статистике
+            return len(old)
+    
+    # заказ из архива (find_order отдает копию без system) только для чтения
+    def check_not_archived(self, order: Order):
+        if order.system is None and self.archive is not None:
+            raise DeliveryError(f"заказ {order.id} в архиве, менять его нельзя")
+    
+    # Order из архивной записи (без system: архивный заказ не меняется)
+    def archived_order(self, o_data):
+        if o_data is None:
+            return None
+        user = self.find_user(o_data['user_id'])
+        rest = self.find_rest(o_data['rest_id'])
+        if not user or not rest:
+            return None
+        return Order.from_dict(o_data, user, rest)
+    
+    # --- ленивые заказы ---
+    
+    # ленивый заказ изменился: переносим его в обычные индексы. в счетчиках
+    # он пока числится со старыми статусом и суммой
+    def promote(self, order: Order, old_status: str, old_sum: float):
+        self.lazy.release(order.id, old_status)
+        self.counters.remove(old_status, old_sum)
+        self.put_order(order)
+    
+    # сделать объекты из всех ленивых заказов и выйти из ленивого режима.
+    # зовут методы, которым нужны все заказы сразу (время, колонки, сохранение)
+    def materialize_all(self):
+        if self.lazy is None:
+            return
+        with self.index_lock:
+            lazy, self.lazy = self.lazy, None
+            eager = self.orders
+            self.orders = []
+            self.orders_by_id.clear()
+            self.orders_by_user.clear()
+            self.orders_by_rest.clear()
+            self.orders_by_status.clear()
+            self.order_columns.clear()
+            self.order_times.clear()
+            self.counters.clear()
+            if self.archive is not None:
+                self.counters.merge(self.archive.counters)
+            # все по возрастанию id - тогда put_order только дописывает в конец
+            loaded = (lazy.get(oid) for oid in sorted(lazy.records))
+            lazy.cache_size = len(lazy.records) + 1  # чтобы get не вытеснял уже сделанные
+            for order in heapq.merge(loaded, eager, key=lambda o: o.id):
+                self.put_order(order)
+    
+    # включить top-k аналитику; уже выполненные заказы сразу учитываются
+    def enable_analytics(self, **params) -> 'OrderAnalytics':
+        self.materialize_all()
+        with self.index_lock:
+            self.analytics = OrderAnalytics(**params)
+            self.analytics.observe_history(self.orders)
+            return self.analytics
+    
+    # колонки и индекс по времени строятся по объектам заказов, а в ленивом
+    # режиме их нет - перед чтением делаем все заказы
+    @property
+    def columns(self) -> OrderColumns:
+        self.materialize_all()
+        return self.order_columns
+    
+    @property
+    def time_index(self) -> TimeIndex:
+        self.materialize_all()
+        return self.order_times
+    
+    # после загрузки снапшота включенная аналитика считается заново по новым
+    # заказам (в ленивом режиме для этого делаются все заказы)
+    def reseed_analytics(self):
+        if self.analytics is None:
+            return
+        self.materialize_all()
+        with self.index_lock:
+            self.analytics.reset()
+            self.analytics.observe_history(self.orders)
+    
+    # заказы, созданные в [start, end)
+    def orders_between(self, start: datetime, end: datetime) -> List[Order]:
+        self.materialize_all()
+        with self.index_lock:
+            return self.order_times.between(start, end)
+    
+    # найти заказ
+    def find_order(self, oid: int):
+        order = self.orders_by_id.get(oid)
+        if order is None and self.lazy is not None:
+            with self.index_lock:
+                order = self.lazy.get(oid) if self.lazy is not None else self.orders_by_id.get(oid)
+        if order is None and self.archive is not None:
+            order = self.archived_order(self.archive.get(oid))
+        return order
+    
+    # вся история заказов пользователя по возрастанию id, с архивными
+    # (если архив подключен). архивные отдаются копиями только для чтения
+    def orders_of_user(self, uid: int) -> List[Order]:
+        orders = self.with_lazy(self.orders_by_user.get(uid, []), 'by_user', uid)
+        if self.archive is not None:
+            archived = [self.archived_order(d) for d in self.archive.user_records(uid)]
+            orders = list(heapq.merge([o for o in archived if o is not None], orders, key=lambda o: o.id))
+        return orders
+    
+    # все заказы ресторана
+    def orders_of_rest(self, rid: int) -> List[Order]:
+        return self.with_lazy(self.orders_by_rest.get(rid, []), 'by_rest', rid)
+    
+    # все заказы в статусе
+    def orders_with_status(self, status: str) -> List[Order]:
+        orders = sorted(self.orders_by_status.get(status, {}).values(), key=lambda o: o.id)
+        return self.with_lazy(orders, 'by_status', status)
+    
+    # заказы из обычного индекса плюс ленивые из такого же индекса LazyOrders
+    def with_lazy(self, orders: list, index: str, key) -> List[Order]:
+        if self.lazy is None:
+            return list(orders)
+        with self.index_lock:
+            if self.lazy is None:
+                return list(orders)
+            loaded = self.lazy.get_many(getattr(self.lazy, index).get(key, ()))
+            return list(heapq.merge(loaded, orders, key=lambda o: o.id))
+    
+    # --- запросы по заказам ---
+    
+    # ленивый запрос по заказам с фильтрами
+    # status можно передать строкой или списком статусов
+    # after_id - курсор: отдаем только заказы с id больше него
+    def query_orders(self, user_id: int = None, rest_id: int = None, status=None, after_id: int = 0):
+        self.materialize_all()
+        if isinstance(status, str):
+            status = (status,)
+        
+        # кандидаты из каждого индекса, выбираем самый маленький
+        sources = []
+        if user_id is not None:
+            lst = self.orders_by_user.get(user_id, [])
+            sources.append((len(lst), 'list', lst))
+        if rest_id is not None:
+            lst = self.orders_by_rest.get(rest_id, [])
+            sources.append((len(lst), 'list', lst))
+        if status is not None:
+            buckets = [self.orders_by_status.get(st, {}) for st in status]
+            sources.append((sum(len(b) for b in buckets), 'status', buckets))
+        
+        if not sources:
+            candidates = self.iter_sorted_after(self.orders, after_id)
+        else:
+            size, kind, src = min(sources, key=lambda x: x[0])
+            if kind == 'list':
+                candidates = self.iter_sorted_after(src, after_id)
+            else:
+                # в индексе статусов порядок не по id, сортируем только подходящие
+                ids = sorted(oid for b in src for oid in b if oid > after_id)
+                candidates = (self.orders_by_id[oid] for oid in ids)
+        
+        for order in candidates:
+            if user_id is not None and order.user.id != user_id:
+                continue
+            if rest_id is not None and order.rest.id != rest_id:
+                continue
+            if status is not None and order.status not in status:
+                continue
+            yield order
+    
+    # пропустить в отсортированном списке всё до курсора
+    @staticmethod
+    def iter_sorted_after(lst: list, after_id: int):
+        start = bisect.bisect_right(lst, after_id, key=lambda o: o.id) if after_id else 0
+        return itertools.islice(lst, start, None)
+    
+    # одна страница результата и курсор для следующей (None если дальше пусто)
+    def page_orders(self, limit: int = 50, cursor: int = 0, **filters):
+        page = list(itertools.islice(self.query_orders(after_id=cursor or 0, **filters), limit + 1))
+        if len(page) > limit:
+            page = page[:limit]
+            return page, page[-1].id
+        return page, None
+    
+    # завершить заказ
+    def finish_order(self, oid: int) -> bool:
+        order = self.find_order(oid)
+        if not order:
+            return False
+        self.check_not_archived(order)
+        with self.order_lock(oid):
+            if order.status in [OrderStatus.processing, OrderStatus.delivering]:
+                order.change_status(OrderStatus.completed)
+                self.log('f', oid, order.end_time.isoformat())
+                return True
+        return False
+    
+    # отменить заказ
+    def cancel_order(self, oid: int) -> bool:
+        order = self.find_order(oid)
+        if not order:
+            return False
+        self.check_not_archived(order)
+        with self.order_lock(oid):
+            # выполненный не отменить, отмененный второй раз не отменяем
+            if order.status in (OrderStatus.completed, OrderStatus.cancelled):
+                return False
+            old_status = order.status
+            order.change_status(OrderStatus.cancelled)
+            # возвращаем деньги если уже списали. повтор записи 'c' из журнала
+            # застает заказ в том же статусе и возвращает их снова, поэтому
+            # сам возврат в журнал не пишем
+            if old_status in (OrderStatus.processing, OrderStatus.delivering):
+                with self.journal_muted():
+                    order.user.add_money(order.sum)
+            self.log('c', oid)
+            return True
+    
+    # очистить систему (списки и индексы вместе)
+    def clear(self):
+        self.users.clear()
+        self.restaurants.clear()
+        self.orders.clear()
+        self.users_by_id.clear()
+        self.rests_by_id.clear()
+        self.orders_by_id.clear()
+        self.users_by_email.clear()
+        self.users_by_phone.clear()
+        self.orders_by_user.clear()
+        self.orders_by_rest.clear()
+        self.orders_by_status.clear()
+        self.order_columns.clear()
+        self.order_times.clear()
+        self.counters.clear()
+        self.menu_index.clear()
+        self.fragments.clear()
+        self.lazy = None
+        # аналитика остается включенной, но начинает с нуля
+        if self.analytics is not None:
+            self.analytics.reset()
+        # архив остается подключенным: его заказы по-прежнему в статистике
+        if self.archive is not None:
+            self.counters.merge(self.archive.counters)
+    
+    # --- журнал изменений ---
+    
+    # записать изменение в журнал (если он включен и не заглушен)
+    def log(self, *record):
+        if self.journal is not None and not getattr(self.journal_local, 'mute', 0):
+            with self.journal_lock:
+                self.journal_seq += 1
+                self.journal.append([self.journal_seq, *record])
+    
+    # внутри блока изменения в журнал не пишутся (повтор журнала, вложенные вызовы)
+    @contextlib.contextmanager
+    def journal_muted(self):
+        self.journal_local.mute = getattr(self.journal_local, 'mute', 0) + 1
+        try:
+            yield
+        finally:
+            self.journal_local.mute -= 1
+    
+    # поднять систему из снапшота + журнала и дальше писать изменения в журнал
+    # group_commit - через сколько записей делать fsync,
+    # sync_interval - или не реже чем раз в столько секунд
+    def open_journal(self, snapshot: str, journal_path: str, group_commit: int = 1,
+                     sync_interval: float = None):
+        self.close_journal()
+        self.clear()
+        self.journal_seq = 0
+        if os.path.exists(snapshot):
+            self.load_json_stream(snapshot)
+        
+        replayed = 0
+        with self.journal_muted():
+            for record in Journal.read(journal_path):
+                # записи до снапшота уже в нем (упали между снапшотом и очисткой журнала)
+                if record[0] <= self.journal_seq:
+                    continue
+                self.replay(record)
+                self.journal_seq = record[0]
+                replayed += 1
+        
+        self.journal = Journal(journal_path, group_commit, sync_interval)
+        self.journal_snapshot = snapshot
+        print(f"из журнала повторено записей: {replayed}")
+    
+    # применить одну запись журнала
+    def replay(self, record: list):
+        kind, args = record[1], record[2:]
+        # u/r/o: объект получает ровно id из записи. потоки берут id и пишут
+        # журнал не одновременно, так что id в журнале могут идти не по порядку
+        if kind == 'u':
+            self.replay_id('next_uid', args[0])
+            self.put_user(User(*args))
+        elif kind == 'r':
+            self.replay_id('next_rid', args[0])
+            self.put_rest(Restaurant(*args))
+        elif kind == 'd':
+            self.find_rest(args[0]).add_dish(Dish(*args[1:]))
+        elif kind == 's':
+            self.find_rest(args[0]).switch_open()
+        elif kind == 'g':
+            self.find_rest(args[0]).set_rating(args[1])
+        elif kind == 'm':
+            self.find_user(args[0]).add_money(args[1])
+        elif kind == 'o':
+            user, rest = self.find_user(args[1]), self.find_rest(args[2])
+            if not user or not rest:
+                raise DeliveryError(f"заказ из журнала без пользователя или ресторана: {record}")
+            self.replay_id('next_oid', args[0])
+            order = Order(args[0], user, rest)
+            order.time = datetime.fromisoformat(args[3])
+            self.put_order(order)
+        elif kind == 'i':
+            self.find_order(args[0]).add_dish(args[1], args[2])
+        elif kind == 'p':
+            self.process_order(args[0])
+        elif kind == 'f':
+            if self.finish_order(args[0]):
+                order = self.find_order(args[0])
+                old_end, order.end_time = order.end_time, datetime.fromisoformat(args[1])
+                self.times_changed(order, order.time, old_end)
+        elif kind == 'c':
+            self.cancel_order(args[0])
+        elif kind == 'a':
+            # без подключенного архива заказы просто остаются в памяти
+            if self.archive is not None:
+                self.archive_before(datetime.fromisoformat(args[0]), replay=True)
+        else:
+            raise DeliveryError(f"неизвестная запись журнала: {record}")
+    
+    # счетчик id при повторе только растет: следующий новый id больше повторенного
+    def replay_id(self, counter: str, used: int):
+        with self.id_lock:
+            if getattr(self, counter) <= used:
+                setattr(self, counter, used + 1)
+    
+    # свернуть журнал в новый снапшот и начать журнал заново
+    def compact(self):
+        if self.journal is None:
+            return
+        self.journal.sync()
+        tmp = self.journal_snapshot + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot_dict(), f, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_snapshot)
+        # снапшот на месте, теперь старые записи не нужны
+        self.journal.truncate()
+    
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+    
+    # --- работа с файлами ---
+    
+    # все данные системы одним словарем (для снапшота)
+    def snapshot_dict(self) -> dict:
+        self.materialize_all()
+        data = {
+            'users': [u.to_dict() for u in self.users],
+            'restaurants': [r.to_dict() for r in self.restaurants],
+            'orders': [o.to_dict() for o in self.orders],
+            'next_ids': {
+                'user': self.next_uid,
+                'rest': self.next_rid,
+                'order': self.next_oid
+            }
+        }
+        if self.journal_seq:
+            data['journal_seq'] = self.journal_seq
+        return data
+    
+    # сохранить в json. compact=True - без отступов и пробелов (файл в разы меньше)
+    # .gz/.bz2/.xz в имени файла - сжатие (см. open_snapshot)
+    # файл тот же, что дал бы json.dump(snapshot_dict()), но пользователи и
+    # рестораны берутся готовыми из self.fragments. True - файл записан
+    def save_json(self, filename: str, compact: bool = False) -> bool:
+        try:
+            with open_snapshot(filename, 'w', encoding='utf-8') as f:
+                self.write_json(f, compact)
+            print(f"сохранено в {filename}")
+            return True
+        except Exception as e:
+            print(f"ошибка сохранения json: {e}")
+            return False
+    
+    # содержимое save_json в открытый текстовый файл
+    def write_json(self, f, compact: bool = False):
+        self.materialize_all()
+        fragments = self.fragments
+        next_ids = {'user': self.next_uid, 'rest': self.next_rid, 'order': self.next_oid}
+        sections = [
+            ('users', self.users, lambda u: fragments.user_json(u, compact)),
+            ('restaurants', self.restaurants, lambda r: fragments.rest_json(r, compact)),
+            ('orders', self.orders, lambda o: FragmentCache.dumps(o.to_dict(), compact, 2)),
+            ('next_ids', None, FragmentCache.dumps(next_ids, compact, 1)),
+        ]
+        if self.journal_seq:
+            sections.append(('journal_seq', None, str(self.journal_seq)))
+        # разделители как у json.dump: с отступами или без пробелов вовсе
+        if compact:
+            key_sep, top_sep, item_sep, open_list, close_list, close = ':', ',', ',', '[', ']', '}'
+        else:
+            key_sep, top_sep, item_sep = ': ', ',\n  ', ',\n    '
+            open_list, close_list, close = '[\n    ', '\n  ]', '\n}'
+        
+        f.write('{' if compact else '{\n  ')
+        for i, (key, items, encode) in enumerate(sections):
+            if i:
+                f.write(top_sep)
+            f.write(json.dumps(key) + key_sep)
+            if items is None:
+                f.write(encode)
+            elif not items:
+                f.write('[]')
+            else:
+                f.write(open_list)
+                f.write(item_sep.join(map(encode, items)))
+                f.write(close_list)
+        f.write(close)
+    
+    # загрузить из json. lazy=True - заказы не превращаются в объекты сразу,
+    # а остаются словарями до первого обращения (см. LazyOrders)
+    def load_json(self, filename: str, lazy: bool = False, cache_size: int = 100000):
+        try:
+            with open_snapshot(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"ошибка загрузки json: {e}")
+            return
+        
+        # очищаем
+        self.clear()
+        
+        # пользователи
+        for u_data in data.get('users', []):
+            self.put_user(User.from_dict(u_data))
+        
+        # рестораны
+        for r_data in data.get('restaurants', []):
+            self.put_rest(Restaurant.from_dict(r_data))
+        
+        # заказы
+        if lazy:
+            self.put_lazy_orders(data.get('orders', []), cache_size)
+        else:
+            for o_data in data.get('orders', []):
+                self.put_order_dict(o_data)
+        
+        # id для следующих
+        self.set_next_ids(data.get('next_ids', {}))
+        self.journal_seq = data.get('journal_seq', 0)
+        
+        # в ленивом режиме счетчики только что посчитаны по тем же словарям
+        if not lazy:
+            self.reconcile_stats()
+        self.reseed_analytics()
+        print(f"загружено из {filename}")
+    
+    # заказы снапшота без создания объектов: в LazyOrders и в счетчики
+    def put_lazy_orders(self, orders: list, cache_size: int):
+        lazy = self.lazy = LazyOrders(self, cache_size)
+        pairs = []
+        for o_data in orders:
+            if o_data['user_id'] in self.users_by_id and o_data['rest_id'] in self.rests_by_id:
+                lazy.add(o_data)
+                pairs.append((o_data['status'], o_data['sum']))
+        self.counters.rebuild_pairs(pairs)
+        if self.archive is not None:
+            self.counters.merge(self.archive.counters)
+    
+    # загрузить json любого формата: текущего или старого (food_data.json,
+    # см. LegacySchema). файл читается потоково, записи старого формата
+    # переводятся по одной
+    def import_json(self, filename: str):
+        try:
+            schema = LegacySchema.detect(filename)
+        except Exception as e:
+            print(f"ошибка загрузки json: {e}")
+            return
+        if schema == 'current':
+            self.load_json_stream(filename)
+            return
+        
+        self.clear()
+        try:
+            for key, value in LegacySchema.records(filename):
+                if key == 'users':
+                    self.put_user(User.from_dict(value))
+                elif key == 'restaurants':
+                    self.put_rest(Restaurant.from_dict(value))
+                elif key == 'orders':
+                    self.put_order_dict(value)
+                elif key == 'next_ids':
+                    self.set_next_ids(value)
+        except Exception as e:
+            self.load_failed(True)
+            print(f"ошибка загрузки json: {e}")
+            return
+        self.reconcile_stats()
+        self.reseed_analytics()
+        print(f"загружено из {filename} (старый формат)")
+    
+    # заказ из словаря снапшота (если пользователь и ресторан есть)
+    def put_order_dict(self, o_data: dict):
+        user = self.find_user(o_data['user_id'])
+        rest = self.find_rest(o_data['rest_id'])
+        if user and rest:
+            self.put_order(Order.from_dict(o_data, user, rest))
+    
+    def set_next_ids(self, next_ids: dict):
+        self.next_uid = next_ids.get('user', 1)
+        self.next_rid = next_ids.get('rest', 1)
+        self.next_oid = next_ids.get('order', 1)
+    
+    # потоковая загрузка json: читаем файл кусками и создаем объекты по одному,
+    # целиком файл в память не попадает
+    # progress(раздел, сколько записей, сколько символов прочитано) вызывается
+    # каждые progress_every записей
+    def load_json_stream(self, filename: str, progress=None, progress_every: int = 100000,
+                         chunk_size: int = 1 << 20):
+        counts = {'users': 0, 'restaurants': 0, 'orders': 0}
+        started = False
+        try:
+            with open_snapshot(filename, 'r', encoding='utf-8') as f:
+                reader = JsonStreamReader(f, chunk_size)
+                # чистим только когда файл открылся и в нем json объект
+                if reader.peek() != '{':
+                    raise ValueError("в файле не json объект")
+                self.clear()
+                started = True
+                for key, value in reader.sections(('users', 'restaurants', 'orders')):
+                    if key == 'users':
+                        self.put_user(User.from_dict(value))
+                    elif key == 'restaurants':
+                        self.put_rest(Restaurant.from_dict(value))
+                    elif key == 'orders':
+                        self.put_order_dict(value)
+                    elif key == 'next_ids':
+                        self.set_next_ids(value)
+                        continue
+                    elif key == 'journal_seq':
+                        self.journal_seq = value
+                        continue
+                    else:
+                        continue
+                    
+                    counts[key] += 1
+                    if progress and counts[key] % progress_every == 0:
+                        progress(key, counts[key], reader.chars_read)
+        except Exception as e:
+            self.load_failed(started)
+            print(f"ошибка загрузки json: {e}")
+            return
+        
+        if progress:
+            for key, n in counts.items():
+                progress(key, n, reader.chars_read)
+        self.reconcile_stats()
+        self.reseed_analytics()
+        print(f"загружено из {filename}")
+    
+    # потоковые загрузчики чистят систему только после того, как файл открылся
+    # и начало у него правильное: иначе остаются старые данные. если файл
+    # оборвался или испорчен посередине, часть записей уже в системе -
+    # тогда она очищается целиком, чтобы не работать с половиной снапшота
+    def load_failed(self, started: bool):
+        if started:
+            self.clear()
+    
+    # сохранить в xml. True - файл записан
+    def save_xml(self, filename: str) -> bool:
+        self.materialize_all()
+        root = ET.Element('delivery_system')
+        
+        # пользователи
+        users_elem = ET.SubElement(root, 'users')
+        for user in self.users:
+            users_elem.append(user.to_xml())
+        
+        # рестораны
+        rests_elem = ET.SubElement(root, 'restaurants')
+        for rest in self.restaurants:
+            rests_elem.append(rest.to_xml())
+        
+        # заказы
+        orders_elem = ET.SubElement(root, 'orders')
+        for order in self.orders:
+            orders_elem.append(order.to_xml())
+        
+        # id
+        ids_elem = ET.SubElement(root, 'ids')
+        ET.SubElement(ids_elem, 'user').text = str(self.next_uid)
+        ET.SubElement(ids_elem, 'rest').text = str(self.next_rid)
+        ET.SubElement(ids_elem, 'order').text = str(self.next_oid)
+        
+        # сохраняем
+        tree = ET.ElementTree(root)
+        try:
+            with open_snapshot(filename, 'wb') as f:
+                tree.write(f, encoding='utf-8', xml_declaration=True)
+            print(f"сохранено в {filename}")
+            return True
+        except Exception as e:
+            print(f"ошибка сохранения xml: {e}")
+            return False
+    
+    # загрузить из xml
+    def load_xml(self, filename: str):
+        try:
+            with open_snapshot(filename, 'rb') as f:
+                root = ET.parse(f).getroot()
+        except Exception as e:
+            print(f"ошибка загрузки xml: {e}")
+            return
+        
+        # очищаем
+        self.clear()
+        
+        # пользователи
+        users_elem = root.find('users')
+        if users_elem:
+            for user_elem in users_elem.findall('user'):
+                self.put_user(User.from_xml(user_elem))
+        
+        # рестораны
+        rests_elem = root.find('restaurants')
+        if rests_elem:
+            for rest_elem in rests_elem.findall('restaurant'):
+                self.put_rest(Restaurant.from_xml(rest_elem))
+        
+        # заказы
+        orders_elem = root.find('orders')
+        if orders_elem:
+            for order_elem in orders_elem.findall('order'):
+                self.put_order_xml(order_elem)
+        
+        # id
+        ids_elem = root.find('ids')
+        if ids_elem:
+            self.set_next_ids_xml(ids_elem)
+        
+        self.reconcile_stats()
+        self.reseed_analytics()
+        print(f"загружено из {filename}")
+    
+    # заказ из xml элемента (если пользователь и ресторан есть)
+    def put_order_xml(self, order_elem):
+        user = self.find_user(int(order_elem.find('user_id').text))
+        rest = self.find_rest(int(order_elem.find('rest_id').text))
+        if user and rest:
+            self.put_order(Order.from_xml(order_elem, user, rest))
+    
+    # --- параллельная загрузка ---
+    
+    # загрузить снапшот save_json (fmt='json') или save_xml (fmt='xml') пулом
+    # процессов: файл делится на куски по границам записей (SnapshotChunks),
+    # куски разбираются параллельно, потом за один проход по заказам
+    # расставляются ссылки на пользователей и рестораны
+    def load_parallel(self, filename: str, fmt: str = 'json', workers: int = None):
+        if snapshot_codec(filename) is not None:
+            # в сжатом потоке нельзя перейти к нужному байту - читаем как обычно
+            getattr(self, f'load_{fmt}')(filename)
+            return
+        workers = workers or os.cpu_count() or 1
+        try:
+            # кусков больше чем процессов - чтобы неровные куски не ждали друг друга
+            tasks, top = SnapshotChunks.plan(filename, fmt, workers * 4)
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            with ctx.Pool(workers) as pool:
+                parts = pool.map(parse_snapshot_chunk, tasks)
+        except Exception as e:
+            print(f"ошибка параллельной загрузки {fmt}: {e}")
+            return
+        
+        self.clear()
+        for (_, _, section, _, _), part in zip(tasks, parts):
+            if section == 'users':
+                for user in part:
+                    self.put_user(user)
+            elif section == 'restaurants':
+                for rest in part:
+                    self.put_rest(rest)
+            else:
+                for row in part:
+                    self.put_order_row(row)
+        
+        if fmt == 'json':
+            self.set_next_ids(top.get('next_ids', {}))
+            self.journal_seq = top.get('journal_seq', 0)
+        elif top is not None:
+            self.set_next_ids_xml(top)
+        
+        self.reconcile_stats()
+        self.reseed_analytics()
+        print(f"загружено из {filename}")
+    
+    def load_json_parallel(self, filename: str, workers: int = None):
+        self.load_parallel(filename, 'json', workers)
+    
+    def load_xml_parallel(self, filename: str, workers: int = None):
+        self.load_parallel(filename, 'xml', workers)
+    
+    # заказ из строки parse_snapshot_chunk (если пользователь и ресторан есть)
+    def put_order_row(self, row):
+        oid, uid, rid, items, total, status, created, ended = row
+        user = self.users_by_id.get(uid)
+        rest = self.rests_by_id.get(rid)
+        if user and rest:
+            order = Order(oid, user, rest)
+            order.items = {rest.intern_name(name): count for name, count in items.items()}
+            order.sum = total
+            order.status = sys.intern(status)
+            order.time = created
+            order.end_time = ended
+            self.put_order(order)
+    
+    def set_next_ids_xml(self, ids_elem):
+        self.next_uid = int(ids_elem.find('user').text)
+        self.next_rid = int(ids_elem.find('rest').text)
+        self.next_oid = int(ids_elem.find('order').text)
+    
+    # потоковая запись xml: каждый элемент сериализуем и сразу пишем в файл,
+    # дерево целиком не строится. байт в байт совпадает с save_xml. True - файл записан
+    def save_xml_stream(self, filename: str) -> bool:
+        try:
+            with open_snapshot(filename, 'w', encoding='utf-8', errors='xmlcharrefreplace') as f:
+                self.write_xml(f)
+            print(f"сохранено в {filename}")
+            return True
+        except Exception as e:
+            print(f"ошибка сохранения xml: {e}")
+            return False
+    
+    # содержимое save_xml_stream в открытый текстовый файл
+    # (файл открывается с errors='xmlcharrefreplace')
+    def write_xml(self, f):
+        self.materialize_all()
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n<delivery_system>")
+        for tag, items in (('users', self.users), ('restaurants', self.restaurants),
+                           ('orders', self.orders)):
+            if not items:
+                f.write(f"<{tag} />")
+                continue
+            f.write(f"<{tag}>")
+            if tag == 'users':
+                f.write(''.join(map(self.fragments.user_xml, items)))
+            elif tag == 'restaurants':
+                f.write(''.join(map(self.fragments.rest_xml, items)))
+            else:
+                for item in items:
+                    f.write(ET.tostring(item.to_xml(), encoding='unicode'))
+            f.write(f"</{tag}>")
+        f.write(f"<ids><user>{self.next_uid}</user><rest>{self.next_rid}</rest>"
+                f"<order>{self.next_oid}</order></ids></delivery_system>")
+    
+    # потоковая загрузка xml через iterparse:
+    # запись разбираем как только закрылся ее тег и сразу выкидываем из дерева
+    def load_xml_stream(self, filename: str, progress=None, progress_every: int = 100000):
+        handlers = {
+            'user': lambda elem: self.put_user(User.from_xml(elem)),
+            'restaurant': lambda elem: self.put_rest(Restaurant.from_xml(elem)),
+            'order': self.put_order_xml,
+        }
+        counts = {'user': 0, 'restaurant': 0, 'order': 0}
+        started = False
+        try:
+            depth = 1
+            section = None
+            with open_snapshot(filename, 'rb') as f:
+                events = ET.iterparse(f, events=('start', 'end'))
+                # чистим только когда файл открылся и начинается с корня снапшота
+                event, root = next(events)
+                if root.tag != 'delivery_system':
+                    raise ValueError(f"в файле не снапшот, а <{root.tag}>")
+                self.clear()
+                started = True
+                for event, elem in events:
+                    if event == 'start':
+                        depth += 1
+                        if depth == 2:
+                            section = elem
+                        continue
+                    
+                    depth -= 1
+                    if depth == 2 and elem.tag in handlers and section.tag != 'ids':
+                        handlers[elem.tag](elem)
+                        # запись больше не нужна - убираем из раздела
+                        section.clear()
+                        counts[elem.tag] += 1
+                        if progress and counts[elem.tag] % progress_every == 0:
+                            progress(elem.tag, counts[elem.tag])
+                    elif depth == 1 and elem.tag == 'ids':
+                        self.set_next_ids_xml(elem)
+        except Exception as e:
+            self.load_failed(started)
+            print(f"ошибка загрузки xml: {e}")
+            return
+        
+        if progress:
+            for tag, n in counts.items():
+                progress(tag, n)
+        self.reconcile_stats()
+        self.reseed_analytics()
+        print(f"загружено из {filename}")
+    
+    # сохранить в двоичный формат (см. BinSnapshot). True - файл записан
+    def save_bin(self, filename: str) -> bool:
+        try:
+            with open_snapshot(filename, 'wb') as f:
+                self.write_bin(f)
+            print(f"сохранено в {filename}")
+            return True
+        except Exception as e:
+            print(f"ошибка сохранения bin: {e}")
+            return False
+    
+    # содержимое save_bin в открытый двоичный файл
+    def write_bin(self, f):
+        self.materialize_all()
+        BinSnapshot.write(self, f)
+    
+    # загрузить из двоичного формата; use_mmap - читать файл через mmap, не копируя в память
+    # (сжатый файл так не прочитать: он распаковывается в память целиком)
+    def load_bin(self, filename: str, use_mmap: bool = True):
+        started = False
+        
+        # чистим только когда файл открылся и у него заголовок снапшота
+        def read(buf):
+            nonlocal started
+            BinSnapshot.check(buf)
+            self.clear()
+            started = True
+            BinSnapshot.read(self, buf)
+        
+        try:
+            with open_snapshot(filename, 'rb') as f:
+                if use_mmap and snapshot_codec(filename) is None and os.path.getsize(filename) > 0:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        view = memoryview(mm)
+                        try:
+                            read(view)
+                        finally:
+                            view.release()
+                else:
+                    read(f.read())
+        except Exception as e:
+            self.load_failed(started)
+            print(f"ошибка загрузки bin: {e}")
+            return
+        self.reconcile_stats()
+        self.reseed_analytics()
+        print(f"загружено из {filename}")
+    
+    # статистика за O(1) из счетчиков
+    def stats(self) -> dict:
+        return {
+            'users': len(self.users),
+            'restaurants': len(self.restaurants),
+            'orders': len(self.orders) + (len(self.lazy) if self.lazy is not None else 0)
+                      + (len(self.archive) if self.archive is not None else 0),
+            'by_status': {st: n for st, n in self.counters.counts.items() if n},
+            'completed': self.counters.completed(),
+            'revenue': self.counters.revenue(),
+            'average': self.counters.average(),
+        }
+    
+    # пересчитать счетчики по заказам и сравнить с тем что было
+    # возвращает True если расхождений не было
+    def reconcile_stats(self) -> bool:
+        self.materialize_all()
+        old_counts = {st: n for st, n in self.counters.counts.items() if n}
+        old_sums = dict(self.counters.sums)
+        self.counters.rebuild(self.orders)
+        if self.archive is not None:
+            self.counters.merge(self.archive.counters)
+        ok = old_counts == self.counters.counts and all(
+            math.isclose(old_sums.get(st, 0.0), total, rel_tol=1e-9, abs_tol=1e-6)
+            for st, total in self.counters.sums.items())
+        if not ok:
+            print("счетчики статистики разошлись с заказами, пересчитаны")
+        return ok
+    
+    # показать статистику
+    def show_stats(self):
+        stats = self.stats()
+        print("\n" + "="*40)
+        print("статистика системы:")
+        print(f"пользователей: {stats['users']}")
+        print(f"ресторанов: {stats['restaurants']}")
+        print(f"заказов: {stats['orders']}")
+        
+        if stats['completed']:
+            print(f"выручка: {stats['revenue']:.2f} руб.")
+            print(f"средний заказ: {stats['average']:.2f} руб.")
+        
+        print("="*40)
+
+# --- хранение в sqlite ---
+
+# пользователь из SqliteDelivery: объект могли выкинуть из карты и прочитать
+# заново, поэтому my_orders (история) читается из базы при первом обращении
+class SqliteUser(User):
+    __slots__ = ()
+    history = User.__dict__['my_orders']  # сама ячейка my_orders из User.__slots__
+    
+    @property
+    def my_orders(self):
+        orders = SqliteUser.history.__get__(self)
+        if orders is None:
+            orders = self.system.paid_orders(self.id)
+            SqliteUser.history.__set__(self, orders)
+        return orders
+    
+    @my_orders.setter
+    def my_orders(self, orders):
+        SqliteUser.history.__set__(self, orders)
+
+# FoodDelivery поверх sqlite: данные на диске, в памяти только то, что сейчас нужно
+class SqliteDelivery:
+    """те же методы, что у FoodDelivery, но данные лежат в базе sqlite
+    
+    User/Restaurant/Order создаются при первом обращении и лежат в карте
+    идентичности: пока объект кому-то нужен, find_* отдает именно его, потом
+    пользователь или заказ выгружается (рестораны остаются). изменения объектов (деньги, блюда,
+    статусы) сразу пишутся в базу через те же хуки, что зовет FoodDelivery
+    (log, dish_added, status_changed). одна транзакция на операцию или одна
+    на весь блок with system.batch()
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY, name TEXT, email TEXT, phone TEXT, money REAL);
+        CREATE INDEX IF NOT EXISTS users_email ON users(email);
+        CREATE INDEX IF NOT EXISTS users_phone ON users(phone);
+        CREATE TABLE IF NOT EXISTS restaurants (
+            id INTEGER PRIMARY KEY, name TEXT, address TEXT, phone TEXT, open INTEGER, rating REAL);
+        CREATE TABLE IF NOT EXISTS dishes (
+            rest_id INTEGER, name TEXT, price REAL, desc TEXT, category TEXT,
+            UNIQUE (rest_id, name));
+        CREATE INDEX IF NOT EXISTS dishes_price ON dishes(price);
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY, user_id INTEGER, rest_id INTEGER, sum REAL,
+            status TEXT, time TEXT, end_time TEXT);
+        CREATE INDEX IF NOT EXISTS orders_user ON orders(user_id, id);
+        CREATE INDEX IF NOT EXISTS orders_rest ON orders(rest_id, id);
+        CREATE INDEX IF NOT EXISTS orders_status ON orders(status, id);
+        CREATE INDEX IF NOT EXISTS orders_time ON orders(time);
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id INTEGER, dish TEXT, count INTEGER, UNIQUE (order_id, dish));
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+    """
+    
+    # запросы - константы: sqlite3 держит их скомпилированными в своем кэше
+    INSERT_USER = "INSERT INTO users (id, name, email, phone, money) VALUES (?, ?, ?, ?, ?)"
+    INSERT_REST = "INSERT INTO restaurants (id, name, address, phone, open, rating) VALUES (?, ?, ?, ?, ?, ?)"
+    UPSERT_DISH = ("INSERT INTO dishes (rest_id, name, price, desc, category) VALUES (?, ?, ?, ?, ?) "
+                   "ON CONFLICT (rest_id, name) DO UPDATE SET "
+                   "price = excluded.price, desc = excluded.desc, category = excluded.category")
+    INSERT_ORDER = ("INSERT INTO orders (id, user_id, rest_id, sum, status, time, end_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)")
+    ADD_ITEM = ("INSERT INTO order_items (order_id, dish, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (order_id, dish) DO UPDATE SET count = count + excluded.count")
+    
+    BATCH_ROWS = 10000  # строк на один executemany при миграции
+    
+    # те же блокировки-заглушки для объектов: соединение одно, поэтому и блокировка одна
+    LOCK_STRIPES = 1
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # lower() в sqlite понимает только латиницу
+        self.db.create_function('py_lower', 1, str.lower, deterministic=True)
+        self.db.executescript(self.SCHEMA)
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        # карта идентичности: id -> объект, пока на него есть ссылки.
+        # ресторанов мало, а меню читать дорого - они остаются в памяти насовсем
+        self.users_by_id = weakref.WeakValueDictionary()
+        self.rests_by_id = {}
+        self.orders_by_id = weakref.WeakValueDictionary()
+        self.next_uid = self.next_id('next_uid', 'users')
+        self.next_rid = self.next_id('next_rid', 'restaurants')
+        self.next_oid = self.next_id('next_oid', 'orders')
+    
+    # следующий id: из meta, а если там нет - после самого большого в таблице
+    def next_id(self, key: str, table: str) -> int:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            return row[0]
+        return self.db.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+    
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    # --- транзакции ---
+    
+    # все изменения внутри блока - одна транзакция. блоки можно вкладывать,
+    # коммит делает самый внешний. при ошибке транзакция откатывается
+    @contextlib.contextmanager
+    def batch(self):
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.batch_depth -= 1
+                if not self.batch_depth:
+                    self.db.rollback()
+                    # объекты в памяти могли разойтись с базой - пусть перечитаются
+                    self.forget()
+                raise
+            self.batch_depth -= 1
+            self.commit()
+    
+    # закоммитить, если не внутри batch
+    def commit(self):
+        if not self.batch_depth:
+            self.db.commit()
+    
+    # выбросить карту идентичности (следующий find_* прочитает базу заново)
+    def forget(self):
+        self.users_by_id.clear()
+        self.rests_by_id.clear()
+        self.orders_by_id.clear()
+    
+    def user_lock(self, uid: int):
+        return self.lock
+    
+    def order_lock(self, oid: int):
+        return self.lock
+    
+    def alloc_id(self, counter: str) -> int:
+        return self.alloc_ids(counter, 1)[0]
+    
+    # id выдаются подряд, счетчик хранится в meta той же транзакцией
+    def alloc_ids(self, counter: str, n: int) -> range:
+        with self.lock:
+            first = getattr(self, counter)
+            setattr(self, counter, first + n)
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (counter, first + n))
+            return range(first, first + n)
+    
+    # --- хуки объектов ---
+    # объекты зовут их так же, как у FoodDelivery; записи журнала тут сразу
+    # превращаются в запросы к базе
+    
+    def log(self, kind: str, *args):
+        with self.lock:
+            if kind == 'm':
+                uid, amount = args
+                self.db.execute("UPDATE users SET money = money + ? WHERE id = ?", (amount, uid))
+            elif kind == 'd':
+                self.db.execute(self.UPSERT_DISH, args)
+            elif kind == 's':
+                rest = self.rests_by_id[args[0]]
+                self.db.execute("UPDATE restaurants SET open = ? WHERE id = ?", (rest.open, rest.id))
+            elif kind == 'g':
+                self.db.execute("UPDATE restaurants SET rating = ? WHERE id = ?", (args[1], args[0]))
+            else:
+                return
+            self.commit()
+    
+    def dish_indexed(self, rest: Restaurant, dish: Dish):
+        pass  # блюдо запишет log('d', ...)
+    
+    def dish_added(self, order: Order, dish_name: str, count: int, amount: float):
+        with self.lock:
+            self.db.execute(self.ADD_ITEM, (order.id, dish_name, count))
+            self.db.execute("UPDATE orders SET sum = ? WHERE id = ?", (order.sum, order.id))
+            self.commit()
+    
+    def status_changed(self, order: Order, old_status: str):
+        with self.lock:
+            self.db.execute("UPDATE orders SET status = ?, end_time = ? WHERE id = ?",
+                            (order.status, order.end_time.isoformat() if order.end_time else None, order.id))
+            self.commit()
+    
+    # --- строки базы -> объекты ---
+    
+    # статусы заказов, прошедших process_order (их и держит User.my_orders)
+    PAID_STATUSES = (OrderStatus.processing, OrderStatus.delivering, OrderStatus.completed)
+    
+    def user_from_row(self, row) -> User:
+        user = self.users_by_id.get(row[0])
+        if user is None:
+            user = SqliteUser(*row)
+            user.system = self
+            user.my_orders = None  # прочитается из базы при первом обращении
+            self.users_by_id[user.id] = user
+        return user
+    
+    # история оплаченных заказов пользователя из базы. оплаченные, а потом
+    # отмененные в базе не отличить от неоплаченных - их в истории нет
+    def paid_orders(self, uid: int) -> List[Order]:
+        marks = ",".join("?" * len(self.PAID_STATUSES))
+        return self.select_orders(f"user_id = ? AND status IN ({marks})", (uid, *self.PAID_STATUSES))
+    
+    def rest_from_row(self, row) -> Restaurant:
+        rest = self.rests_by_id.get(row[0])
+        if rest is None:
+            rest = Restaurant(*row[:4])
+            rest.open = bool(row[4])
+            rest.rating = row[5]
+            for name, price, desc, category in self.db.execute(
+                    "SELECT name, price, desc, category FROM dishes WHERE rest_id = ? ORDER BY rowid", (rest.id,)):
+                rest.menu[name] = Dish(name, price, desc, category)
+            rest.system = self
+            self.rests_by_id[rest.id] = rest
+        return rest
+    
+    # заказы по строкам orders; блюда недостающих заказов читаются одним запросом на пачку
+    def orders_from_rows(self, rows) -> List[Order]:
+        result = []
+        missing = {}
+        for oid, uid, rid, total, status, created, ended in rows:
+            order = self.orders_by_id.get(oid)
+            if order is None:
+                order = Order(oid, self.find_user(uid), self.find_rest(rid))
+                order.sum = total
+                order.status = sys.intern(status)
+                order.time = datetime.fromisoformat(created)
+                order.end_time = datetime.fromisoformat(ended) if ended else None
+                missing[oid] = order
+            result.append(order)
+        
+        ids = list(missing)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for oid, dish_name, count in self.db.execute(
+                    f"SELECT order_id, dish, count FROM order_items WHERE order_id IN ({marks}) ORDER BY rowid",
+                    chunk):
+                order = missing[oid]
+                order.items[order.rest.intern_name(dish_name)] = count
+        for order in missing.values():
+            order.system = self
+            self.orders_by_id[order.id] = order
+        return result
+    
+    def select_orders(self, where: str, params=()) -> List[Order]:
+        with self.lock:
+            return self.orders_from_rows(self.db.execute(
+                f"SELECT id, user_id, rest_id, sum, status, time, end_time FROM orders WHERE {where} ORDER BY id",
+                params).fetchall())
+    
+    # --- пользователи и рестораны ---
+    
+    def add_user(self, name: str, email: str, phone: str) -> User:
+        return self.add_users([(name, email, phone)])[0]
+    
+    # строки (имя, почта, телефон[, деньги]) - одна транзакция на всю пачку
+    def add_users(self, rows) -> List[User]:
+        rows = [tuple(row) + (0.0,) * (4 - len(row)) for row in rows]
+        with self.batch():
+            ids = self.alloc_ids('next_uid', len(rows))
+            self.db.executemany(self.INSERT_USER, [(uid, *row[:4]) for uid, row in zip(ids, rows)])
+            return [self.user_from_row((uid, *row[:4])) for uid, row in zip(ids, rows)]
+    
+    def find_user(self, uid: int):
+        user = self.users_by_id.get(uid)
+        if user is not None:
+            return user
+        with self.lock:
+            row = self.db.execute("SELECT id, name, email, phone, money FROM users WHERE id = ?", (uid,)).fetchone()
+            return self.user_from_row(row) if row else None
+    
+    def find_user_by_email(self, email: str):
+        with self.lock:
+            row = self.db.execute("SELECT id, name, email, phone, money FROM users WHERE email = ?",
+                                  (email,)).fetchone()
+            return self.user_from_row(row) if row else None
+    
+    def find_user_by_phone(self, phone: str):
+        with self.lock:
+            row = self.db.execute("SELECT id, name, email, phone, money FROM users WHERE phone = ?",
+                                  (phone,)).fetchone()
+            return self.user_from_row(row) if row else None
+    
+    def add_restaurant(self, name: str, address: str, phone: str = "") -> Restaurant:
+        return self.add_restaurants([(name, address, phone)])[0]
+    
+    # строки (название, адрес[, телефон[, блюда]])
+    def add_restaurants(self, rows) -> List[Restaurant]:
+        rows = list(rows)
+        with self.batch():
+            rests = []
+            for rid, row in zip(self.alloc_ids('next_rid', len(rows)), rows):
+                phone = row[2] if len(row) > 2 else ""
+                self.db.execute(self.INSERT_REST, (rid, row[0], row[1], phone, True, 0.0))
+                rest = self.rest_from_row((rid, row[0], row[1], phone, True, 0.0))
+                if len(row) > 3:
+                    rest.add_dishes(row[3])
+                rests.append(rest)
+            return rests
+    
+    def add_menus(self, menus: dict):
+        with self.batch():
+            for rid, dishes in menus.items():
+                rest = self.find_rest(rid)
+                if not rest:
+                    raise RestaurantNotFoundError(f"нет ресторана {rid}")
+                rest.add_dishes(dishes)
+    
+    def find_rest(self, rid: int):
+        rest = self.rests_by_id.get(rid)
+        if rest is not None:
+            return rest
+        with self.lock:
+            row = self.db.execute("SELECT id, name, address, phone, open, rating FROM restaurants WHERE id = ?",
+                                  (rid,)).fetchone()
+            return self.rest_from_row(row) if row else None
+    
+    # поиск блюд как у MenuIndex.search: слова ищутся по началам слов в названии и описании
+    def search_dishes(self, text: str = None, category: str = None, min_price: float = None,
+                      max_price: float = None, open_only: bool = False, limit: int = None):
+        where, params = [], []
+        for word in MenuIndex.tokens(text):
+            # % и _ в слове - обычные символы, а не шаблон LIKE; desc может быть NULL
+            where.append("(' ' || py_lower(d.name || ' ' || COALESCE(d.desc, ''))) LIKE ? ESCAPE '\\'")
+            word = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"% {word}%")
+        for cond, value in (("d.category = ?", category), ("d.price >= ?", min_price),
+                            ("d.price <= ?", max_price)):
+            if value is not None:
+                where.append(cond)
+                params.append(value)
+        if open_only:
+            where.append("r.open")
+        sql = ("SELECT d.rest_id, d.name FROM dishes d JOIN restaurants r ON r.id = d.rest_id"
+               + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY d.price, d.rowid")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+            found = []
+            for rid, name in rows:
+                rest = self.find_rest(rid)
+                found.append((rest, rest.menu[name]))
+            return found
+    
+    # --- заказы ---
+    
+    def make_order(self, uid: int, rid: int) -> Order:
+        user = self.find_user(uid)
+        rest = self.find_rest(rid)
+        
+        if not user:
+            raise UserNotFoundError(f"нет пользователя {uid}")
+        if not rest:
+            raise RestaurantNotFoundError(f"нет ресторана {rid}")
+        if not rest.open:
+            raise RestaurantClosedError(f"ресторан {rest.name} закрыт")
+        
+        with self.batch():
+            order = Order(self.alloc_id('next_oid'), user, rest)
+            self.db.execute(self.INSERT_ORDER, (order.id, uid, rid, order.sum, order.status,
+                                                order.time.isoformat(), None))
+            order.system = self
+            self.orders_by_id[order.id] = order
+            return order
+    
+    # проверить заказ и списать деньги; ошибка - DeliveryError
+    def charge(self, order: Order):
+        if not order.items:
+            raise DeliveryError("пустой заказ")
+        if order.user.money < order.sum:
+            raise NotEnoughMoneyError(
+                f"мало денег у {order.user.name}: надо {order.sum}, есть {order.user.money}"
+            )
+        # историю читаем до смены статуса, иначе она из базы уже придет с этим заказом
+        history = order.user.my_orders
+        order.user.take_money(order.sum)
+        self.db.execute("UPDATE users SET money = money - ? WHERE id = ?", (order.sum, order.user.id))
+        order.change_status(OrderStatus.processing)
+        history.append(order)
+    
+    def process_order(self, oid: int) -> bool:
+        order = self.find_order(oid)
+        if not order:
+            return False
+        with self.batch():
+            if order.status != OrderStatus.created:
+                print(f"ошибка: заказ {oid} уже {order.status}")
+                return False
+            try:
+                self.charge(order)
+                return True
+            except DeliveryError as e:
+                print(f"ошибка: {e}")
+                order.change_status(OrderStatus.cancelled)
+                return False
+    
+    # пачка заказов в одной транзакции; ничего не печатает (как у FoodDelivery)
+    def process_orders(self, oids) -> List[ProcessResult]:
+        oids = list(oids)
+        results = {}
+        with self.batch():
+            for oid in oids:
+                if oid in results:
+                    continue
+                order = self.find_order(oid)
+                if not order:
+                    results[oid] = ProcessResult(oid, False, f"нет заказа {oid}")
+                    continue
+                if order.status != OrderStatus.created:
+                    results[oid] = ProcessResult(oid, False, f"заказ уже {order.status}")
+                    continue
+                try:
+                    self.charge(order)
+                    results[oid] = ProcessResult(oid, True)
+                except DeliveryError as e:
+                    order.change_status(OrderStatus.cancelled)
+                    results[oid] = ProcessResult(oid, False, str(e))
+        return [results[oid] for oid in oids]
+    
+    def find_order(self, oid: int):
+        order = self.orders_by_id.get(oid)
+        if order is not None:
+            return order
+        found = self.select_orders("id = ?", (oid,))
+        return found[0] if found else None
+    
+    def orders_of_user(self, uid: int) -> List[Order]:
+        return self.select_orders("user_id = ?", (uid,))
+    
+    def orders_of_rest(self, rid: int) -> List[Order]:
+        return self.select_orders("rest_id = ?", (rid,))
+    
+    def orders_with_status(self, status: str) -> List[Order]:
+        return self.select_orders("status = ?", (status,))
+    
+    # заказы, созданные в [start, end) (по возрастанию id)
+    def orders_between(self, start: datetime, end: datetime) -> List[Order]:
+        return self.select_orders("time >= ? AND time < ?", (start.isoformat(), end.isoformat()))
+    
+    def finish_order(self, oid: int) -> bool:
+        order = self.find_order(oid)
+        if not order:
+            return False
+        with self.batch():
+            if order.status in [OrderStatus.processing, OrderStatus.delivering]:
+                order.change_status(OrderStatus.completed)
+                return True
+        return False
+    
+    def cancel_order(self, oid: int) -> bool:
+        order = self.find_order(oid)
+        if not order:
+            return False
+        with self.batch():
+            if order.status in (OrderStatus.completed, OrderStatus.cancelled):
+                return False
+            old_status = order.status
+            order.change_status(OrderStatus.cancelled)
+            if old_status in (OrderStatus.processing, OrderStatus.delivering):
+                order.user.add_money(order.sum)
+            return True
+    
+    # --- статистика ---
+    
+    def stats(self) -> dict:
+        with self.lock:
+            count = lambda table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            by_status, sums = {}, {}
+            for status, n, total in self.db.execute("SELECT status, COUNT(*), SUM(sum) FROM orders GROUP BY status"):
+                by_status[status] = n
+                sums[status] = total
+            completed = by_status.get(OrderStatus.completed, 0)
+            revenue = sums.get(OrderStatus.completed, 0.0)
+            return {
+                'users': count('users'),
+                'restaurants': count('restaurants'),
+                'orders': count('orders'),
+                'by_status': by_status,
+                'completed': completed,
+                'revenue': revenue,
+                'average': revenue / completed if completed else 0.0,
+            }
+    
+    show_stats = FoodDelivery.show_stats
+    
+    # --- снапшоты ---
+    
+    # выгрузить в json того же вида, что FoodDelivery.save_json. объекты не
+    # создаются: строки базы идут в файл по одной. True - файл записан
+    def save_json(self, filename: str) -> bool:
+        try:
+            with self.lock, open_snapshot(filename, 'w', encoding='utf-8') as f:
+                f.write('{\n"users": [')
+                rows = self.db.execute("SELECT id, name, email, phone, money FROM users ORDER BY id")
+                self.write_rows(f, (dict(zip(('id', 'name', 'email', 'phone', 'money'), row)) for row in rows))
+                f.write('],\n"restaurants": [')
+                self.write_rows(f, (self.rest_dict(row) for row in self.db.execute(
+                    "SELECT id, name, address, phone, open, rating FROM restaurants ORDER BY id").fetchall()))
+                f.write('],\n"orders": [')
+                self.write_rows(f, self.order_dicts())
+                f.write('],\n"next_ids": ')
+                json.dump({'user': self.next_uid, 'rest': self.next_rid, 'order': self.next_oid}, f)
+                f.write('\n}\n')
+            print(f"сохранено в {filename}")
+            return True
+        except Exception as e:
+            print(f"ошибка сохранения json: {e}")
+            return False
+    
+    @staticmethod
+    def write_rows(f, items):
+        first = True
+        for item in items:
+            f.write('\n' if first else ',\n')
+            json.dump(item, f, ensure_ascii=False)
+            first = False
+    
+    def rest_dict(self, row) -> dict:
+        menu = {name: {'name': name, 'price': price, 'desc': desc, 'category': category}
+                for name, price, desc, category in self.db.execute(
+                    "SELECT name, price, desc, category FROM dishes WHERE rest_id = ? ORDER BY rowid", (row[0],))}
+        return {'id': row[0], 'name': row[1], 'address': row[2], 'phone': row[3],
+                'open': bool(row[4]), 'rating': row[5], 'menu': menu}
+    
+    # заказы вместе с блюдами: два курсора идут параллельно по id заказа
+    def order_dicts(self):
+        items = self.db.cursor().execute("SELECT order_id, dish, count FROM order_items ORDER BY order_id, rowid")
+        item = next(items, None)
+        for oid, uid, rid, total, status, created, ended in self.db.cursor().execute(
+                "SELECT id, user_id, rest_id, sum, status, time, end_time FROM orders ORDER BY id"):
+            dishes = {}
+            while item is not None and item[0] <= oid:
+                if item[0] == oid:
+                    dishes[item[1]] = item[2]
+                item = next(items, None)
+            yield {'id': oid, 'user_id': uid, 'rest_id': rid, 'items': dishes, 'sum': total,
+                   'status': status, 'time': created, 'end_time': ended}
+    
+    # перенос снапшота save_json в базу (миграция). файл читается потоково,
+    # строки пишутся пачками по BATCH_ROWS; старое содержимое базы удаляется
+    def load_json(self, filename: str):
+        pending = {self.INSERT_USER: [], self.INSERT_REST: [], self.UPSERT_DISH: [],
+                   self.INSERT_ORDER: [], self.ADD_ITEM: []}
+        
+        def flush(force=False):
+            for sql, rows in pending.items():
+                if rows and (force or len(rows) >= self.BATCH_ROWS):
+                    self.db.executemany(sql, rows)
+                    rows.clear()
+        
+        try:
+            with self.batch(), open_snapshot(filename, 'r', encoding='utf-8') as f:
+                for table in ('users', 'restaurants', 'dishes', 'orders', 'order_items', 'meta'):
+                    self.db.execute(f"DELETE FROM {table}")
+                self.forget()
+                next_ids = {}
+                for key, value in JsonStreamReader(f).sections(('users', 'restaurants', 'orders')):
+                    if key == 'users':
+                        pending[self.INSERT_USER].append(
+                            (value['id'], value['name'], value['email'], value['phone'], value['money']))
+                    elif key == 'restaurants':
+                        pending[self.INSERT_REST].append(
+                            (value['id'], value['name'], value['address'], value.get('phone', ''),
+                             value['open'], value.get('rating', 0.0)))
+                        for dish in value.get('menu', {}).values():
+                            pending[self.UPSERT_DISH].append(
+                                (value['id'], dish['name'], dish['price'], dish.get('desc', ''),
+                                 dish.get('category', 'основное')))
+                    elif key == 'orders':
+                        pending[self.INSERT_ORDER].append(
+                            (value['id'], value['user_id'], value['rest_id'], value['sum'], value['status'],
+                             value['time'], value.get('end_time')))
+                        pending[self.ADD_ITEM].extend(
+                            (value['id'], name, count) for name, count in value['items'].items())
+                    elif key == 'next_ids':
+                        next_ids = value
+                    flush()
+                flush(force=True)
+                self.next_uid = next_ids.get('user', self.next_id('next_uid', 'users'))
+                self.next_rid = next_ids.get('rest', self.next_id('next_rid', 'restaurants'))
+                self.next_oid = next_ids.get('order', self.next_id('next_oid', 'orders'))
+                self.db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                    [('next_uid', self.next_uid), ('next_rid', self.next_rid),
+                                     ('next_oid', self.next_oid)])
+        except Exception as e:
+            print(f"ошибка загрузки json: {e}")
+            return
+        print(f"загружено из {filename}")
+
+# --- замеры времени операций ---
+
+# гистограмма задержек в стиле HDR: в каждой октаве 16 корзин, ошибка ~6%
+class LatencyHistogram:
+    """счетчики по логарифмическим корзинам, значения в наносекундах"""
+    
+    SUB_BITS = 4
+    SUB = 1 << SUB_BITS
+    
+    __slots__ = ['counts', 'total', 'sum', 'max']
+    
+    def __init__(self):
+        self.counts = {}  # номер корзины -> сколько значений
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+    
+    @classmethod
+    def bucket(cls, ns: int) -> int:
+        shift = max(0, ns.bit_length() - cls.SUB_BITS - 1)
+        return shift * cls.SUB + (ns >> shift)
+    
+    # нижняя граница корзины в нс
+    @classmethod
+    def bucket_low(cls, idx: int) -> int:
+        shift = max(0, idx // cls.SUB - 1)
+        return (idx - shift * cls.SUB) << shift
+    
+    def record(self, ns: int):
+        idx = self.bucket(ns)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.total += 1
+        self.sum += ns
+        if ns > self.max:
+            self.max = ns
+    
+    # значение q-квантиля (0..1) в нс, с точностью до корзины
+    def quantile(self, q: float) -> int:
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(self.bucket_low(idx + 1) - 1, self.max)
+        return self.max
+    
+    # сколько значений не больше bound_ns (по границам корзин)
+    def count_below(self, bound_ns: int) -> int:
+        return sum(n for idx, n in self.counts.items() if self.bucket_low(idx + 1) - 1 <= bound_ns)
+
+# статистика одной операции
+class OperationStats:
+    """число вызовов, гистограмма задержек и ошибки по классам исключений"""
+    
+    __slots__ = ['name', 'hist', 'errors', 'lock']
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.hist = LatencyHistogram()
+        self.errors = Counter()
+        self.lock = threading.Lock()
+    
+    def to_dict(self) -> dict:
+        hist = self.hist
+        return {
+            'calls': hist.total,
+            'errors': dict(self.errors),
+            'sum_s': hist.sum / 1e9,
+            'p50_s': hist.quantile(0.5) / 1e9,
+            'p90_s': hist.quantile(0.9) / 1e9,
+            'p99_s': hist.quantile(0.99) / 1e9,
+            'max_s': hist.max / 1e9,
+            'buckets': [[LatencyHistogram.bucket_low(idx), n] for idx, n in sorted(hist.counts.items())],
+        }
+
+# замеры по всем обернутым методам
+class Metrics:
+    """включается enable_metrics(); пока выключено, методы не обернуты вообще"""
+    
+    # границы корзин для prometheus, в секундах
+    PROM_BOUNDS = [1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    
+    def __init__(self):
+        self.ops = {}  # имя операции -> OperationStats
+        # сколько замеряемых вызовов сейчас идет в потоке: вложенные не пишем,
+        # иначе find_user из load_json на каждый заказ забивал бы статистику find_user
+        self.local = threading.local()
+    
+    def op(self, name: str) -> OperationStats:
+        if name not in self.ops:
+            self.ops[name] = OperationStats(name)
+        return self.ops[name]
+    
+    # ошибка, которую метод обработал сам (наружу исключение не вышло)
+    def error(self, name: str, exc: Exception):
+        op = self.op(name)
+        with op.lock:
+            op.errors[type(exc).__name__] += 1
+    
+    # обертка, которая меряет func под именем name. пишутся только внешние
+    # вызовы: внутри замеряемого метода другие замеряемые идут без записи
+    def wrap(self, name: str, func):
+        if inspect.isgeneratorfunction(func):
+            return self.wrap_generator(name, func)
+        op = self.op(name)
+        clock = time.perf_counter_ns
+        local = self.local
+        
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if getattr(local, 'depth', 0):
+                return func(*args, **kwargs)
+            local.depth = 1
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                with op.lock:
+                    op.errors[type(e).__name__] += 1
+                raise
+            finally:
+                elapsed = clock() - start
+                local.depth = 0
+                with op.lock:
+                    op.hist.record(elapsed)
+        
+        timed.metrics_original = func
+        return timed
+    
+    # генератор (query_orders): сам вызов только создает его, поэтому меряем
+    # время внутри next() за весь проход, записываем когда его дочитали или бросили
+    def wrap_generator(self, name: str, func):
+        op = self.op(name)
+        clock = time.perf_counter_ns
+        local = self.local
+        
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if getattr(local, 'depth', 0):
+                yield from func(*args, **kwargs)
+                return
+            gen = func(*args, **kwargs)
+            spent = 0
+            try:
+                while True:
+                    local.depth = 1
+                    start = clock()
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        spent += clock() - start
+                        local.depth = 0
+                    yield item
+            except Exception as e:
+                with op.lock:
+                    op.errors[type(e).__name__] += 1
+                raise
+            finally:
+                gen.close()
+                with op.lock:
+                    op.hist.record(spent)
+        
+        timed.metrics_original = func
+        return timed
+    
+    def to_dict(self) -> dict:
+        return {name: op.to_dict() for name, op in sorted(self.ops.items()) if op.hist.total}
+    
+    # текст в формате prometheus (text exposition format)
+    def prometheus_text(self) -> str:
+        lines = ["# HELP food_delivery_op_seconds время выполнения операции",
+                 "# TYPE food_delivery_op_seconds histogram"]
+        for name, op in sorted(self.ops.items()):
+            hist = op.hist
+            if not hist.total:
+                continue
+            for bound in self.PROM_BOUNDS:
+                lines.append(f'food_delivery_op_seconds_bucket{{op="{name}",le="{bound}"}} '
+                             f'{hist.count_below(int(bound * 1e9))}')
+            lines.append(f'food_delivery_op_seconds_bucket{{op="{name}",le="+Inf"}} {hist.total}')
+            lines.append(f'food_delivery_op_seconds_sum{{op="{name}"}} {hist.sum / 1e9}')
+            lines.append(f'food_delivery_op_seconds_count{{op="{name}"}} {hist.total}')
+        lines.append("# HELP food_delivery_op_errors_total исключения по операциям")
+        lines.append("# TYPE food_delivery_op_errors_total counter")
+        for name, op in sorted(self.ops.items()):
+            for error, n in sorted(op.errors.items()):
+                lines.append(f'food_delivery_op_errors_total{{op="{name}",error="{error}"}} {n}')
+        return "\n".join(lines) + "\n"
+    
+    def save_prometheus(self, filename: str):
+        try:
+            with open(filename + ".tmp", 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+            os.replace(filename + ".tmp", filename)
+            print(f"метрики сохранены в {filename}")
+        except Exception as e:
+            print(f"ошибка сохранения метрик: {e}")
+    
+    def save_json(self, filename: str):
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            print(f"метрики сохранены в {filename}")
+        except Exception as e:
+            print(f"ошибка сохранения метрик: {e}")
+
+# какие методы меряем: публичные операции FoodDelivery, сохранение/загрузка и Order.add_dish.
+# внутренние хуки (index_add, dish_added, log...) не трогаем - они вызываются на каждый заказ
+INSTRUMENTED = {
+    FoodDelivery: [
+        'add_user', 'add_users', 'find_user', 'find_user_by_email', 'find_user_by_phone',
+        'add_restaurant', 'add_restaurants', 'add_menus', 'find_rest', 'search_dishes',
+        'make_order', 'process_order', 'process_orders', 'process_orders_parallel',
+        'find_order', 'finish_order', 'cancel_order',
+        'orders_between', 'orders_of_user', 'orders_of_rest', 'orders_with_status',
+        'query_orders', 'page_orders', 'stats', 'show_stats', 'compact',
+        'save_json', 'load_json', 'load_json_stream', 'save_xml', 'load_xml',
+        'save_xml_stream', 'load_xml_stream', 'save_bin', 'load_bin',
+    ],
+    Order: ['add_dish'],
+}
+
+METRICS = None  # текущие Metrics, если замеры включены
+
+# включить замеры: методы классов подменяются обертками (для всех экземпляров)
+def enable_metrics() -> Metrics:
+    global METRICS
+    if METRICS is not None:
+        return METRICS
+    METRICS = Metrics()
+    for cls, names in INSTRUMENTED.items():
+        for name in names:
+            setattr(cls, name, METRICS.wrap(f"{cls.__name__}.{name}", getattr(cls, name)))
+    return METRICS
+
+# выключить замеры и вернуть исходные методы; возвращает собранные Metrics
+def disable_metrics() -> Optional[Metrics]:
+    global METRICS
+    metrics, METRICS = METRICS, None
+    if metrics is not None:
+        for cls, names in INSTRUMENTED.items():
+            for name in names:
+                setattr(cls, name, getattr(cls, name).metrics_original)
+    return metrics
+
+# --- http сервер ---
+
+# http сервер поверх asyncio: один процесс, без потока на соединение
+class DeliveryServer:
+    """json api к FoodDelivery по http/1.1 с keep-alive"""
+    
+    REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 409: 'Conflict', 500: 'Internal Server Error'}
+    
+    REQUIRED = object()  # у поля нет значения по умолчанию
+    TYPE_NAMES = {str: 'строка', int: 'целое число', (int, float): 'число', dict: 'объект'}
+    
+    # снапшоты пишутся только внутрь data_dir
+    def __init__(self, system: FoodDelivery, data_dir: str = '.'):
+        self.system = system
+        self.data_dir = os.path.realpath(data_dir)
+        # (метод, шаблон пути, обработчик); группы из шаблона идут в обработчик числами
+        self.routes = [
+            ('GET', r'/stats', self.get_stats),
+            ('POST', r'/users', self.post_user),
+            ('GET', r'/users/(\d+)', self.get_user),
+            ('POST', r'/users/(\d+)/money', self.post_money),
+            ('POST', r'/restaurants', self.post_rest),
+            ('POST', r'/restaurants/(\d+)/dishes', self.post_rest_dish),
+            ('POST', r'/orders', self.post_order),
+            ('GET', r'/orders/(\d+)', self.get_order),
+            ('POST', r'/orders/(\d+)/dishes', self.post_order_dish),
+            ('POST', r'/orders/(\d+)/process', self.post_process),
+            ('POST', r'/orders/(\d+)/finish', self.post_finish),
+            ('POST', r'/orders/(\d+)/cancel', self.post_cancel),
+            ('POST', r'/snapshot', self.post_snapshot),
+        ]
+        self.routes = [(m, re.compile(pattern + '$'), fn) for m, pattern, fn in self.routes]
+    
+    # --- обработчики: возвращают (код, json) ---
+    
+    def get_stats(self, data):
+        return 200, self.system.stats()
+    
+    def post_user(self, data):
+        name, email, phone = (self.field(data, key, str) for key in ('name', 'email', 'phone'))
+        money = self.field(data, 'money', (int, float), 0)
+        user = self.system.add_user(name, email, phone)
+        if money:
+            user.add_money(money)
+        return 201, user.to_dict()
+    
+    def get_user(self, data, uid):
+        return 200, self.need(self.system.find_user(uid), UserNotFoundError, f"нет пользователя {uid}").to_dict()
+    
+    def post_money(self, data, uid):
+        amount = self.field(data, 'amount', (int, float))
+        user = self.need(self.system.find_user(uid), UserNotFoundError, f"нет пользователя {uid}")
+        user.add_money(amount)
+        return 200, user.to_dict()
+    
+    def post_rest(self, data):
+        rest = self.system.add_restaurant(self.field(data, 'name', str), self.field(data, 'address', str),
+                                          self.field(data, 'phone', str, ''))
+        return 201, rest.to_dict()
+    
+    def post_rest_dish(self, data, rid):
+        price = self.field(data, 'price', (int, float))
+        if price < 0:
+            raise ValueError("цена не может быть отрицательной")
+        dish = Dish(self.field(data, 'name', str), float(price), self.field(data, 'desc', str, ''),
+                    self.field(data, 'category', str, 'основное'))
+        rest = self.need(self.system.find_rest(rid), RestaurantNotFoundError, f"нет ресторана {rid}")
+        rest.add_dish(dish)
+        return 201, dish.to_dict()
+    
+    # заказ создается только когда все блюда проверены: иначе остался бы
+    # недособранный заказ, про который клиент даже не узнал бы
+    def post_order(self, data):
+        uid = self.field(data, 'user_id', int)
+        rid = self.field(data, 'rest_id', int)
+        items = self.field(data, 'items', dict, {})
+        for dish_name, count in items.items():
+            self.check_count(count)
+        rest = self.need(self.system.find_rest(rid), RestaurantNotFoundError, f"нет ресторана {rid}")
+        for dish_name in items:
+            if rest.find_dish(dish_name) is None:
+                raise DishNotFoundError(f"нет блюда '{dish_name}'")
+        order = self.system.make_order(uid, rid)
+        for dish_name, count in items.items():
+            order.add_dish(dish_name, count)
+        return 201, order.to_dict()
+    
+    def get_order(self, data, oid):
+        return 200, self.need(self.system.find_order(oid), OrderNotFoundError, f"нет заказа {oid}").to_dict()
+    
+    def post_order_dish(self, data, oid):
+        dish_name = self.field(data, 'dish', str)
+        count = self.check_count(self.field(data, 'count', int, 1))
+        order = self.need(self.system.find_order(oid), OrderNotFoundError, f"нет заказа {oid}")
+        order.add_dish(dish_name, count)
+        return 200, order.to_dict()
+    
+    def post_process(self, data, oid):
+        res = self.system.process_orders([oid])[0]
+        return (200 if res.ok else 409), {'id': oid, 'ok': res.ok, 'error': res.error}
+    
+    def post_finish(self, data, oid):
+        ok = self.system.finish_order(oid)
+        return (200 if ok else 409), {'id': oid, 'ok': ok}
+    
+    def post_cancel(self, data, oid):
+        ok = self.system.cancel_order(oid)
+        return (200 if ok else 409), {'id': oid, 'ok': ok}
+    
+    # снапшот собирается в памяти прямо в потоке цикла событий: все изменения
+    # системы идут через этот же поток, поэтому данные в снапшоте целые. на диск
+    # (со сжатием, если оно нужно) он пишется в отдельном потоке, цикл событий
+    # в это время отвечает дальше
+    async def post_snapshot(self, data):
+        fmt = self.field(data, 'format', str, 'json')
+        writer = {'json': self.system.write_json, 'xml': self.system.write_xml,
+                  'bin': self.system.write_bin}.get(fmt)
+        if writer is None:
+            return 400, {'error': f"неизвестный формат {fmt}"}
+        # имя от клиента - только внутри data_dir, никаких ../ и абсолютных путей
+        filename = os.path.realpath(os.path.join(self.data_dir, self.field(data, 'filename', str,
+                                                                           f"delivery_data.{fmt}")))
+        if filename == self.data_dir or os.path.commonpath([filename, self.data_dir]) != self.data_dir:
+            return 400, {'error': "файл снапшота вне папки данных"}
+        buf = io.BytesIO() if fmt == 'bin' else io.StringIO()
+        loop = asyncio.get_running_loop()
+        try:
+            writer(buf)
+            await loop.run_in_executor(None, self.write_file, filename, fmt, buf.getvalue())
+        except Exception as e:
+            return 500, {'error': f"снапшот не сохранен: {e}"}
+        return 200, {'filename': filename}
+    
+    @staticmethod
+    def write_file(filename: str, fmt: str, content):
+        if fmt == 'bin':
+            with open_snapshot(filename, 'wb') as f:
+                f.write(content)
+        else:
+            with open_snapshot(filename, 'w', encoding='utf-8',
+                               errors='xmlcharrefreplace' if fmt == 'xml' else None) as f:
+                f.write(content)
+    
+    @staticmethod
+    def need(obj, error, message: str):
+        if obj is None:
+            raise error(message)
+        return obj
+    
+    # поле запроса нужного типа; ValueError (ответ 400) если его нет или тип не тот.
+    # все поля проверяются до того, как что-то меняется в системе
+    @classmethod
+    def field(cls, data, key: str, kind, default=REQUIRED):
+        if not isinstance(data, dict):
+            raise ValueError("тело запроса должно быть json объектом")
+        if key not in data:
+            if default is cls.REQUIRED:
+                raise ValueError(f"нет поля '{key}'")
+            return default
+        value = data[key]
+        # bool в python тоже int, но числом в запросе его не считаем
+        if not isinstance(value, kind) or isinstance(value, bool):
+            raise ValueError(f"поле '{key}' должно быть: {cls.TYPE_NAMES[kind]}")
+        return value
+    
+    @staticmethod
+    def check_count(count) -> int:
+        if not isinstance(count, int) or isinstance(count, bool) or count <= 0:
+            raise ValueError(f"количество должно быть целым больше нуля, а не {count!r}")
+        return count
+    
+    # найти обработчик и выполнить
+    async def dispatch(self, method: str, path: str, body: bytes):
+        path = path.split('?', 1)[0].rstrip('/') or '/'
+        allowed = False
+        for m, pattern, fn in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            allowed = True
+            if m != method:
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                result = fn(data, *map(int, match.groups()))
+                if asyncio.iscoroutine(result):
+                    result = await result
+                return result
+            except (UserNotFoundError, RestaurantNotFoundError, OrderNotFoundError) as e:
+                return 404, {'error': str(e)}
+            except DeliveryError as e:
+                return 409, {'error': str(e)}
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, {'error': f"плохой запрос: {e!r}"}
+            except Exception as e:
+                # ошибка в самом сервере - клиент получает 500, а не оборванное соединение
+                return 500, {'error': f"внутренняя ошибка: {e!r}"}
+        return (405 if allowed else 404), {'error': f"{method} {path}"}
+    
+    # одно соединение: читаем запросы по очереди, пока клиент держит keep-alive
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, path, version = line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'плохая строка запроса'}, False)
+                    break
+                
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip().lower()
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'плохой content-length'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                
+                status, payload = await self.dispatch(method, path, body)
+                connection = headers.get('connection', '')
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def respond(self, writer, status: int, payload, keep_alive: bool):
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+    
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"слушаем http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+# запустить сервер; если есть снапшот - сначала загрузить его
+def serve(port: int = 8080, snapshot: str = None):
+    system = FoodDelivery()
+    if snapshot and os.path.exists(snapshot):
+        system.load_json(snapshot)
+    try:
+        asyncio.run(DeliveryServer(system).serve(port=port))
+    except KeyboardInterrupt:
+        pass
+
+# --- шардирование по процессам ---
+
+# ошибки, которые шард может вернуть роутеру (по имени класса)
+SHARD_ERRORS = {cls.__name__: cls for cls in (
+    DeliveryError, UserNotFoundError, RestaurantNotFoundError, OrderNotFoundError,
+    DishNotFoundError, NotEnoughMoneyError, RestaurantClosedError)}
+
+# один шард: своя FoodDelivery в отдельном процессе
+class ShardWorker:
+    """пользователи шарда с их заказами + копия всех ресторанов"""
+    
+    def __init__(self):
+        self.system = FoodDelivery()
+        self.system.enable_analytics()
+    
+    def analytics_state(self):
+        return self.system.analytics.to_state()
+    
+    def put_user(self, uid, name, email, phone, money):
+        user = User(uid, name, email, phone)
+        self.system.put_user(user)
+        user.add_money(money)
+    
+    def put_rest(self, rid, name, address, phone):
+        self.system.put_rest(Restaurant(rid, name, address, phone))
+    
+    def add_dish(self, rid, name, price, desc, category):
+        self.system.find_rest(rid).add_dish(Dish(name, price, desc, category))
+    
+    def switch_open(self, rid):
+        self.system.find_rest(rid).switch_open()
+    
+    def set_rating(self, rid, rating):
+        self.system.find_rest(rid).set_rating(rating)
+    
+    def add_money(self, uid, amount):
+        user = self.system.find_user(uid)
+        if not user:
+            raise UserNotFoundError(f"нет пользователя {uid}")
+        user.add_money(amount)
+    
+    # rows: (oid, uid, rid, {блюдо: количество}); id выдает роутер
+    # на строку: (True, сумма) или (False, имя класса ошибки, текст).
+    # строка проверяется целиком до создания заказа - с ошибкой заказа не будет
+    def make_orders(self, rows):
+        results = []
+        for oid, uid, rid, items in rows:
+            try:
+                user = self.system.find_user(uid)
+                rest = self.system.find_rest(rid)
+                if not user:
+                    raise UserNotFoundError(f"нет пользователя {uid}")
+                if not rest:
+                    raise RestaurantNotFoundError(f"нет ресторана {rid}")
+                if not rest.open:
+                    raise RestaurantClosedError(f"ресторан {rest.name} закрыт")
+                for dish_name, count in items.items():
+                    if rest.find_dish(dish_name) is None:
+                        raise DishNotFoundError(f"нет блюда '{dish_name}'")
+                    if not isinstance(count, int) or count <= 0:
+                        raise DeliveryError(f"плохое количество {count!r} для '{dish_name}'")
+                order = Order(oid, user, rest)
+                self.system.put_order(order)
+                for dish_name, count in items.items():
+                    order.add_dish(dish_name, count)
+                results.append((True, order.sum))
+            except DeliveryError as e:
+                results.append((False, type(e).__name__, str(e)))
+        return results
+    
+    def add_order_dish(self, oid, dish_name, count):
+        order = self.system.find_order(oid)
+        if not order:
+            raise OrderNotFoundError(f"нет заказа {oid}")
+        order.add_dish(dish_name, count)
+        return order.sum
+    
+    def process_orders(self, oids):
+        return [(r.oid, r.ok, r.error) for r in self.system.process_orders(oids)]
+    
+    def finish_order(self, oid):
+        return self.system.finish_order(oid)
+    
+    def cancel_order(self, oid):
+        return self.system.cancel_order(oid)
+    
+    def find_order(self, oid):
+        order = self.system.find_order(oid)
+        return order.to_dict() if order else None
+    
+    # сырые счетчики для сборки общей статистики
+    def stats(self):
+        return {
+            'users': len(self.system.users),
+            'restaurants': len(self.system.restaurants),
+            'orders': len(self.system.orders),
+            'counts': dict(self.system.counters.counts),
+            'sums': dict(self.system.counters.sums),
+        }
+
+# цикл процесса-шарда: команда из канала -> ответ в канал
+def shard_main(conn):
+    worker = ShardWorker()
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        op, args = msg
+        try:
+            conn.send(('ok', getattr(worker, op)(*args)))
+        except Exception as e:
+            conn.send(('err', type(e).__name__, str(e)))
+    conn.close()
+
+# роутер: раскладывает пользователей и их заказы по шардам
+class ShardedDelivery:
+    """FoodDelivery, разбитая на процессы по id пользователя
+    
+    пользователь uid живет в шарде (uid - 1) % n, там же все его заказы.
+    id заказов роутер выдает так, что шард видно по самому id: (oid - 1) % n.
+    рестораны и меню копируются во все шарды. пачечные методы
+    (make_orders, process_orders) рассылают команды всем шардам сразу,
+    и шарды работают параллельно.
+    """
+    
+    def __init__(self, n_shards: int = None):
+        self.n = n_shards or os.cpu_count() or 1
+        # fork где есть: модуль 1laba нельзя импортировать по имени в spawn
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        self.conns = []
+        self.procs = []
+        for _ in range(self.n):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=shard_main, args=(child,), daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+        self.next_uid = 1
+        self.next_rid = 1
+        self.next_local_oid = [0] * self.n  # сколько заказов выдано в каждом шарде
+    
+    def shard_of_user(self, uid: int) -> int:
+        return (uid - 1) % self.n
+    
+    def shard_of_order(self, oid: int) -> int:
+        return (oid - 1) % self.n
+    
+    @staticmethod
+    def reply(conn):
+        msg = conn.recv()
+        if msg[0] == 'err':
+            raise SHARD_ERRORS.get(msg[1], DeliveryError)(msg[2])
+        return msg[1]
+    
+    # вызов в одном шарде
+    def call(self, shard: int, op: str, *args):
+        self.conns[shard].send((op, args))
+        return self.reply(self.conns[shard])
+    
+    # разослать всем шардам (args_by_shard[i] - аргументы для шарда i), потом собрать ответы
+    def scatter(self, op: str, args_by_shard: dict) -> dict:
+        for shard, args in args_by_shard.items():
+            self.conns[shard].send((op, args))
+        return {shard: self.reply(self.conns[shard]) for shard in args_by_shard}
+    
+    def broadcast(self, op: str, *args):
+        return self.scatter(op, {shard: args for shard in range(self.n)})
+    
+    def add_user(self, name: str, email: str, phone: str, money: float = 0.0) -> int:
+        uid = self.next_uid
+        self.next_uid += 1
+        self.call(self.shard_of_user(uid), 'put_user', uid, name, email, phone, money)
+        return uid
+    
+    def add_money(self, uid: int, amount: float):
+        self.call(self.shard_of_user(uid), 'add_money', uid, amount)
+    
+    def add_restaurant(self, name: str, address: str, phone: str = "") -> int:
+        rid = self.next_rid
+        self.next_rid += 1
+        self.broadcast('put_rest', rid, name, address, phone)
+        return rid
+    
+    def add_dish(self, rid: int, dish: Dish):
+        self.broadcast('add_dish', rid, dish.name, dish.price, dish.desc, dish.category)
+    
+    def switch_open(self, rid: int):
+        self.broadcast('switch_open', rid)
+    
+    def set_rating(self, rid: int, rating: float):
+        self.broadcast('set_rating', rid, rating)
+    
+    def alloc_oid(self, shard: int) -> int:
+        local = self.next_local_oid[shard]
+        self.next_local_oid[shard] += 1
+        return local * self.n + shard + 1
+    
+    # создать заказ, сразу с блюдами; возвращает id. ошибка - то же
+    # исключение, что бросил шард (UserNotFoundError, DishNotFoundError, ...)
+    def make_order(self, uid: int, rid: int, items: dict = None) -> int:
+        return self.make_orders([(uid, rid, items or {})], errors=True)[0].oid
+    
+    # много заказов за раз: строки (uid, rid, {блюдо: количество}).
+    # как process_orders, возвращает ProcessResult на строку в том же порядке:
+    # oid созданного заказа, или ok=False, oid=None и текст ошибки (заказ
+    # для такой строки не создается). errors=True - вместо этого бросить
+    # исключение первой плохой строки (остальные строки уже выполнены)
+    def make_orders(self, rows, errors: bool = False) -> List[ProcessResult]:
+        by_shard = {}
+        oids = []
+        for uid, rid, items in rows:
+            shard = self.shard_of_user(uid)
+            oid = self.alloc_oid(shard)
+            by_shard.setdefault(shard, []).append((oid, uid, rid, items))
+            oids.append(oid)
+        replies = self.scatter('make_orders', {shard: (batch,) for shard, batch in by_shard.items()})
+        replies = {oid: reply for shard, batch in by_shard.items()
+                   for (oid, *_), reply in zip(batch, replies[shard])}
+        results = []
+        for oid in oids:
+            reply = replies[oid]
+            if reply[0]:
+                results.append(ProcessResult(oid, True))
+            elif errors:
+                raise SHARD_ERRORS.get(reply[1], DeliveryError)(reply[2])
+            else:
+                results.append(ProcessResult(None, False, reply[2]))
+        return results
+    
+    def add_order_dish(self, oid: int, dish_name: str, count: int = 1) -> float:
+        return self.call(self.shard_of_order(oid), 'add_order_dish', oid, dish_name, count)
+    
+    def find_order(self, oid: int):
+        return self.call(self.shard_of_order(oid), 'find_order', oid)
+    
+    def process_order(self, oid: int) -> bool:
+        return self.process_orders([oid])[0].ok
+    
+    # пачка заказов: каждый шард обрабатывает свою часть параллельно с остальными
+    def process_orders(self, oids) -> List[ProcessResult]:
+        oids = list(oids)
+        by_shard = {}
+        for oid in oids:
+            by_shard.setdefault(self.shard_of_order(oid), []).append(oid)
+        replies = self.scatter('process_orders', {shard: (batch,) for shard, batch in by_shard.items()})
+        results = {}
+        for rows in replies.values():
+            for oid, ok, error in rows:
+                results[oid] = ProcessResult(oid, ok, error)
+        return [results[oid] for oid in oids]
+    
+    def finish_order(self, oid: int) -> bool:
+        return self.call(self.shard_of_order(oid), 'finish_order', oid)
+    
+    def cancel_order(self, oid: int) -> bool:
+        return self.call(self.shard_of_order(oid), 'cancel_order', oid)
+    
+    # статистика со всех шардов (scatter-gather), в том же виде что FoodDelivery.stats
+    def stats(self) -> dict:
+        parts = list(self.broadcast('stats').values())
+        counts = Counter()
+        sums = Counter()
+        for part in parts:
+            counts.update(part['counts'])
+            sums.update(part['sums'])
+        completed = counts.get(OrderStatus.completed, 0)
+        revenue = sums.get(OrderStatus.completed, 0.0)
+        return {
+            'users': sum(p['users'] for p in parts),
+            'restaurants': parts[0]['restaurants'],
+            'orders': sum(p['orders'] for p in parts),
+            'by_status': {st: n for st, n in counts.items() if n},
+            'completed': completed,
+            'revenue': revenue,
+            'average': revenue / completed if completed else 0.0,
+        }
+    
+    # top-k аналитика со всех шардов, слитая в одну
+    def analytics(self) -> OrderAnalytics:
+        merged = None
+        for state in self.broadcast('analytics_state').values():
+            part = OrderAnalytics.from_state(state)
+            if merged is None:
+                merged = part
+            else:
+                merged.merge(part)
+        return merged
+    
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for proc in self.procs:
+            proc.join(timeout=5)
+        self.conns = []
+        self.procs = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
 
 # демонстрация работы
 def demo():
@@ -687,7 +4895,7 @@ def demo():
     print("\n6. что еще умеем:")
     
     # все заказы пользователя
-    user_orders = [o for o in new_system.orders if o.user.id == user1.id]
+    user_orders = new_system.orders_of_user(user1.id)
     print(f"у {user1.name} заказов: {len(user_orders)}")
     
     # отмена заказа
@@ -700,6 +4908,96 @@ def demo():
     print("демо закончено")
     print("="*50)
 
+# --- тестовые данные ---
+
+# бенчмарки на этих данных - в 1laba_bench.py
+
+# слова для названий блюд в синтетических меню
+DISH_WORDS = {
+    'пицца': ["маргарита", "пепперони", "четыре сыра", "гавайская", "дьябло"],
+    'суши': ["филадельфия", "калифорния", "ролл с угрем", "нигири с лососем"],
+    'салаты': ["цезарь", "греческий", "оливье", "с тунцом"],
+    'супы': ["борщ", "солянка", "том ям", "рамен", "щи"],
+    'бургеры': ["чизбургер", "бургер с беконом", "двойной бургер"],
+    'напитки': ["морс", "лимонад", "чай", "кофе", "кола"],
+}
+
+# диапазон цен по категориям для синтетических меню
+DISH_PRICES = {
+    'пицца': (450, 900),
+    'суши': (250, 700),
+    'салаты': (200, 450),
+    'супы': (250, 500),
+    'бургеры': (300, 650),
+    'напитки': (80, 250),
+}
+
+# накопленные веса закона ципфа: элемент i популярнее в (i+1)^skew раз меньше первого.
+# skew=0 - все одинаково популярны
+def zipf_weights(n: int, skew: float) -> List[float]:
+    return list(itertools.accumulate(1 / (i + 1) ** skew for i in range(n)))
+
+# синтетическая система с воспроизводимыми (по seed) данными.
+# популярность ресторанов, пользователей и блюд в меню распределена по ципфу
+# с параметром skew: немного ресторанов и блюд получают большую часть заказов
+def generate_system(n_users: int, n_rests: int, n_orders: int,
+                    dishes_per_rest: int = 10, seed: int = 1, skew: float = 1.0) -> FoodDelivery:
+    rnd = random.Random(seed)
+    system = FoodDelivery()
+    categories = list(DISH_WORDS)
+    statuses = [OrderStatus.created, OrderStatus.processing, OrderStatus.delivering,
+                OrderStatus.completed, OrderStatus.completed, OrderStatus.cancelled]
+    
+    for i in range(n_users):
+        user = system.add_user(f"пользователь {i}", f"user{i}@mail.ru", f"+7916{i:07d}")
+        user.add_money(rnd.randint(1000, 100000))
+    
+    menus = []
+    for i in range(n_rests):
+        rest = system.add_restaurant(f"ресторан {i}", f"ул. ленина {i}", f"8800{i:07d}")
+        # у ресторана 1-3 основные категории плюс напитки
+        own = rnd.sample(categories[:-1], rnd.randint(1, 3)) + ['напитки']
+        for j in range(dishes_per_rest):
+            category = own[j % len(own)]
+            name = f"{category} {rnd.choice(DISH_WORDS[category])}"
+            if name in rest.menu:
+                name = f"{name} {j}"
+            low, high = DISH_PRICES[category]
+            rest.add_dish(Dish(name, float(rnd.randrange(low, high + 1, 10)),
+                               f"{category}, {rnd.choice(['классика', 'острое', 'новинка', 'хит'])}",
+                               category))
+        menus.append(list(rest.menu))
+    
+    # кто популярен - перемешиваем, чтобы это не были всегда первые id
+    rest_rank = list(range(1, n_rests + 1))
+    user_rank = list(range(1, n_users + 1))
+    rnd.shuffle(rest_rank)
+    rnd.shuffle(user_rank)
+    rest_weights = zipf_weights(n_rests, skew)
+    user_weights = zipf_weights(n_users, skew)
+    dish_weights = zipf_weights(dishes_per_rest, skew)
+    
+    rids = rnd.choices(rest_rank, cum_weights=rest_weights, k=n_orders)
+    uids = rnd.choices(user_rank, cum_weights=user_weights, k=n_orders)
+    for uid, rid in zip(uids, rids):
+        order = system.make_order(uid, rid)
+        menu = menus[rid - 1]
+        for dish_name in set(rnd.choices(menu, cum_weights=dish_weights[:len(menu)], k=rnd.randint(1, 3))):
+            order.add_dish(dish_name, rnd.randint(1, 3))
+        order.change_status(rnd.choice(statuses))
+    
+    return system
+
+def main(argv: List[str]):
+    if not argv:
+        demo()
+    elif argv[0] == 'serve':
+        # python 1laba.py serve [порт] [снапшот.json]
+        serve(int(argv[1]) if len(argv) > 1 else 8080, argv[2] if len(argv) > 2 else None)
+    else:
+        print("использование: 1laba.py [serve [порт] [снапшот.json]]")
+        print("бенчмарки: python 1laba_bench.py {имя} [аргументы]")
+
 # запуск
 if __name__ == "__main__":
-    demo()
+    main(sys.argv[1:])
@@ -0,0 +1,858 @@
+# 1laba_bench.py
+# бенчмарки системы доставки еды из 1laba.py на синтетических данных
+# запуск: python 1laba_bench.py {имя} [аргументы]
+
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import asyncio
+import random
+import hashlib
+import subprocess
+import contextlib
+import importlib.util
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+# numpy не обязателен: без него бенчмарки колонок считают на python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 1laba.py не импортируется по имени (начинается с цифры) - грузим по пути
+LABA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "1laba.py")
+if "laba1" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("laba1", LABA_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["laba1"] = module
+    spec.loader.exec_module(module)
+
+from laba1 import (
+    DISH_WORDS, DeliveryError, Dish, FoodDelivery, HeavyHitters, LegacySchema, MenuIndex,
+    OrderColumns, OrderStatus, Restaurant, ShardedDelivery, SqliteDelivery,
+    disable_metrics, enable_metrics, generate_system, open_snapshot,
+)
+
+# --- нагрузочный клиент ---
+
+# один http запрос по уже открытому соединению
+async def http_request(reader, writer, method: str, path: str, payload=None):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    data = await reader.readexactly(length) if length else b''
+    return status, (json.loads(data) if data else None)
+
+# гоняем запросы по concurrency соединениям с keep-alive, считаем задержки
+async def load_test(host: str, port: int, n_requests: int, concurrency: int, seed: int = 1):
+    rnd = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    # подготовка: пользователи и рестораны
+    uids, rids = [], []
+    for i in range(max(10, concurrency)):
+        _, user = await http_request(reader, writer, 'POST', '/users',
+                                     {'name': f"нагрузка {i}", 'email': f"load{i}@mail.ru",
+                                      'phone': str(i), 'money': 10**9})
+        uids.append(user['id'])
+    for i in range(10):
+        _, rest = await http_request(reader, writer, 'POST', '/restaurants',
+                                     {'name': f"ресторан {i}", 'address': f"ул. {i}"})
+        rids.append(rest['id'])
+        for j in range(5):
+            await http_request(reader, writer, 'POST', f"/restaurants/{rest['id']}/dishes",
+                               {'name': f"блюдо {j}", 'price': 100 + 10 * j})
+    writer.close()
+    
+    latencies = []
+    statuses = Counter()
+    per_worker = n_requests // concurrency
+    
+    async def worker():
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in range(per_worker):
+            # смесь: заказ с блюдом, оплата, статистика, чтение заказа
+            kind = rnd.random()
+            start = time.perf_counter()
+            if kind < 0.4:
+                status, order = await http_request(reader, writer, 'POST', '/orders', {
+                    'user_id': rnd.choice(uids), 'rest_id': rnd.choice(rids),
+                    'items': {f"блюдо {rnd.randrange(5)}": rnd.randint(1, 3)}})
+                if status == 201:
+                    worker.last.append(order['id'])
+            elif kind < 0.7 and worker.last:
+                status, _ = await http_request(reader, writer, 'POST', f"/orders/{worker.last.pop()}/process")
+            elif kind < 0.85:
+                status, _ = await http_request(reader, writer, 'GET', '/stats')
+            else:
+                status, _ = await http_request(reader, writer, 'GET', f"/users/{rnd.choice(uids)}")
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+        writer.close()
+    worker.last = []
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+        'p999_ms': pct(0.999),
+        'statuses': dict(statuses),
+    }
+
+# каким методом грузить снапшот в бенчмарках
+LOADERS = {
+    'json': 'load_json',
+    'json_stream': 'load_json_stream',
+    'xml': 'load_xml',
+    'xml_stream': 'load_xml_stream',
+    'bin': 'load_bin',
+}
+
+# поле из /proc/self/status в KB (только linux, иначе None)
+def proc_status_kb(field: str):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+# пиковая память процесса в MB
+# на linux берем VmHWM: ru_maxrss переживает exec и может показать память родителя
+def peak_rss_mb() -> float:
+    kb = proc_status_kb('VmHWM')
+    if kb is not None:
+        return kb / 1024
+    import resource  # только unix
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# загрузка в этом процессе, в последней строке печатаем время и пиковую память
+def measure_load(mode: str, filename: str):
+    system = FoodDelivery()
+    start = time.perf_counter()
+    getattr(system, LOADERS[mode])(filename)
+    seconds = time.perf_counter() - start
+    print(json.dumps({'mode': mode, 'seconds': seconds, 'peak_mb': peak_rss_mb(),
+                      'orders': len(system.orders)}))
+
+# запустить measure_load в отдельном процессе, чтобы пиковая память не смешивалась
+def measure_load_subprocess(mode: str, filename: str) -> dict:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), 'measure-load', mode, filename],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+# json.load целиком против потоковой загрузки
+def bench_json_load(n_orders: int = 200000, filename: str = "bench_snapshot.json"):
+    if not os.path.exists(filename):
+        print(f"генерируем {n_orders} заказов...")
+        system = generate_system(max(1, n_orders // 10), max(1, n_orders // 1000), n_orders)
+        system.save_json(filename)
+        del system
+    
+    size_mb = os.path.getsize(filename) / 2**20
+    print(f"снапшот {filename}: {size_mb:.1f} MB")
+    print(f"{'загрузчик':<14}{'время, с':>10}{'пик RSS, MB':>14}{'заказов':>10}")
+    for mode in ('json', 'json_stream'):
+        res = measure_load_subprocess(mode, filename)
+        print(f"{mode:<14}{res['seconds']:>10.2f}{res['peak_mb']:>14.1f}{res['orders']:>10}")
+
+# время одного сохранения и его пик памяти по tracemalloc
+# (tracemalloc сильно тормозит, поэтому время меряем отдельным прогоном)
+def measure_save(system: FoodDelivery, method: str, filename: str):
+    import tracemalloc
+    start = time.perf_counter()
+    getattr(system, method)(filename)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    getattr(system, method)(filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+# save_xml/load_xml через целое дерево против потоковых версий
+def bench_xml(n_orders: int = 200000, filename: str = "bench_snapshot.xml"):
+    print(f"генерируем {n_orders} заказов...")
+    system = generate_system(max(1, n_orders // 10), max(1, n_orders // 1000), n_orders)
+    
+    print(f"{'запись':<16}{'время, с':>10}{'пик памяти, MB':>16}")
+    results = {}
+    for method in ('save_xml', 'save_xml_stream'):
+        out = f"{filename}.{method}"
+        seconds, peak = measure_save(system, method, out)
+        with open(out, 'rb') as f:
+            results[method] = hashlib.sha1(f.read()).hexdigest()
+        print(f"{method:<16}{seconds:>10.2f}{peak:>16.1f}")
+        if method == 'save_xml':
+            os.replace(out, filename)
+        else:
+            os.remove(out)
+    print("файлы совпадают" if len(set(results.values())) == 1 else "ФАЙЛЫ РАЗНЫЕ")
+    del system
+    
+    print(f"снапшот {filename}: {os.path.getsize(filename) / 2**20:.1f} MB")
+    print(f"{'загрузчик':<14}{'время, с':>10}{'пик RSS, MB':>14}{'заказов':>10}")
+    for mode in ('xml', 'xml_stream'):
+        res = measure_load_subprocess(mode, filename)
+        print(f"{mode:<14}{res['seconds']:>10.2f}{res['peak_mb']:>14.1f}{res['orders']:>10}")
+
+# размер, время записи и загрузки для json, xml и двоичного формата
+def bench_formats(*sizes):
+    formats = [('json', 'save_json', 'json'), ('xml', 'save_xml', 'xml'), ('bin', 'save_bin', 'bin')]
+    for n_orders in sizes or (10000, 1000000, 10000000):
+        print(f"\n=== {n_orders} заказов ===")
+        system = generate_system(max(1, n_orders // 10), max(1, n_orders // 1000), n_orders)
+        print(f"{'формат':<8}{'размер, MB':>12}{'запись, с':>11}{'загрузка, с':>13}{'пик RSS, MB':>13}")
+        for ext, save, mode in formats:
+            filename = f"bench_formats.{ext}"
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(None):
+                getattr(system, save)(filename)
+            save_s = time.perf_counter() - start
+            res = measure_load_subprocess(mode, filename)
+            print(f"{ext:<8}{os.path.getsize(filename) / 2**20:>12.1f}{save_s:>11.2f}"
+                  f"{res['seconds']:>13.2f}{res['peak_mb']:>13.1f}")
+            os.remove(filename)
+        del system
+
+# сколько памяти занимают живые объекты загруженной системы (по tracemalloc,
+# мусор от разбора json и фрагментация кучи сюда не попадают)
+def measure_memory(filename: str):
+    import gc
+    import tracemalloc
+    tracemalloc.start()
+    system = FoodDelivery()
+    with contextlib.redirect_stdout(None):
+        system.load_json(filename)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(json.dumps({'bytes': used, 'users': len(system.users), 'orders': len(system.orders)}))
+
+# байт на пользователя и на заказ после load_json
+def bench_memory(n_orders: int = 1000000, n_users: int = 100000):
+    results = []
+    for orders in (0, n_orders):
+        filename = f"bench_memory_{orders}.json"
+        with contextlib.redirect_stdout(None):
+            generate_system(n_users, 10, orders).save_json(filename)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), 'measure-memory', filename],
+                             capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+        os.remove(filename)
+    users_only, full = results
+    print(f"пользователей: {n_users}, заказов: {n_orders}")
+    print(f"байт на пользователя: {users_only['bytes'] / n_users:.0f}")
+    print(f"байт на заказ: {(full['bytes'] - users_only['bytes']) / n_orders:.0f}")
+
+# аналитика по колонкам на синтетических строках (без объектов Order)
+def bench_analytics(n_orders: int = 10000000, n_rests: int = 1000):
+    rnd = random.Random(1)
+    cols = OrderColumns()
+    start_us = OrderColumns.micros(datetime(2024, 1, 1))
+    print(f"заполняем {n_orders} строк...")
+    cols.ids = array('q', range(1, n_orders + 1))
+    cols.user_ids = array('q', (rnd.randint(1, n_orders // 10 + 1) for _ in range(n_orders)))
+    cols.rest_ids = array('q', (rnd.randint(1, n_rests) for _ in range(n_orders)))
+    cols.sums = array('d', (rnd.randint(100, 5000) for _ in range(n_orders)))
+    cols.status = bytearray(rnd.choices(range(5), k=n_orders))
+    cols.times = array('q', (start_us + i * 3 * 10**6 for i in range(n_orders)))
+    cols.end_times = array('q', [OrderColumns.NO_TIME]) * n_orders
+    cols.days = array('l', (t // OrderColumns.DAY_US for t in cols.times))
+    
+    print(f"numpy: {'да' if np is not None else 'нет'}")
+    for name, fn in [('выручка', cols.revenue), ('средний чек', cols.average_check),
+                     ('по статусам', cols.count_by_status), ('по ресторанам', cols.count_by_rest),
+                     ('по дням', cols.count_by_day)]:
+        start = time.perf_counter()
+        fn()
+        print(f"{name:<16}{time.perf_counter() - start:>8.3f} с")
+
+# поднять сервер отдельным процессом и нагрузить его
+def bench_http(n_requests: int = 20000, concurrency: int = 50, port: int = 8089):
+    server = subprocess.Popen([sys.executable, LABA_PATH, 'serve', str(port)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        # ждем пока порт откроется
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        res = asyncio.run(load_test('127.0.0.1', port, n_requests, concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"запросов: {res['requests']} за {res['seconds']:.2f} с, {concurrency} соединений")
+    print(f"rps: {res['rps']:.0f}")
+    print(f"p50: {res['p50_ms']:.2f} мс, p99: {res['p99_ms']:.2f} мс, p999: {res['p999_ms']:.2f} мс")
+    print(f"коды ответов: {res['statuses']}")
+
+# пропускная способность make_orders + process_orders в зависимости от числа шардов
+def bench_shards(n_orders: int = 200000, max_shards: int = None, batch: int = 10000):
+    max_shards = max_shards or os.cpu_count() or 1
+    counts = sorted({1, *[2 ** k for k in range(1, 8) if 2 ** k <= max_shards], max_shards})
+    print(f"ядер: {os.cpu_count()}")
+    base = None
+    for n in counts:
+        rnd = random.Random(1)
+        with ShardedDelivery(n) as sharded:
+            n_users = 1000
+            for i in range(n_users):
+                sharded.add_user(f"u{i}", f"u{i}@mail.ru", str(i), 10**9)
+            for i in range(10):
+                rid = sharded.add_restaurant(f"ресторан {i}", "ул. ленина")
+                for j in range(5):
+                    sharded.add_dish(rid, Dish(f"блюдо {j}", 100 + 10 * j))
+            
+            start = time.perf_counter()
+            for done in range(0, n_orders, batch):
+                rows = [(rnd.randint(1, n_users), rnd.randint(1, 10), {f"блюдо {rnd.randrange(5)}": 1})
+                        for _ in range(min(batch, n_orders - done))]
+                sharded.process_orders([res.oid for res in sharded.make_orders(rows) if res.ok])
+            seconds = time.perf_counter() - start
+            stats = sharded.stats()
+        rate = n_orders / seconds
+        base = base or rate
+        print(f"шардов: {n:>3}  заказов/с: {rate:>9.0f}  ускорение: {rate / base:.2f}x  "
+              f"в обработке: {stats['by_status'].get(OrderStatus.processing, 0)}")
+
+# поиск по индексу против перебора всех меню
+def bench_menu_search(n_rests: int = 100000, dishes_per_rest: int = 50):
+    rnd = random.Random(1)
+    system = FoodDelivery()
+    categories = list(DISH_WORDS)
+    print(f"строим {n_rests} ресторанов по {dishes_per_rest} блюд...")
+    start = time.perf_counter()
+    for i in range(n_rests):
+        rest = Restaurant(i + 1, f"ресторан {i}", f"ул. ленина {i}")
+        rest.open = rnd.random() < 0.8
+        for j in range(dishes_per_rest):
+            category = rnd.choice(categories)
+            name = f"{category} {rnd.choice(DISH_WORDS[category])} {j}"
+            rest.menu[name] = Dish(name, float(rnd.randint(100, 1500)), "описание", category)
+        system.put_rest(rest)
+    system.menu_index.sort_prices()
+    print(f"индекс построен за {time.perf_counter() - start:.1f} с, блюд: {len(system.menu_index)}")
+    
+    queries = [
+        ("пицца до 500 из открытых, дешевые первыми",
+         dict(text="пицца", max_price=500, open_only=True, limit=20)),
+        ("'пепп' (начало слова)", dict(text="пепп", limit=20)),
+        ("суши 300-400", dict(category="суши", min_price=300, max_price=400, limit=20)),
+        ("том ям до 200", dict(text="том ям", max_price=200, limit=20)),
+    ]
+    for title, q in queries:
+        start = time.perf_counter()
+        found = system.search_dishes(**q)
+        t_index = time.perf_counter() - start
+        
+        # то же самое перебором
+        start = time.perf_counter()
+        words = MenuIndex.tokens(q.get('text'))
+        scan = sorted(((d.price, r.id, d.name) for r in system.restaurants
+                       if not q.get('open_only') or r.open
+                       for d in r.menu.values()
+                       if (q.get('category') is None or d.category == q['category'])
+                       and (q.get('min_price') is None or d.price >= q['min_price'])
+                       and (q.get('max_price') is None or d.price <= q['max_price'])
+                       and all(any(t.startswith(w) for t in MenuIndex.tokens(d.name, d.desc)) for w in words)))
+        t_scan = time.perf_counter() - start
+        same = [d.price for _, d in found] == [p for p, _, _ in scan[:len(found)]]
+        print(f"{title:<45} индекс {t_index * 1000:>8.2f} мс  перебор {t_scan * 1000:>9.1f} мс  "
+              f"{'совпадает' if same else 'НЕ СОВПАДАЕТ'}")
+
+def bench_topk(n_events: int = 2000000, n_keys: int = 200000, k: int = 10):
+    # поток с зипфовским распределением: немногие ключи встречаются очень часто
+    rnd = random.Random(1)
+    weights = [1 / (i + 1) for i in range(n_keys)]
+    stream = rnd.choices(range(n_keys), weights=weights, k=n_events)
+    
+    start = time.perf_counter()
+    exact = Counter(stream)
+    t_exact = time.perf_counter() - start
+    
+    hh = HeavyHitters(k=k, exact_limit=10000)
+    start = time.perf_counter()
+    for key in stream:
+        hh.add(key)
+    t_hh = time.perf_counter() - start
+    
+    # два "шарда" по половине потока, потом слияние
+    left, right = HeavyHitters(k=k, exact_limit=10000), HeavyHitters(k=k, exact_limit=10000)
+    for i, key in enumerate(stream):
+        (left if i % 2 else right).add(key)
+    left.merge(right)
+    
+    true_top = [key for key, _ in exact.most_common(k)]
+    sketch_bytes = hh.width * hh.depth * 8
+    print(f"событий {n_events}, разных ключей {len(exact)}")
+    print(f"Counter: {t_exact:.2f} с, {len(exact)} записей")
+    print(f"HeavyHitters: {t_hh:.2f} с, sketch {sketch_bytes // 1024} КБ + {len(hh.candidates)} кандидатов")
+    for title, got in (("один поток", hh), ("после merge", left)):
+        top = got.top()
+        hit = len(set(key for key, _ in top) & set(true_top))
+        err = max(abs(est - exact[key]) / exact[key] for key, est in top)
+        print(f"{title:<12} совпало с точным top-{k}: {hit}/{k}, макс. завышение {err:.2%}")
+    
+    # на заказах
+    system = generate_system(2000, 200, 100000)
+    analytics = system.enable_analytics(k=5)
+    print("топ ресторанов по выручке:", [(rid, round(v, 2)) for rid, v in analytics.top_restaurants()])
+    print("самые активные пользователи:", analytics.top_users())
+
+# цена замеров: один и тот же сценарий без них и с ними
+def bench_metrics(n_orders: int = 100000, n_users: int = 1000, out: str = "metrics"):
+    def scenario():
+        rnd = random.Random(1)
+        system = FoodDelivery()
+        for i in range(n_users):
+            system.add_user(f"u{i}", f"u{i}@mail.ru", str(i)).add_money(rnd.randint(0, 3000))
+        for i in range(20):
+            rest = system.add_restaurant(f"ресторан {i}", "ул. ленина")
+            for j in range(5):
+                rest.add_dish(Dish(f"блюдо {j}", 100 + 50 * j))
+            rest.open = i % 10 != 0
+        start = time.perf_counter()
+        for _ in range(n_orders):
+            try:
+                order = system.make_order(rnd.randint(1, n_users), rnd.randint(1, 20))
+                order.add_dish(f"блюдо {rnd.randrange(6)}", rnd.randint(1, 3))
+                system.process_order(order.id)
+            except DeliveryError:
+                pass
+        system.stats()
+        return time.perf_counter() - start
+    
+    # process_order печатает каждую ошибку - здесь это только шум
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        t_off = scenario()
+        metrics = enable_metrics()
+        t_on = scenario()
+        disable_metrics()
+        t_after = scenario()
+    print(f"без замеров: {t_off:.2f} с, с замерами: {t_on:.2f} с (+{t_on / t_off - 1:.0%}), "
+          f"после выключения: {t_after:.2f} с")
+    for name, op in metrics.to_dict().items():
+        errors = ", ".join(f"{e}: {n}" for e, n in op['errors'].items())
+        print(f"{name:<28} вызовов {op['calls']:>7}  p50 {op['p50_s'] * 1e6:>7.1f} мкс  "
+              f"p99 {op['p99_s'] * 1e6:>7.1f} мкс  {errors}")
+    metrics.save_prometheus(out + ".prom")
+    metrics.save_json(out + ".json")
+
+# лучшее время из repeat запусков fn
+def best_time(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+# набор замеров основных операций; результат пишется в json, чтобы сравнивать версии.
+# если дан baseline (прошлый такой же json), замеры медленнее него больше чем
+# на threshold процентов считаются регрессией и бенчмарк возвращает False
+def bench_suite(n_users: int = 10000, n_rests: int = 200, n_orders: int = 100000,
+                out: str = "bench_results.json", baseline: str = None, threshold: int = 10,
+                repeat: int = 3, seed: int = 1) -> bool:
+    n_ops = min(n_orders, 100000)
+    results = {}  # имя -> {'seconds': ..., 'ops': ...}: время на ops операций, меньше - лучше
+    
+    start = time.perf_counter()
+    system = generate_system(n_users, n_rests, n_orders, seed=seed)
+    results['generate'] = {'seconds': time.perf_counter() - start, 'ops': n_orders}
+    
+    rnd = random.Random(seed)
+    uids = [rnd.randint(1, n_users) for _ in range(n_ops)]
+    oids = [rnd.randint(1, n_orders) for _ in range(n_ops)]
+    rids = [rnd.randint(1, n_rests) for _ in range(n_ops)]
+    emails = [f"user{uid - 1}@mail.ru" for uid in uids]
+    lookups = {
+        'find_user': (system.find_user, uids),
+        'find_user_by_email': (system.find_user_by_email, emails),
+        'find_order': (system.find_order, oids),
+        'find_rest': (system.find_rest, rids),
+        'orders_of_user': (system.orders_of_user, uids),
+    }
+    for name, (method, keys) in lookups.items():
+        results[name] = {'seconds': best_time(lambda: [method(key) for key in keys], repeat), 'ops': n_ops}
+    
+    # поток заказов поверх сгенерированных данных; денег добавляем, чтобы
+    # process_order не упирался в пустые балансы
+    for user in system.users:
+        user.add_money(10 ** 9)
+    menus = [list(rest.menu) for rest in system.restaurants]
+    
+    def order_flow():
+        rnd = random.Random(seed)
+        make = add = process = 0.0
+        clock = time.perf_counter
+        for uid, rid in zip(uids, rids):
+            t0 = clock()
+            order = system.make_order(uid, rid)
+            t1 = clock()
+            order.add_dish(rnd.choice(menus[rid - 1]), rnd.randint(1, 3))
+            t2 = clock()
+            system.process_order(order.id)
+            t3 = clock()
+            make += t1 - t0
+            add += t2 - t1
+            process += t3 - t2
+        return make, add, process
+    
+    flows = [order_flow() for _ in range(repeat)]
+    for i, name in enumerate(['make_order', 'add_dish', 'process_order']):
+        results[name] = {'seconds': min(flow[i] for flow in flows), 'ops': n_ops}
+    
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        results['show_stats'] = {'seconds': best_time(system.show_stats, repeat), 'ops': 1}
+        for fmt in ('json', 'xml'):
+            filename = f"bench_suite.{fmt}"
+            results[f'save_{fmt}'] = {
+                'seconds': best_time(lambda: getattr(system, f'save_{fmt}')(filename), repeat), 'ops': 1}
+            results[f'load_{fmt}'] = {
+                'seconds': best_time(lambda: getattr(FoodDelivery(), f'load_{fmt}')(filename), repeat), 'ops': 1}
+            os.remove(filename)
+    
+    report = {
+        'params': {'n_users': n_users, 'n_rests': n_rests, 'n_orders': n_orders, 'seed': seed, 'repeat': repeat},
+        'python': sys.version.split()[0],
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'results': results,
+    }
+    try:
+        with open(out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"ошибка сохранения результатов: {e}")
+    
+    base = {}
+    if baseline:
+        try:
+            with open(baseline, 'r', encoding='utf-8') as f:
+                base = json.load(f)['results']
+        except Exception as e:
+            print(f"ошибка чтения {baseline}: {e}")
+    
+    ok = True
+    print(f"{'операция':<20} {'время, мс':>11} {'оп/с':>10} {'было, мс':>11} {'разница':>9}")
+    for name, res in results.items():
+        rate = f"{res['ops'] / res['seconds']:.0f}" if res['ops'] > 1 else "-"
+        line = f"{name:<20} {res['seconds'] * 1000:>11.1f} {rate:>10}"
+        if name in base:
+            # сравниваем время на одну операцию: размеры прогонов могли отличаться
+            was = base[name]['seconds'] / base[name]['ops']
+            now = res['seconds'] / res['ops']
+            change = now / was - 1
+            line += f" {base[name]['seconds'] * 1000:>11.1f} {change:>+9.1%}"
+            if change > threshold / 100:
+                line += "  РЕГРЕССИЯ"
+                ok = False
+        print(line)
+    print(f"результаты записаны в {out}")
+    return ok
+
+# sqlite против загрузки всего снапшота в память
+def bench_sqlite(n_orders: int = 200000, db_path: str = "bench.db", filename: str = "bench_snapshot.json"):
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    n_users = max(1, n_orders // 10)
+    generate_system(n_users, max(1, n_orders // 1000), n_orders).save_json(filename)
+    
+    start = time.perf_counter()
+    with SqliteDelivery(db_path) as db:
+        db.load_json(filename)
+    print(f"миграция снапшота в sqlite: {time.perf_counter() - start:.2f} с, "
+          f"база {os.path.getsize(db_path) / 2**20:.1f} МБ")
+    
+    start = time.perf_counter()
+    FoodDelivery().load_json(filename)
+    print(f"перезапуск FoodDelivery (load_json): {time.perf_counter() - start:.2f} с")
+    
+    start = time.perf_counter()
+    db = SqliteDelivery(db_path)
+    user = db.find_user(1)
+    print(f"перезапуск SqliteDelivery до первого ответа: {(time.perf_counter() - start) * 1000:.1f} мс")
+    
+    rnd = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(10000):
+        db.find_order(rnd.randint(1, n_orders))
+    print(f"find_order (холодный): {(time.perf_counter() - start) / 10000 * 1e6:.1f} мкс")
+    
+    user.add_money(10 ** 9)
+    rest = db.find_rest(1)
+    dish = next(iter(rest.menu))
+    for title, batched in (("по транзакции на операцию", False), ("одной транзакцией", True)):
+        start = time.perf_counter()
+        with db.batch() if batched else contextlib.nullcontext():
+            for _ in range(2000):
+                order = db.make_order(user.id, rest.id)
+                order.add_dish(dish)
+                db.process_order(order.id)
+        print(f"заказ+блюдо+оплата, {title}: {(time.perf_counter() - start) / 2000 * 1e6:.0f} мкс")
+    db.close()
+    os.remove(filename)
+
+# холодный старт: обычная загрузка снапшота против ленивой
+def bench_lazy(n_orders: int = 1000000, cache_size: int = 100000, filename: str = "bench_snapshot.json"):
+    generate_system(max(1, n_orders // 10), max(1, n_orders // 1000), n_orders).save_json(filename)
+    all_stats = []
+    for title, lazy in (("обычная", False), ("ленивая", True)):
+        system = FoodDelivery()
+        start = time.perf_counter()
+        system.load_json(filename, lazy=lazy, cache_size=cache_size)
+        t_load = time.perf_counter() - start
+        
+        # трафик в основном по свежим заказам
+        rnd = random.Random(1)
+        start = time.perf_counter()
+        for _ in range(100000):
+            system.find_order(n_orders - int(rnd.expovariate(1 / 1000)) % n_orders)
+        t_find = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        stats = system.stats()
+        t_stats = time.perf_counter() - start
+        all_stats.append(stats)
+        print(f"{title}: загрузка {t_load:.2f} с, 100000 find_order {t_find:.2f} с, "
+              f"stats {t_stats * 1000:.2f} мс")
+        if lazy:
+            print(f"  объектов Order в кэше: {len(system.lazy.cache)} из {len(system.lazy)}")
+            start = time.perf_counter()
+            system.materialize_all()
+            print(f"  materialize_all (когда нужны все заказы): {time.perf_counter() - start:.2f} с")
+    print("stats совпадают" if all_stats[0] == all_stats[1] else "stats НЕ совпадают")
+    os.remove(filename)
+
+# параллельная загрузка снапшотов против обычной при разном числе процессов
+def bench_parallel_load(n_orders: int = 500000, *workers_list):
+    workers_list = workers_list or (1, 4, 16)
+    system = generate_system(max(1, n_orders // 10), max(1, n_orders // 1000), n_orders)
+    expected = system.stats()
+    print(f"ядер: {os.cpu_count()}, заказов: {n_orders}")
+    with open(os.devnull, 'w') as null:
+        for fmt in ('json', 'xml'):
+            filename = f"bench_parallel.{fmt}"
+            with contextlib.redirect_stdout(null):
+                getattr(system, f'save_{fmt}')(filename)
+                start = time.perf_counter()
+                getattr(FoodDelivery(), f'load_{fmt}')(filename)
+            base = time.perf_counter() - start
+            print(f"load_{fmt}: {base:.2f} с")
+            for workers in workers_list:
+                loaded = FoodDelivery()
+                with contextlib.redirect_stdout(null):
+                    start = time.perf_counter()
+                    loaded.load_parallel(filename, fmt, workers)
+                seconds = time.perf_counter() - start
+                same = "" if loaded.stats() == expected else "  ДАННЫЕ НЕ СОВПАЛИ"
+                print(f"  {workers:>3} процессов: {seconds:.2f} с, ускорение {base / seconds:.2f}x{same}")
+            os.remove(filename)
+
+# размер снапшота против времени сохранения/загрузки для каждого сжатия
+def bench_compression(n_orders: int = 200000):
+    system = generate_system(max(1, n_orders // 10), max(1, n_orders // 1000), n_orders)
+    variants = [
+        ("json", "json", lambda fn: system.save_json(fn), 'load_json'),
+        ("json compact", "json", lambda fn: system.save_json(fn, compact=True), 'load_json'),
+        ("xml", "xml", lambda fn: system.save_xml_stream(fn), 'load_xml_stream'),
+    ]
+    print(f"заказов: {n_orders}")
+    print(f"{'формат':<14} {'сжатие':<6} {'размер, МБ':>10} {'доля':>6} {'запись, с':>10} {'чтение, с':>10}")
+    base = {}  # размер несжатого файла с отступами, от него считается доля
+    with open(os.devnull, 'w') as null:
+        for title, ext, save, load in variants:
+            for codec in ('', '.gz', '.bz2', '.xz'):
+                filename = f"bench_compression.{ext}{codec}"
+                with contextlib.redirect_stdout(null):
+                    start = time.perf_counter()
+                    save(filename)
+                    t_save = time.perf_counter() - start
+                    start = time.perf_counter()
+                    getattr(FoodDelivery(), load)(filename)
+                    t_load = time.perf_counter() - start
+                size = os.path.getsize(filename)
+                base.setdefault(ext, size)
+                print(f"{title:<14} {codec or '-':<6} {size / 2**20:>10.1f} {size / base[ext]:>6.1%} "
+                      f"{t_save:>10.2f} {t_load:>10.2f}")
+                os.remove(filename)
+
+# архив в старом формате (для bench_legacy): пишется потоково, как есть
+def write_legacy_archive(filename: str, n_orders: int, seed: int = 1):
+    rnd = random.Random(seed)
+    n_users, n_rests = max(1, n_orders // 10), max(1, n_orders // 1000)
+    with open_snapshot(filename, 'w', encoding='utf-8') as f:
+        f.write('{"users": [')
+        for i in range(1, n_users + 1):
+            f.write((',' if i > 1 else '') + json.dumps(
+                {'user_id': i, 'name': f"пользователь {i}", 'phone': f"+7999{i:07d}",
+                 'balance': rnd.randint(0, 5000)}, ensure_ascii=False))
+        f.write('], "restaurants": [')
+        for i in range(1, n_rests + 1):
+            menu = {f"блюдо {j}": rnd.randint(100, 900) for j in range(10)}
+            f.write((',' if i > 1 else '') + json.dumps(
+                {'rest_id': i, 'name': f"ресторан {i}", 'address': f"ул. ленина {i}",
+                 'menu': menu, 'is_open': rnd.random() < 0.9}, ensure_ascii=False))
+        f.write('], "orders": [')
+        for i in range(1, n_orders + 1):
+            f.write((',' if i > 1 else '') + json.dumps(
+                {'order_id': i, 'user_id': rnd.randint(1, n_users), 'rest_id': rnd.randint(1, n_rests),
+                 'items': {f"блюдо {rnd.randrange(10)}": rnd.randint(1, 3)},
+                 'total': rnd.randint(100, 3000), 'status': rnd.choice(OrderColumns.STATUSES)},
+                ensure_ascii=False))
+        f.write(f'], "next_ids": {{"user": {n_users + 1}, "rest": {n_rests + 1}, "order": {n_orders + 1}}}}}')
+
+# перевод архивов старого формата: время и пиковая память на разных размерах
+def bench_legacy(*sizes):
+    import tracemalloc
+    for n_orders in sizes or (10000, 100000, 1000000):
+        src, dst = "bench_legacy.json", "bench_converted.json.gz"
+        write_legacy_archive(src, n_orders)
+        start = time.perf_counter()
+        counts = LegacySchema.convert(src, dst)
+        seconds = time.perf_counter() - start
+        # память отдельным прогоном: под tracemalloc все сильно медленнее
+        tracemalloc.start()
+        LegacySchema.convert(src, dst)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"заказов {n_orders:>8}: {os.path.getsize(src) / 2**20:>7.1f} МБ -> "
+              f"{os.path.getsize(dst) / 2**20:>6.1f} МБ (.gz) за {seconds:.2f} с, "
+              f"пик памяти {peak / 2**20:.1f} МБ, записей {sum(counts.values())}")
+        os.remove(src)
+        os.remove(dst)
+
+# горячие заказы до и после переноса старых в архив
+def bench_archive(n_orders: int = 500000, path: str = "bench_archive"):
+    system = generate_system(max(1, n_orders // 10), max(1, n_orders // 1000), n_orders)
+    expected = system.stats()
+    old_ids = [o.id for o in system.orders if o.status in FoodDelivery.ARCHIVE_STATUSES]
+    users = [u.id for u in system.users[:1000]]
+    shutil.rmtree(path, ignore_errors=True)
+    
+    with open(os.devnull, 'w') as null:
+        for title in ("без архива", "с архивом"):
+            if title == "с архивом":
+                system.open_archive(path)
+                start = time.perf_counter()
+                moved = system.archive_orders(timedelta(0))
+                print(f"в архив перенесено {moved} заказов за {time.perf_counter() - start:.2f} с")
+            with contextlib.redirect_stdout(null):
+                start = time.perf_counter()
+                system.save_json("bench_archive.json")
+                t_save = time.perf_counter() - start
+            start = time.perf_counter()
+            for oid in old_ids[:10000]:
+                system.find_order(oid)
+            t_find = (time.perf_counter() - start) / max(1, min(len(old_ids), 10000))
+            start = time.perf_counter()
+            for uid in users:
+                system.orders_of_user(uid)
+            t_user = (time.perf_counter() - start) / len(users)
+            print(f"{title}: в памяти {len(system.orders)} заказов, save_json {t_save:.2f} с, "
+                  f"find_order старого {t_find * 1e6:.1f} мкс, orders_of_user {t_user * 1e6:.1f} мкс")
+    print("stats совпадают" if system.stats() == expected else "stats НЕ совпадают")
+    os.remove("bench_archive.json")
+    shutil.rmtree(path)
+
+# save_json/save_xml_stream с пустым и заполненным кэшем кусков;
+# меню большие (как в жизни), меняется небольшая доля ресторанов и пользователей
+def bench_fragments(n_users: int = 100000, n_rests: int = 2000, n_orders: int = 100000,
+                    menu_size: int = 100, changed_percent: int = 1):
+    system = generate_system(n_users, n_rests, n_orders)
+    rnd = random.Random(1)
+    for rest in system.restaurants:
+        rest.add_dishes(Dish(f"блюдо {i}", float(rnd.randint(100, 1500)), "описание")
+                        for i in range(menu_size - len(rest.menu)))
+    print(f"пользователей {n_users}, ресторанов {n_rests} по {menu_size} блюд, заказов {n_orders}")
+    
+    with open(os.devnull, 'w') as null:
+        for method, filename in (('save_json', "bench_fragments.json"),
+                                 ('save_xml_stream', "bench_fragments.xml")):
+            system.fragments.clear()
+            times = []
+            for _ in range(2):
+                with contextlib.redirect_stdout(null):
+                    start = time.perf_counter()
+                    getattr(system, method)(filename)
+                    times.append(time.perf_counter() - start)
+            for rest in rnd.sample(system.restaurants, len(system.restaurants) * changed_percent // 100):
+                rest.switch_open()
+            for user in rnd.sample(system.users, len(system.users) * changed_percent // 100):
+                user.add_money(1)
+            with contextlib.redirect_stdout(null):
+                start = time.perf_counter()
+                getattr(system, method)(filename)
+                times.append(time.perf_counter() - start)
+            print(f"{method}: пустой кэш {times[0]:.2f} с, повтор {times[1]:.2f} с, "
+                  f"после изменения {changed_percent}% - {times[2]:.2f} с")
+            os.remove(filename)
+    cache = system.fragments
+    print(f"в кэше {len(cache)} кусков, {cache.size / 2**20:.1f} MB из {cache.max_bytes / 2**20:.0f} MB")
+
+BENCHES = {
+    'json': bench_json_load,
+    'xml': bench_xml,
+    'formats': bench_formats,
+    'memory': bench_memory,
+    'analytics': bench_analytics,
+    'http': bench_http,
+    'shards': bench_shards,
+    'menu': bench_menu_search,
+    'topk': bench_topk,
+    'metrics': bench_metrics,
+    'suite': bench_suite,
+    'sqlite': bench_sqlite,
+    'lazy': bench_lazy,
+    'parallel': bench_parallel_load,
+    'compression': bench_compression,
+    'legacy': bench_legacy,
+    'archive': bench_archive,
+    'fragments': bench_fragments,
+}
+
+def main(argv: List[str]):
+    if argv and argv[0] == 'measure-load':
+        measure_load(argv[1], argv[2])
+    elif argv and argv[0] == 'measure-memory':
+        measure_memory(argv[1])
+    elif argv and argv[0] in BENCHES:
+        # python 1laba_bench.py json 1000000 - аргументы идут числами
+        # бенчмарк, вернувший False (регрессия, нарушенный инвариант), дает код выхода 1
+        if BENCHES[argv[0]](*[int(x) if x.isdigit() else x for x in argv[1:]]) is False:
+            sys.exit(1)
+    else:
+        print("использование: 1laba_bench.py {" + ",".join(BENCHES) + "} [аргументы]")
+
+# запуск
+if __name__ == "__main__":
+    main(sys.argv[1:])
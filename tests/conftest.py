@@ -0,0 +1,11 @@
+import importlib.util
+import pathlib
+import sys
+
+# 1laba.py не импортируется по имени (начинается с цифры) - грузим по пути
+# один раз и регистрируем как laba1, тесты делают import laba1
+if "laba1" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("laba1", pathlib.Path(__file__).parent.parent / "1laba.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["laba1"] = module
+    spec.loader.exec_module(module)
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import random
+
+import laba1 as laba
+
+
+def sketch(k=3):
+    # exact_limit=0 - сразу режим sketch
+    return laba.HeavyHitters(k=k, exact_limit=0, width=256, depth=4)
+
+
+def test_heap_stays_bounded():
+    hh = sketch(k=5)
+    for i in range(200000):
+        hh.add(i % 5)
+    assert len(hh.heap) <= 4 * hh.k + 1
+    assert sorted(hh.top()) == [(key, 40000) for key in range(5)]
+
+
+def test_heap_bounded_with_churn():
+    hh = sketch(k=5)
+    rnd = random.Random(1)
+    for _ in range(50000):
+        hh.add(rnd.randrange(1000))
+    assert len(hh.heap) <= 4 * hh.k + 1
+    assert len(hh.candidates) == 5
+
+
+def test_int_and_str_keys_with_same_estimate():
+    # у 1 и "1" одни ячейки sketch, после слияния оценки равны
+    hh = sketch(k=2)
+    hh.add(1)
+    hh.add("1")
+    hh.merge(sketch(k=2))
+    assert hh.top() == [(1, 2), ("1", 2)] or hh.top() == [("1", 2), (1, 2)]
+
+
+def test_heavy_keys_found():
+    hh = laba.HeavyHitters(k=3, exact_limit=10)
+    rnd = random.Random(2)
+    for _ in range(20000):
+        hh.add(rnd.randrange(500))
+        hh.add(rnd.choice(["a", "b", "c"]))
+    assert {key for key, _ in hh.top()} == {"a", "b", "c"}
+
+
+def test_merge_matches_single_stream():
+    whole, left, right = sketch(), sketch(), sketch()
+    rnd = random.Random(3)
+    for i in range(20000):
+        key = rnd.choice("aaaabbbcc") if i % 2 else rnd.randrange(100)
+        whole.add(key)
+        (left if i % 3 else right).add(key)
+    left.merge(right)
+    assert left.top() == whole.top()
+    again = laba.HeavyHitters.from_state(left.to_state())
+    assert again.top() == left.top()
+
+
+def test_analytics_follow_reload(tmp_path):
+    first = laba.generate_system(20, 3, 200, seed=1)
+    second = laba.generate_system(20, 3, 200, seed=2)
+    expected = second.enable_analytics().top_restaurants()
+    path = str(tmp_path / "second.json")
+
+    analytics = first.enable_analytics()
+    with contextlib.redirect_stdout(io.StringIO()):
+        second.save_json(path)
+        first.load_json(path)
+    assert analytics.top_restaurants() == expected
+
+    first.clear()
+    assert analytics.top_restaurants() == []
+    with contextlib.redirect_stdout(io.StringIO()):
+        first.load_json(path, lazy=True)
+    assert first.analytics.top_restaurants() == expected
@@ -0,0 +1,134 @@
+import contextlib
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+import laba1 as laba
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def fill(system):
+    for i in range(3):
+        system.add_user(f"u{i}", f"u{i}@mail.ru", f"+{i}").add_money(10000)
+    rest = system.add_restaurant("Пиццерия", "ул. Ленина, 1", "+7800")
+    rest.add_dish(laba.Dish("Пицца", 100.0, "с сыром"))
+    for i in range(30):
+        order = system.make_order(i % 3 + 1, 1)
+        order.add_dish("Пицца", i % 4 + 1)
+        quiet(system.process_order, order.id)
+        # первые 20 - выполнены или отменены, остальные еще в работе
+        if i < 20:
+            if i % 5:
+                system.finish_order(order.id)
+            else:
+                system.cancel_order(order.id)
+
+
+@pytest.fixture
+def system(tmp_path):
+    system = laba.FoodDelivery()
+    fill(system)
+    system.open_archive(str(tmp_path / "archive"))
+    return system
+
+
+def archive_all(system):
+    return system.archive_orders(timedelta(0), now=datetime.now() + timedelta(seconds=1))
+
+
+def test_archived_orders_are_read_only(system):
+    archive_all(system)
+    for oid in (1, 2):
+        with pytest.raises(laba.DeliveryError):
+            system.cancel_order(oid)
+        with pytest.raises(laba.DeliveryError):
+            system.finish_order(oid)
+        with pytest.raises(laba.DeliveryError):
+            system.process_order(oid)
+    assert system.find_order(1).status == laba.OrderStatus.cancelled
+
+
+def test_user_history_after_archive(system):
+    user = system.find_user(1)
+    paid = [o.id for o in user.my_orders]
+    history = [o.id for o in system.orders_of_user(1)]
+    archive_all(system)
+    # my_orders - оплаченные в этом сеансе, перенос их не трогает
+    assert [o.id for o in user.my_orders] == paid
+    assert [o.id for o in system.orders_of_user(1)] == history
+
+
+def test_find_archived_orders(system):
+    before = {o.id: o.to_dict() for o in system.orders}
+    stats = system.stats()
+    assert archive_all(system) == 20
+    assert len(system.orders) == 10
+    assert system.stats() == stats
+    for oid, data in before.items():
+        assert system.find_order(oid).to_dict() == data
+    assert system.find_order(31) is None
+    for uid in (1, 2, 3):
+        history = system.orders_of_user(uid)
+        assert [o.id for o in history] == sorted(oid for oid, d in before.items() if d['user_id'] == uid)
+        assert all(o.to_dict() == before[o.id] for o in history)
+
+
+def test_archive_reopened_from_disk(system, tmp_path):
+    archive_all(system)
+    stats = system.stats()
+    snapshot = str(tmp_path / "snap.json")
+    quiet(system.save_json, snapshot)
+
+    again = laba.FoodDelivery()
+    again.open_archive(str(tmp_path / "archive"))
+    quiet(again.load_json, snapshot)
+    assert again.stats() == stats
+    assert again.find_order(1).status == laba.OrderStatus.cancelled
+    assert again.find_order(2).to_dict() == system.find_order(2).to_dict()
+    assert [o.id for o in again.orders_of_user(1)] == [o.id for o in system.orders_of_user(1)]
+
+
+def test_missing_index_is_rebuilt(system, tmp_path):
+    archive_all(system)
+    path = tmp_path / "archive"
+    idx = sorted(path.glob("*.idx"))
+    assert idx
+    for file in idx:
+        file.unlink()
+
+    archive = laba.OrderArchive(str(path))
+    assert all(file.exists() for file in idx)
+    assert len(archive) == 20
+    assert archive.counters.counts == system.archive.counters.counts
+    for oid in range(1, 21):
+        assert archive.get(oid)['id'] == oid
+    assert archive.get(21) is None
+
+
+def test_replay_archive_after_crash_before_compact(tmp_path):
+    snapshot, journal = str(tmp_path / "snap.json"), str(tmp_path / "journal.log")
+    system = laba.FoodDelivery()
+    system.open_archive(str(tmp_path / "archive"))
+    quiet(system.open_journal, snapshot, journal)
+    fill(system)
+    # archive_orders без compact: сегмент уже на диске, а журнал не свернут
+    border = datetime.now() + timedelta(seconds=1)
+    system.log('a', border.isoformat())
+    assert system.archive_before(border) == 20
+    stats = system.stats()
+    system.close_journal()
+
+    again = laba.FoodDelivery()
+    again.open_archive(str(tmp_path / "archive"))
+    quiet(again.open_journal, snapshot, journal)
+    assert again.stats() == stats
+    assert len(again.orders) == 10
+    assert len(again.archive) == 20
+    assert again.reconcile_stats()
+    assert again.find_order(2).status == laba.OrderStatus.completed
+    again.close_journal()
@@ -0,0 +1,69 @@
+import contextlib
+import importlib.util
+import io
+import json
+import pathlib
+
+import pytest
+
+import laba1 as laba
+
+spec = importlib.util.spec_from_file_location(
+    "laba1_bench", pathlib.Path(__file__).parent.parent / "1laba_bench.py")
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def test_generator_is_reproducible():
+    first = laba.generate_system(30, 4, 300, seed=7)
+    second = laba.generate_system(30, 4, 300, seed=7)
+    other = laba.generate_system(30, 4, 300, seed=8)
+    assert first.snapshot_dict()['restaurants'] == second.snapshot_dict()['restaurants']
+    assert [(o.user.id, o.rest.id, o.items, o.status) for o in first.orders] == \
+        [(o.user.id, o.rest.id, o.items, o.status) for o in second.orders]
+    assert [o.rest.id for o in first.orders] != [o.rest.id for o in other.orders]
+    assert first.stats()['orders'] == 300 and len(first.find_rest(1).menu) == 10
+
+
+def test_generator_skew():
+    flat = laba.generate_system(10, 20, 4000, skew=0.0)
+    skewed = laba.generate_system(10, 20, 4000, skew=1.5)
+    top = lambda s: max(s.columns.count_by_rest().values())
+    assert top(skewed) > 3 * top(flat)
+
+
+def test_suite_writes_results_and_flags_regressions(tmp_path):
+    out = tmp_path / "results.json"
+    assert quiet(bench.bench_suite, 50, 5, 300, str(out), repeat=1)
+    report = json.loads(out.read_text(encoding='utf-8'))
+    assert report['params']['n_orders'] == 300
+    assert {'generate', 'find_user', 'show_stats', 'save_json', 'load_json'} <= set(report['results'])
+
+    # базовый прогон в 100 раз быстрее - каждая операция считается регрессией
+    for res in report['results'].values():
+        res['seconds'] /= 100
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(report), encoding='utf-8')
+    text = io.StringIO()
+    with contextlib.redirect_stdout(text):
+        ok = bench.bench_suite(50, 5, 300, str(tmp_path / "again.json"), str(baseline), 10, 1)
+    assert ok is False
+    assert "РЕГРЕССИЯ" in text.getvalue()
+
+
+@pytest.mark.parametrize("mode", ['json', 'json_stream'])
+def test_load_measured_in_subprocess(tmp_path, mode):
+    path = str(tmp_path / "snap.json")
+    quiet(laba.generate_system(20, 2, 100).save_json, path)
+    result = bench.measure_load_subprocess(mode, path)
+    assert result['mode'] == mode and result['orders'] == 100 and result['peak_mb'] > 0
+
+
+def test_unknown_bench_prints_usage(capsys):
+    bench.main(['nope'])
+    assert "1laba_bench.py" in capsys.readouterr().out
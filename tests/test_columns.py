@@ -0,0 +1,106 @@
+import contextlib
+import io
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+import laba1 as laba
+
+BASE = datetime(2024, 3, 1, 8, 30)
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture
+def system():
+    system = laba.generate_system(50, 5, 600)
+    # разносим заказы по трем суткам, не по порядку id
+    for order in system.orders:
+        old_time, old_end = order.time, order.end_time
+        order.time = BASE + timedelta(minutes=(order.id * 37) % (3 * 24 * 60))
+        if order.end_time is not None:
+            order.end_time = order.time + timedelta(minutes=order.id % 50)
+        system.times_changed(order, old_time, old_end)
+    return system
+
+
+def completed(system):
+    return [o for o in system.orders if o.status == laba.OrderStatus.completed]
+
+
+def check_columns(system):
+    cols = system.columns
+    done = completed(system)
+    assert len(cols) == len(system.orders)
+    assert math.isclose(cols.revenue(), sum(o.sum for o in done))
+    assert cols.count() == len(done)
+    assert math.isclose(cols.average_check(), sum(o.sum for o in done) / len(done))
+    assert cols.count_by_status() == dict(Counter(o.status for o in system.orders))
+    assert cols.count_by_rest() == dict(Counter(o.rest.id for o in system.orders))
+    assert cols.count_by_day() == dict(sorted(Counter(o.time.date() for o in system.orders).items()))
+    statuses = (laba.OrderStatus.cancelled,)
+    assert cols.count_by_rest(statuses) == dict(Counter(o.rest.id for o in system.orders
+                                                        if o.status in statuses))
+
+
+def check_time_index(system):
+    index = system.time_index
+    assert len(index) == len(system.orders)
+    assert [o.time for o in index.orders] == sorted(o.time for o in system.orders)
+    start, end = BASE + timedelta(hours=20), BASE + timedelta(hours=30)
+    assert {o.id for o in system.orders_between(start, end)} == \
+        {o.id for o in system.orders if start <= o.time < end}
+
+    daily = index.daily()
+    assert sum(row[1] for row in daily) == len(system.orders)
+    assert math.isclose(sum(row[2] for row in daily), sum(o.sum for o in completed(system)))
+    for day_start, count, revenue, delivery in daily:
+        day = [o for o in system.orders if day_start <= o.time < day_start + timedelta(days=1)]
+        assert count == len(day)
+        done = [o for o in day if o.status == laba.OrderStatus.completed and o.end_time is not None]
+        if done:
+            expected = sum((o.end_time - o.time).total_seconds() for o in done) / len(done)
+            assert math.isclose(delivery, expected)
+        else:
+            assert delivery is None
+    hours = index.hourly(BASE, BASE + timedelta(hours=5))
+    assert all(BASE.replace(minute=0) <= row[0] < BASE + timedelta(hours=5) for row in hours)
+
+
+def test_columns_match_orders(system):
+    check_columns(system)
+
+
+def test_time_index_matches_orders(system):
+    check_time_index(system)
+
+
+def test_indexes_follow_changes(system):
+    for user in system.users:
+        user.add_money(10 ** 6)
+    created = [o for o in system.orders if o.status == laba.OrderStatus.created][:40]
+    for order in created[:20]:
+        quiet(system.process_order, order.id)
+        system.finish_order(order.id)
+    for order in created[20:]:
+        system.cancel_order(order.id)
+    order = system.make_order(1, 1)
+    order.add_dish(next(iter(system.find_rest(1).menu)), 2)
+    check_columns(system)
+    check_time_index(system)
+
+
+def test_indexes_rebuilt_after_load(system, tmp_path):
+    path = str(tmp_path / "snap.json")
+    quiet(system.save_json, path)
+    again = laba.FoodDelivery()
+    quiet(again.load_json, path)
+    assert again.columns.count_by_day() == system.columns.count_by_day()
+    assert again.time_index.daily() == system.time_index.daily()
+    check_columns(again)
+    check_time_index(again)
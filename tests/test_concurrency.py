@@ -0,0 +1,100 @@
+import contextlib
+import io
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import laba1 as laba
+
+N_USERS = 20
+N_ORDERS = 4000
+WORKERS = 16
+
+
+@pytest.fixture
+def switch_often():
+    # переключать потоки как можно чаще, чтобы гонки проявлялись
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(old)
+
+
+@pytest.fixture
+def system():
+    rnd = random.Random(1)
+    system = laba.FoodDelivery()
+    for i in range(N_USERS):
+        system.add_user(f"u{i}", f"u{i}@mail.ru", str(i)).add_money(rnd.randint(20000, 60000))
+    rest = system.add_restaurant("стресс", "ул. ленина 1")
+    for j in range(5):
+        rest.add_dish(laba.Dish(f"блюдо {j}", 100 + 50 * j))
+    return system
+
+
+def total_money(system):
+    return sum(u.money for u in system.users)
+
+
+def test_parallel_create_pay_top_up(system, switch_often):
+    initial = total_money(system)
+
+    # заказы создаем тоже параллельно - id не должны повторяться
+    def create(k):
+        order = system.make_order(k % N_USERS + 1, 1)
+        order.add_dish(f"блюдо {k % 5}", 1 + k % 3)
+        return order.id
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        oids = list(pool.map(create, range(N_ORDERS)))
+        # пополнения идут одновременно с оплатой
+        top_ups = [pool.submit(system.find_user(k % N_USERS + 1).add_money, 10) for k in range(N_ORDERS // 10)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = system.process_orders_parallel(oids, WORKERS)
+        for f in top_ups:
+            f.result()
+
+    assert len(set(oids)) == N_ORDERS == len(system.orders)
+    charged = sum(system.find_order(oid).sum for oid, ok in zip(oids, results) if ok)
+    assert all(u.money >= 0 for u in system.users)
+    assert total_money(system) == initial + 10 * len(top_ups) - charged
+    # денег хватает не на все заказы - часть должна отказать
+    assert 0 < sum(results) < N_ORDERS
+    stats = system.stats()
+    assert stats['by_status'].get(laba.OrderStatus.processing, 0) == sum(results)
+    assert sum(stats['by_status'].values()) == N_ORDERS
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert system.reconcile_stats()
+
+
+def test_parallel_finish_and_cancel(system, switch_often):
+    initial = total_money(system)
+    oids = []
+    for k in range(N_ORDERS // 4):
+        order = system.make_order(k % N_USERS + 1, 1)
+        order.add_dish(f"блюдо {k % 5}")
+        oids.append(order.id)
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.process_orders(oids)
+
+    # каждый заказ пытаются и завершить, и отменить (дважды) из разных потоков
+    jobs = [(fn, oid) for oid in oids
+            for fn in (system.finish_order, system.cancel_order, system.cancel_order)]
+    random.Random(2).shuffle(jobs)
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        list(pool.map(lambda job: job[0](job[1]), jobs))
+
+    completed = [system.find_order(oid) for oid in oids
+                 if system.find_order(oid).status == laba.OrderStatus.completed]
+    cancelled = [oid for oid in oids if system.find_order(oid).status == laba.OrderStatus.cancelled]
+    assert len(completed) + len(cancelled) == len(oids)
+    # деньги списаны только за выполненные: отмененные вернули ровно один раз
+    assert total_money(system) == initial - sum(o.sum for o in completed)
+    stats = system.stats()
+    assert stats['completed'] == len(completed)
+    assert stats['revenue'] == pytest.approx(sum(o.sum for o in completed))
+    assert system.columns.count_by_status() == {st: n for st, n in stats['by_status'].items() if n}
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert system.reconcile_stats()
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+import laba1 as laba
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+# то, что писал save_json до кэша кусков
+def reference(system, compact):
+    layout = {'separators': (',', ':')} if compact else {'indent': 2}
+    return json.dumps(system.snapshot_dict(), ensure_ascii=False, default=str, **layout)
+
+
+def saved(system, path, compact):
+    assert quiet(system.save_json, str(path), compact)
+    return path.read_text(encoding='utf-8')
+
+
+def change_dish(system):
+    rest = system.find_rest(1)
+    # замена блюда с тем же названием и прямая запись поля с touch()
+    rest.add_dish(laba.Dish("Пицца", 0.1 + 0.2, "с «сыром» и \"соусом\"", "горячее"))
+    dish = rest.menu["Суп"]
+    dish.price = 99.5
+    dish.touch()
+
+
+def change_menu(system):
+    rest = system.find_rest(2)
+    rest.add_dish(laba.Dish("Чай", 30.0, "черный"))
+    rest.switch_open()
+    rest.set_rating(4.5)
+
+
+def change_money(system):
+    system.find_user(1).add_money(123.45)
+    order = system.make_order(2, 1)
+    order.add_dish("Пицца", 2)
+    quiet(system.process_order, order.id)
+
+
+def change_user(system):
+    user = system.find_user(3)
+    user.phone = "+7 999"
+    user.touch()
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_save_json_matches_json_dump(tmp_path, compact):
+    system = laba.generate_system(20, 3, 50)
+    for rid in (1, 2):
+        system.find_rest(rid).add_dish(laba.Dish("Пицца", 100.0, "с сыром"))
+        system.find_rest(rid).add_dish(laba.Dish("Суп", 80.0, "борщ"))
+    path = tmp_path / "snap.json"
+
+    assert saved(system, path, compact) == reference(system, compact)
+    # второй раз - уже из кэша
+    assert saved(system, path, compact) == reference(system, compact)
+    for change in (change_dish, change_menu, change_money, change_user):
+        change(system)
+        assert saved(system, path, compact) == reference(system, compact), change.__name__
+
+
+def test_both_layouts_share_the_cache(tmp_path):
+    system = laba.generate_system(10, 2, 20)
+    path = tmp_path / "snap.json"
+    saved(system, path, False)
+    saved(system, path, True)
+    system.find_user(1).add_money(1)
+    assert saved(system, path, False) == reference(system, False)
+    assert saved(system, path, True) == reference(system, True)
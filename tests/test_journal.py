@@ -0,0 +1,74 @@
+import contextlib
+import io
+import json
+import threading
+
+import laba1 as laba
+
+
+def write_journal(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def reopen(tmp_path):
+    system = laba.FoodDelivery()
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.open_journal(str(tmp_path / "snap.json"), str(tmp_path / "journal.log"))
+    return system
+
+
+def test_replay_out_of_order_ids(tmp_path):
+    # два потока взяли id 1 и 2, а в журнал первым успел второй
+    write_journal(tmp_path / "journal.log", [
+        [1, 'u', 2, "Петр", "petr@mail.ru", "+2"],
+        [2, 'u', 1, "Иван", "ivan@mail.ru", "+1"],
+        [3, 'r', 1, "Пиццерия", "ул. Ленина, 1", ""],
+        [4, 'o', 2, 2, 1, "2024-01-01T12:00:00"],
+        [5, 'o', 1, 1, 1, "2024-01-01T12:00:01"],
+    ])
+    system = reopen(tmp_path)
+
+    assert system.find_user(1).email == "ivan@mail.ru"
+    assert system.find_user(2).email == "petr@mail.ru"
+    assert system.find_order(1).user.id == 1
+    assert system.find_order(2).user.id == 2
+    assert (system.next_uid, system.next_rid, system.next_oid) == (3, 2, 3)
+
+    # новые id не совпадают с повторенными
+    assert system.add_user("Анна", "anna@mail.ru", "+3").id == 3
+    assert system.make_order(1, 1).id == 3
+    system.close_journal()
+
+
+def test_concurrent_adds_survive_restart(tmp_path):
+    system = reopen(tmp_path)
+    rest = system.add_restaurant("Пиццерия", "ул. Ленина, 1")
+    rest.add_dish(laba.Dish("Пицца", 100.0))
+    n = 8
+    barrier = threading.Barrier(n)
+
+    def worker(k):
+        barrier.wait()
+        for i in range(50):
+            user = system.add_user(f"u{k}-{i}", f"u{k}-{i}@mail.ru", f"+{k}-{i}")
+            user.add_money(100)
+            system.make_order(user.id, rest.id).add_dish("Пицца")
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    before = system.snapshot_dict()
+    system.close_journal()
+
+    again = reopen(tmp_path)
+    after = again.snapshot_dict()
+    key = lambda item: item['id']
+    for section in ('users', 'restaurants', 'orders'):
+        assert sorted(after[section], key=key) == sorted(before[section], key=key)
+    assert after['next_ids'] == before['next_ids']
+    assert again.add_user("new", "new@mail.ru", "+new").id == n * 50 + 1
+    again.close_journal()
@@ -0,0 +1,44 @@
+import contextlib
+import io
+
+import pytest
+
+import laba1 as laba
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / "snap.json")
+    system = laba.generate_system(50, 5, 500)
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.save_json(path)
+    return path
+
+
+def load(path, **kwargs):
+    system = laba.FoodDelivery()
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.load_json(path, **kwargs)
+    return system
+
+
+def test_columns_and_time_index_in_lazy_mode(snapshot):
+    eager = load(snapshot)
+    lazy = load(snapshot, lazy=True, cache_size=10)
+
+    assert lazy.columns.revenue() == pytest.approx(eager.stats()['revenue'])
+    assert lazy.columns.revenue() == pytest.approx(lazy.stats()['revenue'])
+    assert lazy.columns.count_by_status() == eager.columns.count_by_status()
+    assert lazy.time_index.hourly() == eager.time_index.hourly()
+    assert len(lazy.time_index) == len(eager.orders)
+
+
+def test_lazy_orders_keep_identity(snapshot):
+    system = load(snapshot, lazy=True, cache_size=10)
+    first = system.find_order(1)
+    for oid in range(2, 100):
+        system.find_order(oid)
+    # объект вытеснен из кэша, но пока на него есть ссылка - он тот же
+    assert system.find_order(1) is first
+    system.materialize_all()
+    assert system.find_order(1) is first
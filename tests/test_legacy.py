@@ -0,0 +1,92 @@
+import contextlib
+import io
+import json
+import pathlib
+import shutil
+from datetime import datetime
+
+import pytest
+
+import laba1 as laba
+
+FOOD_DATA = pathlib.Path(__file__).parent.parent / "food_data.json"
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def write(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+    return str(path)
+
+
+def test_import_repo_food_data(tmp_path):
+    path = shutil.copy(FOOD_DATA, tmp_path / "food_data.json")
+    raw = json.loads(FOOD_DATA.read_text(encoding='utf-8'))
+    assert laba.LegacySchema.detect(path) == 'legacy'
+
+    system = laba.FoodDelivery()
+    quiet(system.import_json, path)
+
+    assert [u.id for u in system.users] == [u['user_id'] for u in raw['users']]
+    for u in raw['users']:
+        user = system.find_user(u['user_id'])
+        assert (user.name, user.phone, user.money) == (u['name'], u['phone'], u['balance'])
+    for r in raw['restaurants']:
+        rest = system.find_rest(r['rest_id'])
+        assert (rest.name, rest.address, rest.open) == (r['name'], r['address'], r['is_open'])
+        assert {name: dish.price for name, dish in rest.menu.items()} == r['menu']
+    for o in raw['orders']:
+        order = system.find_order(o['order_id'])
+        assert (order.user.id, order.rest.id) == (o['user_id'], o['rest_id'])
+        assert (order.items, order.sum, order.status) == (o['items'], o['total'], o['status'])
+        # времени в старом формате нет - берется время изменения файла
+        assert order.time == datetime.fromisoformat(laba.LegacySchema.file_time(path))
+    ids = raw['next_ids']
+    assert (system.next_uid, system.next_rid, system.next_oid) == (ids['user'], ids['rest'], ids['order'])
+    assert system.stats()['orders'] == len(raw['orders'])
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_converted_file_loads_like_import(tmp_path, compact):
+    src = str(shutil.copy(FOOD_DATA, tmp_path / "food_data.json"))
+    dst = str(tmp_path / "converted.json")
+    counts = laba.LegacySchema.convert(src, dst, compact)
+    assert counts == {'users': 1, 'restaurants': 1, 'orders': 1}
+    assert laba.LegacySchema.detect(dst) == 'current'
+
+    imported, loaded = laba.FoodDelivery(), laba.FoodDelivery()
+    quiet(imported.import_json, src)
+    quiet(loaded.load_json, dst)
+    assert loaded.snapshot_dict() == imported.snapshot_dict()
+    assert loaded.stats() == imported.stats()
+
+
+def test_convert_with_empty_sections(tmp_path):
+    src = write(tmp_path / "old.json", {
+        'users': [{'user_id': 5, 'name': "Вася", 'phone': "+7", 'balance': 10}],
+        'restaurants': [],
+        'orders': [],
+        'next_ids': {'user': 6, 'rest': 1, 'order': 1},
+    })
+    dst = str(tmp_path / "converted.json")
+    assert laba.LegacySchema.convert(src, dst) == {'users': 1, 'restaurants': 0, 'orders': 0}
+
+    system = laba.FoodDelivery()
+    quiet(system.load_json, dst)
+    assert [u.id for u in system.users] == [5]
+    assert system.restaurants == [] and system.orders == []
+    assert (system.next_uid, system.next_rid, system.next_oid) == (6, 1, 1)
+
+
+def test_current_file_is_not_touched_by_import(tmp_path):
+    system = laba.generate_system(5, 2, 10)
+    path = str(tmp_path / "snap.json")
+    quiet(system.save_json, path)
+    assert laba.LegacySchema.detect(path) == 'current'
+
+    again = laba.FoodDelivery()
+    quiet(again.import_json, path)
+    assert again.snapshot_dict() == system.snapshot_dict()
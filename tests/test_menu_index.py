@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import laba1 as laba
+
+
+@pytest.fixture
+def system():
+    system = laba.FoodDelivery()
+    pizza = system.add_restaurant("Пиццерия", "ул. Ленина, 1")
+    pizza.add_dishes([
+        laba.Dish("Маргарита", 450.0, "томаты, моцарелла", "пицца"),
+        laba.Dish("Пепперони", 550.0, "острая колбаса", "пицца"),
+        laba.Dish("Морс", 120.0, "клюквенный", "напитки"),
+    ])
+    sushi = system.add_restaurant("Суши", "ул. Мира, 2")
+    sushi.add_dishes([
+        laba.Dish("Филадельфия", 650.0, "лосось, сливочный сыр", "роллы"),
+        laba.Dish("Морс", 150.0, "брусничный", "напитки"),
+    ])
+    return system
+
+
+def names(found):
+    return [(rest.id, dish.name) for rest, dish in found]
+
+
+def brute(system, text=None, category=None, min_price=None, max_price=None, open_only=False):
+    words = laba.MenuIndex.tokens(text) if text else set()
+    found = []
+    for rest in system.restaurants:
+        for dish in rest.menu.values():
+            dish_words = laba.MenuIndex.tokens(dish.name, dish.desc)
+            if any(not any(w.startswith(q) for w in dish_words) for q in words):
+                continue
+            if category is not None and dish.category != category:
+                continue
+            if (min_price is not None and dish.price < min_price) or (max_price is not None and dish.price > max_price):
+                continue
+            if open_only and not rest.open:
+                continue
+            found.append((dish.price, rest.id, dish.name))
+    return sorted(found)
+
+
+def test_search(system):
+    assert names(system.search_dishes("морс")) == [(1, "Морс"), (2, "Морс")]
+    assert names(system.search_dishes("моц")) == [(1, "Маргарита")]
+    assert names(system.search_dishes(category="пицца", max_price=500)) == [(1, "Маргарита")]
+    assert names(system.search_dishes(min_price=600)) == [(2, "Филадельфия")]
+    system.find_rest(2).switch_open()
+    assert names(system.search_dishes("морс", open_only=True)) == [(1, "Морс")]
+
+
+def test_replacing_dishes_keeps_index_small(system):
+    rest = system.find_rest(1)
+    index = system.menu_index
+    for i in range(1000):
+        rest.add_dish(laba.Dish("Морс", 100.0 + i, "клюквенный", "напитки"))
+    assert len(index) == 5
+    assert len(index.entries) <= 2 * len(index) + 1
+    assert len(index.prices) == len(index.entries)
+    assert names(system.search_dishes("морс", min_price=1000)) == [(1, "Морс")]
+    assert names(system.search_dishes(max_price=130)) == []
+
+
+def test_direct_price_write_not_returned_out_of_range(system):
+    dish = system.find_rest(1).find_dish("Маргарита")
+    dish.price = 900.0
+    for found in (system.search_dishes(max_price=500), system.search_dishes("маргарита", max_price=500)):
+        assert (1, "Маргарита") not in names(found)
+    system.menu_index.compact()
+    assert names(system.search_dishes(min_price=800)) == [(1, "Маргарита")]
+
+
+def test_matches_brute_force_after_replacements():
+    system = laba.generate_system(10, 30, 0, dishes_per_rest=20)
+    rnd = random.Random(5)
+    for _ in range(2000):
+        rest = rnd.choice(system.restaurants)
+        old = rnd.choice(list(rest.menu.values()))
+        rest.add_dish(laba.Dish(old.name, float(rnd.randrange(50, 700, 10)), old.desc, old.category))
+    for rest in rnd.sample(system.restaurants, 10):
+        rest.switch_open()
+    for text, category, lo, hi, open_only in [
+            (None, None, 200, 400, False), ("пицца", None, None, 500, True),
+            (None, "напитки", 100, None, False), ("с", None, 300, 300, False), (None, None, None, None, True)]:
+        found = system.search_dishes(text, category, lo, hi, open_only)
+        prices = [dish.price for rest, dish in found]
+        assert prices == sorted(prices)
+        assert sorted((dish.price, rest.id, dish.name) for rest, dish in found) == \
+            brute(system, text, category, lo, hi, open_only)
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import json
+import random
+
+import pytest
+
+import laba1 as laba
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture
+def metrics():
+    metrics = laba.enable_metrics()
+    try:
+        yield metrics
+    finally:
+        laba.disable_metrics()
+
+
+def test_histogram_quantiles_within_bucket():
+    rnd = random.Random(1)
+    values = sorted(rnd.randrange(1, 10 ** 9) for _ in range(10000))
+    hist = laba.LatencyHistogram()
+    for ns in values:
+        hist.record(ns)
+    assert hist.total == len(values) and hist.sum == sum(values) and hist.max == values[-1]
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = values[int(q * len(values)) - 1]
+        # корзина - 1/16 октавы, ответ - ее верхняя граница
+        assert exact <= hist.quantile(q) <= exact * (1 + 1 / laba.LatencyHistogram.SUB) + 1
+    assert hist.quantile(1.0) == values[-1]
+    # count_below считает корзины целиком, поэтому граница с запасом
+    assert hist.count_below(2 * values[-1]) == len(values)
+    assert hist.count_below(values[0] // 2) == 0
+    assert laba.LatencyHistogram().quantile(0.5) == 0
+
+
+def test_bucket_bounds_cover_values():
+    for ns in (0, 1, 15, 16, 17, 31, 32, 1000, 123456789):
+        idx = laba.LatencyHistogram.bucket(ns)
+        assert laba.LatencyHistogram.bucket_low(idx) <= ns < laba.LatencyHistogram.bucket_low(idx + 1)
+
+
+def test_calls_and_errors_are_counted(metrics):
+    system = laba.FoodDelivery()
+    system.add_user("Иван", "ivan@mail.ru", "+7").add_money(1000)
+    rest = system.add_restaurant("Пиццерия", "ул. Ленина, 1")
+    rest.add_dish(laba.Dish("Пицца", 100.0))
+    for _ in range(5):
+        system.make_order(1, 1).add_dish("Пицца")
+    with pytest.raises(laba.UserNotFoundError):
+        system.make_order(99, 1)
+    list(system.query_orders(user_id=1))
+    quiet(system.show_stats)
+
+    data = metrics.to_dict()
+    assert data['FoodDelivery.make_order']['calls'] == 6
+    assert data['FoodDelivery.make_order']['errors'] == {'UserNotFoundError': 1}
+    assert data['Order.add_dish']['calls'] == 5
+    assert data['FoodDelivery.query_orders']['calls'] == 1
+    # stats внутри show_stats - вложенный вызов, отдельно не пишется
+    assert data['FoodDelivery.show_stats']['calls'] == 1
+    assert 'FoodDelivery.stats' not in data
+
+    text = metrics.prometheus_text()
+    assert 'food_delivery_op_seconds_count{op="FoodDelivery.make_order"} 6' in text
+    assert 'food_delivery_op_errors_total{op="FoodDelivery.make_order",error="UserNotFoundError"} 1' in text
+
+
+def test_disable_restores_methods(tmp_path):
+    original = laba.FoodDelivery.find_user
+    metrics = laba.enable_metrics()
+    assert laba.enable_metrics() is metrics
+    assert laba.FoodDelivery.find_user is not original
+    laba.FoodDelivery().find_user(1)
+    assert laba.disable_metrics() is metrics
+    assert laba.FoodDelivery.find_user is original
+    assert laba.disable_metrics() is None
+
+    quiet(metrics.save_json, str(tmp_path / "metrics.json"))
+    saved = json.loads((tmp_path / "metrics.json").read_text(encoding='utf-8'))
+    assert saved['FoodDelivery.find_user']['calls'] == 1
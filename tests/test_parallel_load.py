@@ -0,0 +1,102 @@
+import contextlib
+import io
+
+import pytest
+
+import laba1 as laba
+
+TRICKY = '}, {"id": 7, "name": "x"}, </user><user>&amp; ]},"orders":['
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def tricky_system():
+    system = laba.FoodDelivery()
+    for i in range(3):
+        user = system.add_user(f"{TRICKY} {i}", f"u{i}@mail.ru", f"+{i}")
+        user.add_money(1000)
+    rest = system.add_restaurant(TRICKY, TRICKY, TRICKY)
+    rest.add_dish(laba.Dish(TRICKY, 100.0, TRICKY, TRICKY))
+    rest.add_dish(laba.Dish("Пицца", 200.0, "с сыром"))
+    for uid in (1, 2, 3):
+        order = system.make_order(uid, 1)
+        order.add_dish(TRICKY, uid)
+        order.add_dish("Пицца")
+    quiet(system.process_order, 1)
+    system.finish_order(1)
+    return system
+
+
+def single_system():
+    system = laba.FoodDelivery()
+    system.add_user("Иван", "ivan@mail.ru", "+7").add_money(500)
+    rest = system.add_restaurant("Пиццерия", "ул. Ленина, 1", "+7800")
+    rest.add_dish(laba.Dish("Пицца", 100.0, "с сыром"))
+    system.make_order(1, 1).add_dish("Пицца")
+    return system
+
+
+def users_only_system():
+    system = laba.FoodDelivery()
+    system.add_user("Иван", "ivan@mail.ru", "+7")
+    return system
+
+
+SYSTEMS = {
+    'generated': lambda: laba.generate_system(200, 20, 2000),
+    'tricky': tricky_system,
+    'single': single_system,
+    'users_only': users_only_system,
+    'empty': laba.FoodDelivery,
+}
+
+SAVERS = [
+    ('json', lambda s, path: s.save_json(path)),
+    ('json', lambda s, path: s.save_json(path, compact=True)),
+    ('xml', lambda s, path: s.save_xml(path)),
+    ('xml', lambda s, path: s.save_xml_stream(path)),
+]
+
+
+@pytest.mark.parametrize("kind", SYSTEMS)
+@pytest.mark.parametrize("fmt, save", SAVERS)
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_round_trip(tmp_path, kind, fmt, save, workers):
+    system = SYSTEMS[kind]()
+    path = str(tmp_path / f"snap.{fmt}")
+    assert quiet(save, system, path)
+
+    loaded = laba.FoodDelivery()
+    quiet(loaded.load_parallel, path, fmt, workers)
+    assert loaded.snapshot_dict() == system.snapshot_dict()
+    assert loaded.stats() == system.stats()
+    # ссылки заказов указывают на объекты этой же системы
+    for order in loaded.orders:
+        assert order.user is loaded.find_user(order.user.id)
+        assert order.rest is loaded.find_rest(order.rest.id)
+        assert order in loaded.orders_of_user(order.user.id)
+
+
+@pytest.mark.parametrize("fmt", ['json', 'xml'])
+def test_chunks_cover_every_record(tmp_path, fmt):
+    system = laba.generate_system(100, 10, 1000)
+    path = str(tmp_path / f"snap.{fmt}")
+    quiet(system.save_json if fmt == 'json' else system.save_xml, path)
+    tasks, _ = laba.SnapshotChunks.plan(path, fmt, 16)
+    counts = {'users': 0, 'restaurants': 0, 'orders': 0}
+    for task in tasks:
+        counts[task[2]] += len(laba.parse_snapshot_chunk(task))
+    assert counts == {'users': 100, 'restaurants': 10, 'orders': 1000}
+    assert sum(1 for task in tasks if task[2] == 'orders') > 4
+
+
+def test_compressed_file_loads_sequentially(tmp_path):
+    system = single_system()
+    path = str(tmp_path / "snap.json.gz")
+    quiet(system.save_json, path)
+    loaded = laba.FoodDelivery()
+    quiet(loaded.load_parallel, path, 'json', 2)
+    assert loaded.snapshot_dict() == system.snapshot_dict()
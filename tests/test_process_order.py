@@ -0,0 +1,119 @@
+import contextlib
+import io
+import threading
+
+import pytest
+
+import laba1 as laba
+
+
+@pytest.fixture
+def system():
+    s = laba.FoodDelivery()
+    user = s.add_user("Иван", "ivan@mail.ru", "+79990000000")
+    user.add_money(1000)
+    rest = s.add_restaurant("Пиццерия", "ул. Ленина, 1")
+    rest.add_dish(laba.Dish("Пицца", 100.0))
+    return s
+
+
+def new_order(system):
+    order = system.make_order(1, 1)
+    order.add_dish("Пицца")
+    return order
+
+
+def test_same_order_from_many_threads_charged_once(system):
+    order = new_order(system)
+    n = 16
+    barrier = threading.Barrier(n)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(system.process_order(order.id))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert results.count(True) == 1
+    assert system.find_user(1).money == 900
+    assert order.status == laba.OrderStatus.processing
+
+
+def test_parallel_with_repeated_id_charged_once(system):
+    order = new_order(system)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = system.process_orders_parallel([order.id] * 5, workers=5)
+    assert results.count(True) == 1
+    assert system.find_user(1).money == 900
+
+
+def test_processing_order_not_charged_again(system):
+    order = new_order(system)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert system.process_order(order.id)
+        assert not system.process_order(order.id)
+    results = system.process_orders([order.id])
+    assert not results[0].ok
+    assert system.find_user(1).money == 900
+    # повторный запрос не отменяет уже оплаченный заказ
+    assert order.status == laba.OrderStatus.processing
+
+
+def make_system(kind, tmp_path):
+    if kind == 'memory':
+        s = laba.FoodDelivery()
+    else:
+        s = laba.SqliteDelivery(str(tmp_path / "delivery.db"))
+    user = s.add_user("Иван", "ivan@mail.ru", "+79990000000")
+    user.add_money(1000)
+    rest = s.add_restaurant("Пиццерия", "ул. Ленина, 1")
+    rest.add_dish(laba.Dish("Пицца", 100.0))
+    return s
+
+
+@pytest.mark.parametrize("kind", ['memory', 'sqlite'])
+def test_cancel_refunds_paid_order_once(kind, tmp_path):
+    s = make_system(kind, tmp_path)
+    paid = new_order(s)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert s.process_order(paid.id)
+    assert s.find_user(1).money == 900
+    assert s.cancel_order(paid.id)
+    assert s.find_user(1).money == 1000
+    # повторная отмена ничего не возвращает
+    assert not s.cancel_order(paid.id)
+    assert s.find_user(1).money == 1000
+
+    unpaid = new_order(s)
+    assert s.cancel_order(unpaid.id)
+    assert s.find_user(1).money == 1000
+
+
+def test_cancel_refund_survives_journal_replay(tmp_path):
+    snapshot, journal = str(tmp_path / "snap.json"), str(tmp_path / "journal.log")
+    s = laba.FoodDelivery()
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.open_journal(snapshot, journal)
+    s.add_user("Иван", "ivan@mail.ru", "+79990000000").add_money(1000)
+    s.add_restaurant("Пиццерия", "ул. Ленина, 1").add_dish(laba.Dish("Пицца", 100.0))
+    order = new_order(s)
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.process_order(order.id)
+    s.cancel_order(order.id)
+    s.cancel_order(order.id)
+    s.close_journal()
+    with open(journal, encoding='utf-8') as f:
+        assert sum(1 for line in f if '"c"' in line) == 1
+
+    again = laba.FoodDelivery()
+    with contextlib.redirect_stdout(io.StringIO()):
+        again.open_journal(snapshot, journal)
+    assert again.find_user(1).money == 1000
+    assert again.find_order(order.id).status == laba.OrderStatus.cancelled
+    again.close_journal()
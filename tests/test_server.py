@@ -0,0 +1,77 @@
+import asyncio
+import contextlib
+import io
+import json
+
+import pytest
+
+import laba1 as laba
+
+
+@pytest.fixture
+def server(tmp_path):
+    system = laba.FoodDelivery()
+    user = system.add_user("Иван", "ivan@mail.ru", "+79990000000")
+    user.add_money(1000)
+    rest = system.add_restaurant("Пиццерия", "ул. Ленина, 1", "+78000000000")
+    # пустые строки xml читает как None - в тестах их нет
+    rest.add_dish(laba.Dish("Пицца", 100.0, "с сыром"))
+    return laba.DeliveryServer(system, str(tmp_path))
+
+
+def call(server, method, path, data=None):
+    body = json.dumps(data).encode('utf-8') if data is not None else b''
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(server.dispatch(method, path, body))
+
+
+@pytest.mark.parametrize("fmt, loader", [('json', 'load_json'), ('xml', 'load_xml'), ('bin', 'load_bin')])
+def test_snapshot_round_trip(server, tmp_path, fmt, loader):
+    code, _ = call(server, 'POST', '/orders', {'user_id': 1, 'rest_id': 1, 'items': {'Пицца': 2}})
+    assert code == 201
+    code, reply = call(server, 'POST', '/snapshot', {'format': fmt, 'filename': f"snap.{fmt}.gz"})
+    assert code == 200
+    again = laba.FoodDelivery()
+    with contextlib.redirect_stdout(io.StringIO()):
+        getattr(again, loader)(reply['filename'])
+    assert again.snapshot_dict() == server.system.snapshot_dict()
+
+
+def test_failed_snapshot_is_500(server, tmp_path):
+    (tmp_path / "taken").mkdir()
+    code, reply = call(server, 'POST', '/snapshot', {'filename': "taken"})
+    assert code == 500
+    code, reply = call(server, 'POST', '/snapshot', {'filename': "no/such/dir.json"})
+    assert code == 500
+
+
+def test_snapshot_outside_data_dir(server):
+    for name in ("../escape.json", "/tmp/escape.json", "."):
+        code, _ = call(server, 'POST', '/snapshot', {'filename': name})
+        assert code == 400
+
+
+def test_save_methods_report_failure(server, tmp_path):
+    system = server.system
+    target = str(tmp_path / "no" / "dir" / "snap")
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not system.save_json(target + ".json")
+        assert not system.save_xml(target + ".xml")
+        assert not system.save_xml_stream(target + ".xml")
+        assert not system.save_bin(target + ".bin")
+        assert system.save_json(str(tmp_path / "ok.json"))
+
+
+def test_bad_order_creates_nothing(server):
+    code, _ = call(server, 'POST', '/orders', {'user_id': 1, 'rest_id': 1, 'items': {'Суп': 1}})
+    assert code == 409
+    code, _ = call(server, 'POST', '/orders', {'user_id': 1, 'rest_id': 1, 'items': {'Пицца': 0}})
+    assert code == 400
+    code, _ = call(server, 'POST', '/orders', {'user_id': "1", 'rest_id': 1})
+    assert code == 400
+    assert server.system.orders == []
+
+
+def test_unknown_route(server):
+    assert call(server, 'GET', '/nothing')[0] == 404
+    assert call(server, 'DELETE', '/stats')[0] == 405
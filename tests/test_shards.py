@@ -0,0 +1,119 @@
+import contextlib
+import io
+
+import pytest
+
+import laba1 as laba
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture
+def sharded():
+    with laba.ShardedDelivery(3) as sharded:
+        yield sharded
+
+
+def setup(sharded, memory):
+    for i in range(7):
+        money = 1000 if i % 4 else 150
+        assert sharded.add_user(f"u{i}", f"u{i}@mail.ru", f"+{i}", money) == i + 1
+        memory.add_user(f"u{i}", f"u{i}@mail.ru", f"+{i}").add_money(money)
+    for i in range(3):
+        assert sharded.add_restaurant(f"ресторан {i}", f"ул. {i}") == i + 1
+        rest = memory.add_restaurant(f"ресторан {i}", f"ул. {i}")
+        for dish in (laba.Dish("Пицца", 100.0 + i), laba.Dish("Суп", 70.0)):
+            sharded.add_dish(i + 1, dish)
+            rest.add_dish(laba.Dish(dish.name, dish.price))
+    sharded.switch_open(3)
+    memory.find_rest(3).switch_open()
+
+
+ROWS = [(uid, rid, {"Пицца": uid % 3 + 1, "Суп": 1}) for uid in range(1, 8) for rid in (1, 2)] + [
+    (1, 3, {"Пицца": 1}),  # ресторан закрыт
+    (2, 1, {"Борщ": 1}),  # нет блюда
+    (99, 1, {"Пицца": 1}),  # нет пользователя
+]
+
+
+def memory_orders(memory, rows):
+    results = []
+    for uid, rid, items in rows:
+        # шард проверяет строку целиком до создания заказа - здесь так же
+        rest = memory.find_rest(rid)
+        if rest and any(rest.find_dish(name) is None for name in items):
+            results.append(None)
+            continue
+        try:
+            order = memory.make_order(uid, rid)
+        except laba.DeliveryError:
+            results.append(None)
+            continue
+            results.append(None)
+            continue
+        for name, count in items.items():
+            order.add_dish(name, count)
+        results.append(order.id)
+    return results
+
+
+def test_same_stats_as_single_process(sharded):
+    memory = laba.FoodDelivery()
+    setup(sharded, memory)
+    made = sharded.make_orders(ROWS)
+    expected = memory_orders(memory, ROWS)
+    assert [r.ok for r in made] == [oid is not None for oid in expected]
+    pairs = [(r.oid, oid) for r, oid in zip(made, expected) if r.ok]
+    for shard_oid, oid in pairs:
+        assert sharded.find_order(shard_oid)['items'] == memory.find_order(oid).items
+        assert sharded.find_order(shard_oid)['user_id'] == memory.find_order(oid).user.id
+
+    processed = sharded.process_orders([s for s, _ in pairs])
+    single = quiet(memory.process_orders, [m for _, m in pairs])
+    assert [r.ok for r in processed] == [r.ok for r in single]
+    assert not all(r.ok for r in processed)  # у кого 150 - на все заказы не хватит
+    for shard_oid, oid in pairs[::3]:
+        assert sharded.finish_order(shard_oid) == memory.finish_order(oid)
+    assert sharded.stats() == memory.stats()
+
+
+def test_order_ids_point_to_user_shard(sharded):
+    memory = laba.FoodDelivery()
+    setup(sharded, memory)
+    for uid in range(1, 8):
+        oid = sharded.make_order(uid, 1, {"Суп": 1})
+        assert sharded.shard_of_order(oid) == sharded.shard_of_user(uid)
+        assert sharded.add_order_dish(oid, "Пицца", 2) == 70.0 + 2 * 100.0
+        assert sharded.find_order(oid)['user_id'] == uid
+
+
+def test_errors_come_back_as_exceptions(sharded):
+    memory = laba.FoodDelivery()
+    setup(sharded, memory)
+    with pytest.raises(laba.RestaurantClosedError):
+        sharded.make_order(1, 3)
+    with pytest.raises(laba.UserNotFoundError):
+        sharded.add_money(99, 10)
+    with pytest.raises(laba.OrderNotFoundError):
+        sharded.add_order_dish(10 ** 6, "Пицца")
+    assert sharded.stats()['orders'] == 0
+
+
+def test_analytics_merged_from_shards(sharded):
+    memory = laba.FoodDelivery()
+    memory.enable_analytics()
+    setup(sharded, memory)
+    made = sharded.make_orders(ROWS)
+    expected = memory_orders(memory, ROWS)
+    pairs = [(r.oid, oid) for r, oid in zip(made, expected) if r.ok]
+    sharded.process_orders([s for s, _ in pairs])
+    quiet(memory.process_orders, [m for _, m in pairs])
+    for shard_oid, oid in pairs:
+        sharded.finish_order(shard_oid)
+        memory.finish_order(oid)
+    merged = sharded.analytics()
+    assert sorted(merged.top_users()) == sorted(memory.analytics.top_users())
+    assert sorted(merged.top_dishes()) == sorted(memory.analytics.top_dishes())
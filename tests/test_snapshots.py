@@ -0,0 +1,64 @@
+import contextlib
+import io
+
+import pytest
+
+import laba1 as laba
+
+# (сохранение, загрузка) для каждого формата
+FORMATS = [
+    ('save_json', 'load_json'),
+    ('save_json', 'load_json_stream'),
+    ('save_xml', 'load_xml'),
+    ('save_xml_stream', 'load_xml_stream'),
+    ('save_bin', 'load_bin'),
+]
+
+
+@pytest.fixture
+def system():
+    return laba.generate_system(30, 4, 300)
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def ext(saver):
+    return {'save_json': 'json', 'save_xml': 'xml', 'save_xml_stream': 'xml', 'save_bin': 'bin'}[saver]
+
+
+@pytest.mark.parametrize("saver, loader", FORMATS)
+@pytest.mark.parametrize("codec", ["", ".gz", ".bz2", ".xz"])
+def test_round_trip(system, tmp_path, saver, loader, codec):
+    path = str(tmp_path / f"snap.{ext(saver)}{codec}")
+    assert quiet(getattr(system, saver), path)
+    again = laba.FoodDelivery()
+    quiet(getattr(again, loader), path)
+    assert again.snapshot_dict() == system.snapshot_dict()
+    assert again.stats() == system.stats()
+
+
+@pytest.mark.parametrize("saver, loader", FORMATS)
+def test_missing_or_foreign_file_keeps_data(system, tmp_path, saver, loader):
+    before = system.snapshot_dict()
+    foreign = tmp_path / "foreign.txt"
+    foreign.write_text("просто текст\n", encoding='utf-8')
+    for path in (str(tmp_path / "missing"), str(foreign)):
+        quiet(getattr(system, loader), path)
+        assert system.snapshot_dict() == before
+
+
+@pytest.mark.parametrize("saver, loader", FORMATS)
+def test_truncated_file_leaves_empty_system(system, tmp_path, saver, loader):
+    path = tmp_path / f"snap.{ext(saver)}"
+    quiet(getattr(system, saver), str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    quiet(getattr(system, loader), str(path))
+    # либо загрузка не началась (целый разбор файла), либо система пустая
+    if loader in ('load_json', 'load_xml'):
+        assert system.stats()['orders'] == 300
+    else:
+        assert system.stats() == laba.FoodDelivery().stats()
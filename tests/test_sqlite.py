@@ -0,0 +1,90 @@
+import contextlib
+import io
+
+import pytest
+
+import laba1 as laba
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+# одни и те же действия над FoodDelivery и SqliteDelivery
+def scenario(system):
+    for i in range(6):
+        system.add_user(f"u{i}", f"u{i}@mail.ru", f"+{i}").add_money(1000 if i % 3 else 50)
+    for i in range(3):
+        rest = system.add_restaurant(f"ресторан {i}", f"ул. {i}", f"8800{i}")
+        rest.add_dish(laba.Dish("Пицца маргарита", 300.0 + i, "с сыром", "пицца"))
+        rest.add_dish(laba.Dish("Суп том ям", 250.0, "острый", "супы"))
+    system.find_rest(3).switch_open()
+    system.find_rest(2).set_rating(4.5)
+    oids = []
+    for i in range(12):
+        order = system.make_order(i % 6 + 1, i % 2 + 1)
+        order.add_dish("Пицца маргарита", i % 3 + 1)
+        oids.append(order.id)
+    results = quiet(system.process_orders, oids[:6])
+    for oid in oids[6:9]:
+        quiet(system.process_order, oid)
+    for oid in oids[:4]:
+        system.finish_order(oid)
+    system.cancel_order(oids[4])
+    system.cancel_order(oids[9])
+    return [(r.oid, r.ok) for r in results]
+
+
+@pytest.fixture
+def pair(tmp_path):
+    memory = laba.FoodDelivery()
+    db = laba.SqliteDelivery(str(tmp_path / "delivery.db"))
+    yield memory, db
+    db.close()
+
+
+def test_same_results_as_memory(pair):
+    memory, db = pair
+    assert scenario(db) == scenario(memory)
+    assert db.stats() == memory.stats()
+    for uid in range(1, 7):
+        assert db.find_user(uid).money == memory.find_user(uid).money
+        assert [o.id for o in db.orders_of_user(uid)] == [o.id for o in memory.orders_of_user(uid)]
+    assert db.find_user_by_email("u3@mail.ru").id == 4
+    assert db.find_user_by_phone("+5").id == 6
+    for status in (laba.OrderStatus.created, laba.OrderStatus.completed, laba.OrderStatus.cancelled):
+        assert [o.id for o in db.orders_with_status(status)] == \
+            sorted(o.id for o in memory.orders_with_status(status))
+    found = lambda s, **kw: sorted((r.id, d.name) for r, d in s.search_dishes(**kw))
+    for query in ({'text': "пиц"}, {'category': "супы", 'open_only': True}, {'max_price': 300.0}):
+        assert found(db, **query) == found(memory, **query)
+
+
+def test_data_survives_reopen(tmp_path):
+    path = str(tmp_path / "delivery.db")
+    db = laba.SqliteDelivery(path)
+    scenario(db)
+    stats = db.stats()
+    db.close()
+
+    db = laba.SqliteDelivery(path)
+    assert db.stats() == stats
+    assert db.add_user("новый", "new@mail.ru", "+9").id == 7
+    assert db.find_order(1).items == {"Пицца маргарита": 1}
+    db.close()
+
+
+def test_snapshot_between_sqlite_and_memory(pair, tmp_path):
+    memory, db = pair
+    scenario(memory)
+    snapshot = str(tmp_path / "memory.json")
+    quiet(memory.save_json, snapshot)
+    quiet(db.load_json, snapshot)
+    assert db.stats() == memory.stats()
+
+    again = str(tmp_path / "sqlite.json")
+    assert quiet(db.save_json, again)
+    loaded = laba.FoodDelivery()
+    quiet(loaded.load_json, again)
+    assert loaded.snapshot_dict() == memory.snapshot_dict()